@@ -0,0 +1,70 @@
+"""
+Benchmark of the HTML-to-markdown backends: pages per second and per-page latency percentiles,
+over the test fixture corpus plus synthetic documentation pages of increasing size.
+
+Usage (from services/gcp/mcpGateway):
+    python benchmarks/bench_html_backends.py [--rounds 20] [--max-chars 0]
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.html_convert import available_backends, html_to_markdown
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "fixtures", "html")
+
+
+def synthetic_page(sections: int) -> str:
+    body = []
+    for i in range(sections):
+        body.append(
+            f"<h2>Section {i}</h2><p>Release {i} adds <b>feature {i}</b> and fixes "
+            f"<a href='/issues/{i}'>issue {i}</a> in the request   pipeline.</p>"
+            f"<ul><li>Item {i}.1</li><li>Item {i}.2 &amp; more</li></ul>"
+            f"<script>track({i})</script><pre><code>deploy --revision {i}</code></pre>"
+        )
+    return (f"<html><head><title>Synthetic {sections}</title><style>p{{margin:0}}</style></head><body>"
+            f"<nav>Home | Docs</nav>{''.join(body)}<footer>Footer</footer></body></html>")
+
+
+def corpus():
+    pages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html"))):
+        with open(path, "r", encoding="utf-8") as f:
+            pages.append(f.read())
+    pages += [synthetic_page(n) for n in (50, 500, 5000)]
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--max-chars", type=int, default=0, help="Stop each conversion after this many characters (0 = full pages).")
+    args = parser.parse_args()
+
+    pages = corpus()
+    total_bytes = sum(len(page.encode("utf-8")) for page in pages)
+    max_chars = args.max_chars or None
+    print(f"{len(pages)} pages ({total_bytes / 1e6:.2f} MB) x {args.rounds} rounds, max_chars={max_chars}")
+    for backend in available_backends():
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            for page in pages:
+                t0 = time.perf_counter()
+                html_to_markdown(page, max_chars=max_chars, backend=backend)
+                latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"{backend:12s} {len(latencies) / elapsed:9.1f} pages/s  {total_bytes * args.rounds / elapsed / 1e6:7.1f} MB/s  "
+              f"p50 {statistics.median(latencies) * 1000:8.2f} ms  p99 {p99 * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
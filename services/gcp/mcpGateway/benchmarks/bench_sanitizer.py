@@ -0,0 +1,54 @@
+"""
+Micro-benchmark for tools.memory.sanitize_text against the legacy multi-pass sanitizer.
+
+Usage (from services/gcp/mcpGateway):
+    python benchmarks/bench_sanitizer.py [--repeat 20]
+"""
+import os
+import re
+import sys
+import argparse
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.memory import SECRET_PATTERNS, sanitize_text
+
+SECRETS = [
+    "sk-proj-1234567890abcdef1234567890",
+    "AIzaSyD1234567890abcdef1234567890abc",
+    "ghp_" + "a1B2c3D4e5" * 3 + "a1B2c3",
+    "Bearer eyJhbGciOiJIUzI1NiJ9.payload.signature",
+    "password = 'hunter2'",
+]
+PROSE = "Cloud Run added native WebSocket support and reduced cold start latency across regions. "
+
+
+def legacy_sanitize(text: str) -> str:
+    for pattern, replacement, _ in SECRET_PATTERNS:
+        text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
+    return text
+
+
+def corpus():
+    clean = [PROSE * 3 for _ in range(2000)]
+    dirty = [f"{PROSE} token {SECRETS[i % len(SECRETS)]} {PROSE}" for i in range(2000)]
+    page = PROSE * 20000
+    return {"clean observations": clean, "observations with secrets": dirty, "single 1.8MB page": [page]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for label, texts in corpus().items():
+        assert [sanitize_text(t) for t in texts[:50]] == [legacy_sanitize(t) for t in texts[:50]]
+        legacy = timeit.timeit(lambda: [legacy_sanitize(t) for t in texts], number=args.repeat) / args.repeat
+        single = timeit.timeit(lambda: [sanitize_text(t) for t in texts], number=args.repeat) / args.repeat
+        mb = sum(len(t) for t in texts) / 1e6
+        print(f"{label:28s} {mb:6.2f} MB  legacy {legacy * 1000:8.2f} ms  single-pass {single * 1000:8.2f} ms  speedup {legacy / single:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
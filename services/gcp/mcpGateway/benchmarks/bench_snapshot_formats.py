@@ -0,0 +1,66 @@
+"""
+Benchmark of memory snapshot formats on a synthetic knowledge graph: save (encode) time,
+load (decode) time and object size, against the legacy `json.dumps(indent=2)` snapshot.
+
+Usage (from services/gcp/mcpGateway):
+    python benchmarks/bench_snapshot_formats.py [--entities 100000] [--repeat 3]
+"""
+import os
+import sys
+import json
+import argparse
+import timeit
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.memory_codec import available_formats, encode_graph, decode_graph
+
+CATEGORIES = ["Infrastructure", "Developer", "Tech Intelligence", "Database", "Networking"]
+
+
+def synthetic_graph(n: int):
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    entities = {}
+    for i in range(n):
+        name = f"Entity {i:06d}"
+        created = (start + timedelta(seconds=i)).isoformat()
+        entities[name] = {
+            "name": name,
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "observations": [
+                f"Observation {j} about {name}: service runs in region us-central{j % 4} with {i % 97} replicas."
+                for j in range(1 + i % 4)
+            ],
+            "created_at": created,
+            "last_updated_at": created,
+            "expires_at": None if i % 10 == 0 else (start + timedelta(days=30, seconds=i)).isoformat(),
+            "pinned": i % 10 == 0,
+        }
+    return {"entities": entities, "relations": []}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entities", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    graph = synthetic_graph(args.entities)
+    cases = {"legacy json indent=2": (lambda: json.dumps(graph, indent=2).encode("utf-8"), json.loads)}
+    for fmt in available_formats():
+        cases[fmt] = (lambda fmt=fmt: encode_graph(graph, fmt), decode_graph)
+
+    legacy_size = None
+    print(f"{args.entities} entities, best of {args.repeat}")
+    for label, (encode, decode) in cases.items():
+        data = encode()
+        assert decode(data) == graph
+        save = min(timeit.repeat(encode, number=1, repeat=args.repeat))
+        load = min(timeit.repeat(lambda: decode(data), number=1, repeat=args.repeat))
+        legacy_size = legacy_size or len(data)
+        print(f"{label:22s} size {len(data) / 1e6:7.2f} MB ({len(data) / legacy_size:5.1%})  save {save * 1000:8.1f} ms  load {load * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
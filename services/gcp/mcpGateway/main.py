@@ -2,6 +2,7 @@ import os
 import json
 import uuid
 import asyncio
+from contextlib import asynccontextmanager
 from typing import Dict, Any, List, Optional
 from fastapi import FastAPI, Depends, Request, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
@@ -9,14 +10,43 @@ from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
 from auth import verify_oauth_token, DISABLE_AUTH, GOOGLE_CLIENT_ID
-from tools.web_fetch import fetch_web_markdown
-from tools.memory import remember_entity, recall_entities, prune_expired_memories
+from tools.web_fetch import fetch_web_markdown, web_cache_stats, fetch_scheduler_stats, WEB_FETCH_STATS
+from tools.http_client import open_http_client, close_http_client, http_stats
+from tools.html_convert import backend_stats
+from tools.convert_pool import start_convert_pool, stop_convert_pool, convert_stats
+from tools.memory import (
+    remember_entity, remember_entities, recall_entities, prune_expired_memories, memory_stats,
+    store_relation, query_neighbors, run_expiry_reaper, REAPER_INTERVAL_SECONDS, BULK_MAX_RECORDS,
+    NEIGHBOR_MAX_HOPS, NEIGHBOR_MAX_NODES, ENTITY_FIELDS, export_records, import_records, memory_namespace,
+    namespace_for_user
+)
 from tools.radar import run_tech_radar
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Opens the shared HTTP client, warms the conversion workers and starts background maintenance tasks."""
+    await open_http_client()
+    await asyncio.to_thread(start_convert_pool)
+    reaper = asyncio.create_task(run_expiry_reaper(REAPER_INTERVAL_SECONDS)) if REAPER_INTERVAL_SECONDS > 0 else None
+    try:
+        yield
+    finally:
+        if reaper is not None:
+            reaper.cancel()
+            try:
+                await reaper
+            except asyncio.CancelledError:
+                pass
+        await close_http_client()
+        await asyncio.to_thread(stop_convert_pool)
+
+
 app = FastAPI(
     title="GCP Cloud Run MCP Gateway",
     description="Hosted Remote Model Context Protocol (MCP) Gateway with Google OAuth 2.0 OIDC Authentication & Tech Radar.",
-    version="1.1.0"
+    version="1.1.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -27,8 +57,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Active SSE Session Queues
+# Active SSE Session Queues (and the verified user each session was opened by)
 sse_sessions: Dict[str, asyncio.Queue] = {}
+sse_session_users: Dict[str, dict] = {}
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "20"))
+
+# Page size and per-entity observation limit used by query_memory when the caller sets none
+QUERY_DEFAULT_LIMIT = int(os.getenv("MEMORY_QUERY_DEFAULT_LIMIT", "20"))
+QUERY_DEFAULT_MAX_OBSERVATIONS = int(os.getenv("MEMORY_QUERY_DEFAULT_MAX_OBSERVATIONS", "10"))
 
 # Tool Definitions
 TOOLS_MANIFEST = [
@@ -59,16 +95,87 @@ TOOLS_MANIFEST = [
             "required": ["name", "category", "observation"]
         }
     },
+    {
+        "name": "store_memories",
+        "description": f"Stores up to {BULK_MAX_RECORDS} entities in one atomic write with secret sanitization and TTL retention. Returns a status per record.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "records": {
+                    "type": "array",
+                    "minItems": 1,
+                    "maxItems": BULK_MAX_RECORDS,
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "name": {"type": "string", "description": "Entity name."},
+                            "category": {"type": "string", "description": "Category or type."},
+                            "observations": {"type": "array", "items": {"type": "string"}, "description": "Factual notes or observations."},
+                            "ttl_days": {"type": "integer", "description": "Retention period in days (default 30).", "default": 30},
+                            "pinned": {"type": "boolean", "description": "If True, prevents automatic expiration.", "default": False}
+                        },
+                        "required": ["name", "category", "observations"]
+                    },
+                    "description": "Entity records to store."
+                }
+            },
+            "required": ["records"]
+        }
+    },
     {
         "name": "query_memory",
-        "description": "Recalls facts and entities from long-term knowledge graph memory.",
+        "description": "Recalls facts and entities from long-term knowledge graph memory, ranked by relevance.",
         "inputSchema": {
             "type": "object",
             "properties": {
-                "query": {"type": "string", "description": "Search filter query string.", "default": ""}
+                "query": {"type": "string", "description": "Search terms; every term must match the entity name, category or observations.", "default": ""},
+                "category": {"type": "string", "description": "Optional category filter (case-insensitive)."},
+                "limit": {"type": "integer", "description": "Maximum number of entities to return.", "default": QUERY_DEFAULT_LIMIT},
+                "cursor": {"type": "string", "description": "Cursor from the previous page of the same query."},
+                "fields": {
+                    "type": "array",
+                    "items": {"type": "string", "enum": list(ENTITY_FIELDS)},
+                    "description": "Entity fields to return (default name, category and observations)."
+                },
+                "max_observations": {"type": "integer", "description": "Most recent observations returned per entity.", "default": QUERY_DEFAULT_MAX_OBSERVATIONS},
+                "offset": {"type": "integer", "description": "Number of matching entities to skip.", "default": 0},
+                "mode": {
+                    "type": "string",
+                    "enum": ["keyword", "semantic"],
+                    "description": "'keyword' requires every term to match; 'semantic' ranks by similarity and also finds differently worded facts.",
+                    "default": "keyword"
+                }
             }
         }
     },
+    {
+        "name": "store_relation",
+        "description": "Links two stored entities with a directed, typed relation (e.g. 'Cloud Run' depends_on 'Artifact Registry'). Relations expire with their entities.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "from": {"type": "string", "description": "Source entity name."},
+                "to": {"type": "string", "description": "Target entity name."},
+                "relation_type": {"type": "string", "description": "Relation label in active voice (e.g. 'depends_on')."}
+            },
+            "required": ["from", "to", "relation_type"]
+        }
+    },
+    {
+        "name": "query_neighbors",
+        "description": "Returns entities connected to an entity through relations, up to k hops away, in one call.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "name": {"type": "string", "description": "Entity to start from."},
+                "hops": {"type": "integer", "description": f"Maximum path length (1-{NEIGHBOR_MAX_HOPS}).", "default": 1},
+                "direction": {"type": "string", "enum": ["out", "in", "both"], "description": "Follow outgoing, incoming or all relations.", "default": "both"},
+                "relation_type": {"type": "string", "description": "Optional relation label filter."},
+                "max_nodes": {"type": "integer", "description": f"Maximum neighbors to return (up to {NEIGHBOR_MAX_NODES}).", "default": NEIGHBOR_MAX_NODES}
+            },
+            "required": ["name"]
+        }
+    },
     {
         "name": "run_tech_radar",
         "description": "Monitors target web URLs (docs/release notes), parses updates, and indexes intelligence facts into knowledge graph memory with TTL retention.",
@@ -88,16 +195,37 @@ TOOLS_MANIFEST = [
     },
     {
         "name": "prune_memory",
-        "description": "Prunes expired unpinned entity entries from knowledge graph memory based on retention policies.",
+        "description": "Prunes expired unpinned entity entries from knowledge graph memory based on retention policies, and optionally evicts least recently/frequently recalled entries while memory exceeds its size budget.",
         "inputSchema": {
             "type": "object",
-            "properties": {}
+            "properties": {
+                "evict": {"type": "boolean", "description": "Also run a size-budget eviction pass.", "default": False}
+            }
         }
     }
 ]
 
-async def execute_tool(name: str, arguments: Dict[str, Any]) -> str:
-    """Executes the requested tool name with provided arguments."""
+# Tools that read or write memory; they accept a "scope" argument and run in the caller's namespace
+MEMORY_TOOLS = {"store_memory", "store_memories", "query_memory", "store_relation", "query_neighbors", "run_tech_radar", "prune_memory"}
+for _tool in TOOLS_MANIFEST:
+    if _tool["name"] in MEMORY_TOOLS:
+        _tool["inputSchema"]["properties"]["scope"] = {
+            "type": "string",
+            "enum": ["user", "shared"],
+            "description": "Memory namespace: the caller's own memory (default) or the shared team memory."
+        }
+
+async def execute_tool(name: str, arguments: Dict[str, Any], user: Optional[dict] = None) -> str:
+    """
+    Executes the requested tool name with provided arguments. Memory tools run in the namespace
+    of the verified `user` (or the shared namespace when arguments ask for scope 'shared').
+    """
+    if name not in MEMORY_TOOLS:
+        return await _execute_tool(name, arguments)
+    with memory_namespace(namespace_for_user(user, arguments.get("scope"))):
+        return await _execute_tool(name, arguments)
+
+async def _execute_tool(name: str, arguments: Dict[str, Any]) -> str:
     if name == "fetch_web_page":
         url = arguments.get("url")
         max_chars = arguments.get("max_chars", 10000)
@@ -115,15 +243,69 @@ async def execute_tool(name: str, arguments: Dict[str, Any]) -> str:
         res = await remember_entity(entity_name, category, [observation], ttl_days=ttl_days, pinned=pinned)
         return f"Successfully stored memory for '{entity_name}' [{category}]: {observation}"
 
+    elif name == "store_memories":
+        res = await remember_entities(arguments.get("records", []))
+        out = [f"Stored {res['stored_count']} of {len(res['results'])} memory record(s)."]
+        for item in res["results"]:
+            if item["status"] != "stored":
+                out.append(f"- Record {item['index']} rejected: {item['error']}")
+        return "\n".join(out)
+
     elif name == "query_memory":
         q = arguments.get("query", "")
-        res = await recall_entities(query=q)
+        res = await recall_entities(
+            query=q,
+            category=arguments.get("category"),
+            limit=arguments.get("limit", QUERY_DEFAULT_LIMIT),
+            offset=arguments.get("offset", 0),
+            mode=arguments.get("mode", "keyword"),
+            cursor=arguments.get("cursor"),
+            fields=arguments.get("fields", ["name", "category", "observations"]),
+            max_observations=arguments.get("max_observations", QUERY_DEFAULT_MAX_OBSERVATIONS)
+        )
         entities = res.get("entities", {})
         if not entities:
             return f"No memories found matching query '{q}'."
-        out = [f"Found {len(entities)} memory entry/entries:"]
+        total = res.get("matches", res.get("total_count", len(entities)))
+        out = [f"Found {total} memory entry/entries:" if total == len(entities) else f"Showing {len(entities)} of {total} memory entries:"]
+        scores = res.get("scores", {})
         for item_name, item in entities.items():
-            out.append(f"- **{item_name}** ({item.get('category')}): {', '.join(item.get('observations', []))}")
+            score = f" [similarity {scores[item_name]:.2f}]" if item_name in scores else ""
+            details = [f"{key}={item[key]}" for key in ENTITY_FIELDS if key not in ("name", "category", "observations") and key in item]
+            observations = ", ".join(item.get("observations", []))
+            if item.get("observations_truncated"):
+                observations += f" (+{item['observations_truncated']} older)"
+            out.append(f"- **{item_name}** ({item.get('category')}){score}: {observations}" + (f" [{', '.join(details)}]" if details else ""))
+        if res.get("next_cursor"):
+            out.append(f"More results available: call query_memory again with cursor=\"{res['next_cursor']}\".")
+        return "\n".join(out)
+
+    elif name == "store_relation":
+        res = await store_relation(arguments.get("from"), arguments.get("to"), arguments.get("relation_type"))
+        if res["status"] == "error":
+            raise ValueError(res["error"])
+        relation = res["relation"]
+        return f"Stored relation: '{relation['from']}' -[{relation['type']}]-> '{relation['to']}'"
+
+    elif name == "query_neighbors":
+        entity_name = arguments.get("name")
+        res = await query_neighbors(
+            entity_name,
+            hops=arguments.get("hops", 1),
+            direction=arguments.get("direction", "both"),
+            relation_type=arguments.get("relation_type"),
+            max_nodes=arguments.get("max_nodes")
+        )
+        if not res["found"]:
+            return f"No memory entity named '{entity_name}'."
+        if not res["neighbors"]:
+            return f"'{entity_name}' has no related entities."
+        out = [f"Found {len(res['neighbors'])} related entity/entities{' (node budget reached)' if res['truncated'] else ''}:"]
+        for item_name, item in res["neighbors"].items():
+            out.append(f"- [{item['depth']} hop(s)] **{item_name}** ({item.get('category')}): {', '.join(item.get('observations', []))}")
+        out.append("Relations:")
+        for relation in res["relations"]:
+            out.append(f"- '{relation['from']}' -[{relation['type']}]-> '{relation['to']}'")
         return "\n".join(out)
 
     elif name == "run_tech_radar":
@@ -135,8 +317,9 @@ async def execute_tool(name: str, arguments: Dict[str, Any]) -> str:
         return f"Tech Radar completed! Processed {res.get('processed_count')} URLs and indexed {res.get('indexed_count')} entities into memory:\n- " + "\n- ".join(indexed)
 
     elif name == "prune_memory":
-        res = await prune_expired_memories()
-        return f"Memory pruning complete: Pruned {res.get('pruned_count')} expired entity/entities. Retained {res.get('retained_count')} active entries."
+        res = await prune_expired_memories(evict=bool(arguments.get("evict", False)))
+        evicted = f" Evicted {res.get('evicted_count')} entity/entities over the size budget." if arguments.get("evict") else ""
+        return f"Memory pruning complete: Pruned {res.get('pruned_count')} expired entity/entities.{evicted} Retained {res.get('retained_count')} active entries."
 
     else:
         raise ValueError(f"Unknown tool name: '{name}'")
@@ -151,7 +334,9 @@ async def health_check():
         "service": "GCP Cloud Run MCP Gateway",
         "auth_enabled": not DISABLE_AUTH,
         "google_client_id_configured": bool(GOOGLE_CLIENT_ID),
-        "tools_count": len(TOOLS_MANIFEST)
+        "tools_count": len(TOOLS_MANIFEST),
+        "memory": memory_stats(),
+        "http": {**http_stats(), "cache": web_cache_stats(), "fetch": dict(WEB_FETCH_STATS), "scheduler": fetch_scheduler_stats(), "parser": backend_stats(), "convert_pool": convert_stats()}
     }
 
 # OAuth Token Verification Endpoint
@@ -171,7 +356,7 @@ class ToolCallRequest(BaseModel):
 @app.post("/api/tools/call", tags=["Tools"])
 async def call_tool_api(body: ToolCallRequest, user: dict = Depends(verify_oauth_token)):
     try:
-        result_text = await execute_tool(body.name, body.arguments)
+        result_text = await execute_tool(body.name, body.arguments, user)
         return {
             "success": True,
             "tool": body.name,
@@ -180,11 +365,90 @@ async def call_tool_api(body: ToolCallRequest, user: dict = Depends(verify_oauth
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+async def user_memory_namespace(
+    scope: Optional[str] = Query(None, description="'user' (default) for the caller's own memory or 'shared'."),
+    user: dict = Depends(verify_oauth_token)
+) -> str:
+    """Resolves the memory namespace a request operates on from its verified identity."""
+    try:
+        return namespace_for_user(user, scope)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.post("/api/memory/prune", tags=["Memory Management"])
-async def prune_memory_api(user: dict = Depends(verify_oauth_token)):
+async def prune_memory_api(
+    evict: bool = Query(False, description="Also run a size-budget eviction pass."),
+    namespace: str = Depends(user_memory_namespace)
+):
     """API endpoint to prune expired, unpinned memories based on retention policy."""
-    res = await prune_expired_memories()
-    return res
+    with memory_namespace(namespace):
+        return await prune_expired_memories(evict=evict)
+
+@app.get("/api/memory/entities", tags=["Memory Management"])
+async def list_memory_api(
+    query: Optional[str] = Query(None, description="Search terms (omit to list all entities)."),
+    category: Optional[str] = Query(None, description="Category filter (case-insensitive)."),
+    mode: str = Query("keyword", description="'keyword' or 'semantic'."),
+    limit: int = Query(QUERY_DEFAULT_LIMIT, ge=1, le=1000, description="Page size."),
+    cursor: Optional[str] = Query(None, description="`next_cursor` from the previous page."),
+    fields: Optional[str] = Query(None, description=f"Comma-separated subset of: {', '.join(ENTITY_FIELDS)}."),
+    max_observations: Optional[int] = Query(None, ge=0, description="Most recent observations returned per entity."),
+    namespace: str = Depends(user_memory_namespace)
+):
+    """API endpoint to page through (or search) memory entities with field projection."""
+    try:
+        with memory_namespace(namespace):
+            return await recall_entities(
+                query=query,
+                category=category,
+                limit=limit,
+                mode=mode,
+                cursor=cursor,
+                fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None,
+                max_observations=max_observations
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/memory/export", tags=["Memory Management"])
+async def export_memory_api(namespace: str = Depends(user_memory_namespace)):
+    """Streams every entity and relation as NDJSON (one JSON record per line)."""
+    async def records():
+        # The body is streamed after this handler returns, so the namespace is entered per stream
+        with memory_namespace(namespace):
+            async for chunk in export_records():
+                yield chunk
+
+    return StreamingResponse(
+        records(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="knowledge_graph.ndjson"'}
+    )
+
+@app.post("/api/memory/import", tags=["Memory Management"])
+async def import_memory_api(request: Request, namespace: str = Depends(user_memory_namespace)):
+    """Merges an NDJSON upload (as produced by /api/memory/export) into memory in bounded batches."""
+    try:
+        with memory_namespace(namespace):
+            return await import_records(request.stream())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+class MemoryRecord(BaseModel):
+    name: str = Field(..., description="Entity name.")
+    category: str = Field(..., description="Category or type.")
+    observations: List[str] = Field(default_factory=list, description="Factual notes or observations.")
+    ttl_days: Optional[int] = Field(30, description="Retention period in days; null keeps the entity indefinitely.")
+    pinned: bool = Field(False, description="If True, prevents automatic expiration.")
+
+class BulkMemoryRequest(BaseModel):
+    records: List[MemoryRecord] = Field(..., min_length=1, max_length=BULK_MAX_RECORDS, description="Entity records to store atomically.")
+
+@app.post("/api/memory/bulk", tags=["Memory Management"])
+async def bulk_memory_api(body: BulkMemoryRequest, namespace: str = Depends(user_memory_namespace)):
+    """API endpoint to store many entities in one atomic write, reporting a status per record."""
+    with memory_namespace(namespace):
+        return await remember_entities([record.model_dump() for record in body.records])
 
 # MCP Remote Transport (SSE + JSON-RPC)
 @app.get("/sse", tags=["MCP Remote Transport"])
@@ -192,6 +456,7 @@ async def handle_sse(request: Request, user: dict = Depends(verify_oauth_token))
     session_id = str(uuid.uuid4())
     queue = asyncio.Queue()
     sse_sessions[session_id] = queue
+    sse_session_users[session_id] = user
 
     async def event_generator():
         try:
@@ -202,12 +467,13 @@ async def handle_sse(request: Request, user: dict = Depends(verify_oauth_token))
                 if await request.is_disconnected():
                     break
                 try:
-                    data = await asyncio.wait_for(queue.get(), timeout=20.0)
+                    data = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
                     yield f"event: message\ndata: {json.dumps(data)}\n\n"
                 except asyncio.TimeoutError:
                     yield ": keep-alive\n\n"
         finally:
             sse_sessions.pop(session_id, None)
+            sse_session_users.pop(session_id, None)
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
@@ -250,7 +516,7 @@ async def handle_messages(request: Request, session_id: str = Query(...)):
         tool_name = params.get("name")
         arguments = params.get("arguments", {})
         try:
-            res_text = await execute_tool(tool_name, arguments)
+            res_text = await execute_tool(tool_name, arguments, sse_session_users.get(session_id))
             response = {
                 "jsonrpc": "2.0",
                 "id": msg_id,
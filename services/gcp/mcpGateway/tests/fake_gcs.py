@@ -0,0 +1,80 @@
+import threading
+from typing import Dict, Optional, Tuple
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+
+class FakeBlob:
+    """In-memory stand-in for google.cloud.storage.Blob honoring generation preconditions."""
+
+    def __init__(self, bucket: "FakeBucket", name: str):
+        self.bucket = bucket
+        self.name = name
+        self.generation: Optional[int] = None
+        self.metageneration: Optional[int] = None
+        self.size: Optional[int] = None
+
+    def _check(self, if_generation_match: Optional[int]):
+        current = self.bucket.objects.get(self.name)
+        current_gen = current[1] if current else 0
+        if if_generation_match is not None and if_generation_match != current_gen:
+            raise PreconditionFailed(f"generation mismatch for {self.name}")
+        return current
+
+    def exists(self) -> bool:
+        return self.name in self.bucket.objects
+
+    def download_as_bytes(self, if_generation_match: Optional[int] = None, **kwargs) -> bytes:
+        with self.bucket.lock:
+            current = self._check(if_generation_match)
+            if current is None:
+                raise NotFound(self.name)
+            self.bucket.downloads += 1
+            return current[0]
+
+    def download_as_text(self, if_generation_match: Optional[int] = None, **kwargs) -> str:
+        return self.download_as_bytes(if_generation_match=if_generation_match).decode("utf-8")
+
+    def upload_from_string(self, data, content_type: str = None, if_generation_match: Optional[int] = None, **kwargs):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with self.bucket.lock:
+            self._check(if_generation_match)
+            self.bucket.next_generation += 1
+            self.bucket.objects[self.name] = (data, self.bucket.next_generation, 1)
+            self.bucket.uploads += 1
+            self.generation, self.metageneration, self.size = self.bucket.next_generation, 1, len(data)
+
+    def delete(self, if_generation_match: Optional[int] = None, **kwargs):
+        with self.bucket.lock:
+            if self._check(if_generation_match) is None:
+                raise NotFound(self.name)
+            del self.bucket.objects[self.name]
+
+
+class FakeBucket:
+    """In-memory stand-in for google.cloud.storage.Bucket."""
+
+    def __init__(self, name: str = "fake-memory-bucket"):
+        self.name = name
+        self.lock = threading.RLock()
+        self.objects: Dict[str, Tuple[bytes, int, int]] = {}
+        self.next_generation = 1000
+        self.downloads = 0
+        self.uploads = 0
+
+    def blob(self, name: str) -> FakeBlob:
+        return FakeBlob(self, name)
+
+    def get_blob(self, name: str, **kwargs) -> Optional[FakeBlob]:
+        with self.lock:
+            current = self.objects.get(name)
+            if current is None:
+                return None
+            blob = FakeBlob(self, name)
+            blob.generation, blob.metageneration, blob.size = current[1], current[2], len(current[0])
+            return blob
+
+    def list_blobs(self, prefix: str = "", **kwargs):
+        with self.lock:
+            names = sorted(n for n in self.objects if n.startswith(prefix))
+        return [b for b in (self.get_blob(n) for n in names) if b is not None]
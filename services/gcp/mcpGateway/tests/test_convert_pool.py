@@ -0,0 +1,126 @@
+import time
+import asyncio
+import pytest
+import httpx
+from unittest.mock import patch
+from tools import convert_pool, web_fetch
+from tools.convert_pool import CONVERT_STATS, convert_html, convert_stats, stop_convert_pool
+from tools.html_convert import html_to_markdown
+from tools.http_client import open_http_client, close_http_client
+
+
+def _page(paragraphs: int) -> str:
+    return ("<html><head><title>Big Reference</title></head><body>"
+            + "".join(f"<div class='row'><span>{i}</span><p>Entry {i} of the API index.</p></div>" for i in range(paragraphs))
+            + "</body></html>")
+
+
+@pytest.fixture(autouse=True)
+def fresh_pool(tmp_path):
+    with patch.object(convert_pool, "CONVERT_WORKERS", 1), \
+         patch.object(web_fetch, "_web_cache", web_fetch._WebCache(str(tmp_path / "web_cache"))):
+        yield
+        stop_convert_pool()
+
+
+@pytest.mark.asyncio
+async def test_large_pages_are_converted_in_worker_process():
+    page = _page(3000)
+    before = dict(CONVERT_STATS)
+    await open_http_client(transport=httpx.MockTransport(lambda request: httpx.Response(200, html=page)))
+    try:
+        with patch.object(web_fetch, "WEB_FETCH_OFFLOAD_BYTES", 4096):
+            result = await web_fetch.fetch_web_markdown("https://docs.example.com/index", max_chars=1000000)
+    finally:
+        await close_http_client()
+
+    _, expected, _ = html_to_markdown(page, base_url="https://docs.example.com/index")
+    assert result["markdown"] == expected and result["title"] == "Big Reference"
+    assert CONVERT_STATS["completed"] - before["completed"] == 1
+    stats = convert_stats()
+    assert stats["workers"] == 1 and stats["busy_seconds"] > 0
+
+
+@pytest.mark.asyncio
+async def test_conversion_queue_rejects_when_full():
+    convert_pool.start_convert_pool()
+    with patch.object(convert_pool, "CONVERT_QUEUE_MAX", 0):
+        results = await asyncio.gather(convert_html(_page(2000)), convert_html(_page(10)), return_exceptions=True)
+
+    assert results[0][0] == "Big Reference" and results[0][1].startswith("0\n\nEntry 0")
+    assert isinstance(results[1], RuntimeError) and "queue is full" in str(results[1])
+
+
+@pytest.mark.asyncio
+async def test_conversion_timeout_restarts_worker():
+    convert_pool.start_convert_pool()
+    before = dict(CONVERT_STATS)
+    with patch.object(convert_pool, "CONVERT_TIMEOUT", 0.01):
+        with pytest.raises(RuntimeError, match="timed out"):
+            await convert_html(_page(200000))
+
+    assert CONVERT_STATS["timeouts"] - before["timeouts"] == 1
+    assert CONVERT_STATS["restarts"] - before["restarts"] == 1
+    assert (await convert_html(_page(5)))[0] == "Big Reference"
+
+
+@pytest.mark.asyncio
+async def test_timeout_replaces_only_the_stuck_worker():
+    async def small_after_giant_started():
+        await asyncio.sleep(0.1)
+        return await convert_html(_page(500))
+
+    with patch.object(convert_pool, "CONVERT_WORKERS", 2):
+        convert_pool.start_convert_pool()
+        workers = list(convert_pool._workers)
+        with patch.object(convert_pool, "CONVERT_TIMEOUT", 0.5):
+            giant, small = await asyncio.gather(convert_html(_page(300000)), small_after_giant_started(), return_exceptions=True)
+        survivors = set(workers) & set(convert_pool._workers)
+
+    assert isinstance(giant, RuntimeError) and "timed out" in str(giant)
+    assert small[0] == "Big Reference" and small[1].startswith("0\n\nEntry 0")
+    assert len(survivors) == 1 and len(convert_pool._workers) == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_conversion_replaces_its_busy_worker():
+    convert_pool.start_convert_pool()
+    (worker,) = convert_pool._workers
+    before = dict(CONVERT_STATS)
+    giant = asyncio.create_task(convert_html(_page(300000)))
+    await asyncio.sleep(0.3)
+    giant.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await giant
+
+    # Never handed to another caller while it is still converting the abandoned page
+    assert worker not in convert_pool._idle
+    deadline = time.monotonic() + 10
+    while worker in convert_pool._workers or not convert_pool._idle:
+        assert time.monotonic() < deadline
+        await asyncio.sleep(0.05)
+    assert CONVERT_STATS["restarts"] - before["restarts"] == 1
+    assert (await convert_html(_page(5)))[0] == "Big Reference"
+    assert len(convert_pool._workers) == 1
+
+
+@pytest.mark.asyncio
+async def test_large_content_length_still_stops_at_max_chars():
+    page = _page(40000).encode()
+    assert len(page) > web_fetch.WEB_FETCH_OFFLOAD_BYTES
+
+    async def body():
+        for i in range(0, len(page), 16384):
+            yield page[i:i + 16384]
+
+    before = dict(web_fetch.WEB_FETCH_STATS)
+    headers = {"Content-Type": "text/html", "Content-Length": str(len(page))}
+    await open_http_client(transport=httpx.MockTransport(lambda request: httpx.Response(200, headers=headers, content=body())))
+    try:
+        result = await web_fetch.fetch_web_markdown("https://docs.example.com/reference", max_chars=4000)
+    finally:
+        await close_http_client()
+
+    assert result["truncated"] is True and result["markdown"].startswith("0\n\nEntry 0")
+    assert web_fetch.WEB_FETCH_STATS["offloaded"] == before["offloaded"]
+    assert web_fetch.WEB_FETCH_STATS["bytes_downloaded"] - before["bytes_downloaded"] <= 32768
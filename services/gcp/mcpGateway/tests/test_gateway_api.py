@@ -11,7 +11,12 @@ def test_health_check():
     assert response.status_code == 200
     data = response.json()
     assert data["status"] == "ok"
-    assert data["tools_count"] == 5
+    assert data["tools_count"] == 8
+    assert "hits" in data["memory"]["cache"]
+    assert "conflicts" in data["memory"]["writes"]
+    assert "connections_reused" in data["http"]
+    assert "revalidated" in data["http"]["cache"]
+    assert "queue_depth" in data["http"]["convert_pool"]
 
 
 def test_auth_verify_unauthorized():
@@ -70,6 +75,9 @@ def test_list_tools_api():
         tool_names = [t["name"] for t in tools]
         assert "fetch_web_page" in tool_names
         assert "store_memory" in tool_names
+        assert "store_memories" in tool_names
+        assert "store_relation" in tool_names
+        assert "query_neighbors" in tool_names
         assert "query_memory" in tool_names
         assert "run_tech_radar" in tool_names
         assert "prune_memory" in tool_names
@@ -106,6 +114,118 @@ def test_call_tool_api_store_and_query():
         assert "Pytest Tool" in query_res.json()["result"]
 
 
+def test_bulk_memory_api_reports_per_record_status():
+    with patch("auth.DISABLE_AUTH", True):
+        response = client.post(
+            "/api/memory/bulk",
+            json={"records": [
+                {"name": "Bulk API A", "category": "BulkApi", "observations": ["one"]},
+                {"name": "  ", "category": "BulkApi", "observations": ["blank name"]}
+            ]}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["stored_count"] == 1
+        assert [r["status"] for r in data["results"]] == ["stored", "error"]
+
+        tool_res = client.post(
+            "/api/tools/call",
+            json={"name": "store_memories", "arguments": {"records": [
+                {"name": "Bulk API B", "category": "BulkApi", "observations": ["two"]}
+            ]}}
+        )
+        assert tool_res.status_code == 200
+        assert "Stored 1 of 1" in tool_res.json()["result"]
+
+        assert client.post("/api/memory/bulk", json={"records": []}).status_code == 422
+
+
+def test_relation_tools_via_api():
+    with patch("auth.DISABLE_AUTH", True):
+        for entity in ("Gateway Service", "Memory Bucket"):
+            client.post("/api/tools/call", json={"name": "store_memory", "arguments": {
+                "name": entity, "category": "Infrastructure", "observation": f"{entity} is deployed"
+            }})
+        res = client.post("/api/tools/call", json={"name": "store_relation", "arguments": {
+            "from": "Gateway Service", "to": "Memory Bucket", "relation_type": "stores_in"
+        }})
+        assert res.status_code == 200
+        assert "-[stores_in]->" in res.json()["result"]
+
+        res = client.post("/api/tools/call", json={"name": "query_neighbors", "arguments": {"name": "Memory Bucket"}})
+        assert res.status_code == 200
+        assert "Gateway Service" in res.json()["result"]
+
+        res = client.post("/api/tools/call", json={"name": "store_relation", "arguments": {
+            "from": "Gateway Service", "to": "Missing Thing", "relation_type": "uses"
+        }})
+        assert res.status_code == 400
+
+        res = client.post("/api/tools/call", json={"name": "store_relation", "arguments": {
+            "from": "Gateway Service", "to": "Memory Bucket"
+        }})
+        assert res.status_code == 400
+        assert "'relation_type' must be a non-empty string" in res.text
+
+
+def test_memory_entities_api_pages_with_cursor():
+    with patch("auth.DISABLE_AUTH", True):
+        client.post("/api/memory/bulk", json={"records": [
+            {"name": f"Paged API {i}", "category": "PagedApi", "observations": ["a", "b", "c"]} for i in range(3)
+        ]})
+        first = client.get("/api/memory/entities", params={"category": "PagedApi", "limit": 2, "fields": "category,observations", "max_observations": 1})
+        assert first.status_code == 200
+        data = first.json()
+        assert list(data["entities"]) == ["Paged API 0", "Paged API 1"]
+        assert data["entities"]["Paged API 0"] == {"category": "PagedApi", "observations": ["c"], "observations_truncated": 2}
+
+        second = client.get("/api/memory/entities", params={"category": "PagedApi", "limit": 2, "cursor": data["next_cursor"]})
+        assert list(second.json()["entities"]) == ["Paged API 2"]
+        assert client.get("/api/memory/entities", params={"cursor": "bogus"}).status_code == 400
+
+
+def test_memory_export_and_import_api():
+    with patch("auth.DISABLE_AUTH", True):
+        client.post("/api/memory/bulk", json={"records": [{"name": "Portable", "category": "Ndjson", "observations": ["moves"]}]})
+        exported = client.get("/api/memory/export")
+        assert exported.status_code == 200
+        assert exported.headers["content-type"].startswith("application/x-ndjson")
+        assert any('"Portable"' in line for line in exported.text.splitlines())
+
+        res = client.post("/api/memory/import", content=b'{"name": "Imported", "category": "Ndjson", "observations": ["arrived"]}\n')
+        assert res.status_code == 200
+        assert res.json()["entities"] == 1
+        listed = client.get("/api/memory/entities", params={"category": "Ndjson"}).json()
+        assert {"Portable", "Imported"} <= set(listed["entities"])
+
+
+def test_memory_api_uses_caller_namespace_and_shared_scope():
+    import glob
+    from tools import memory as memory_module
+    from tools.memory import LOCAL_MEMORY_FILE, memory_namespace, namespace_for_user
+
+    with patch("auth.DISABLE_AUTH", True), patch.object(memory_module, "NAMESPACE_MODE", "user"):
+        namespace = namespace_for_user({"sub": "dev-user-id"})
+        try:
+            client.post("/api/tools/call", json={"name": "store_memory", "arguments": {
+                "name": "Dev Scratch", "category": "NsApi", "observation": "mine"
+            }})
+            client.post("/api/memory/bulk", params={"scope": "shared"}, json={"records": [
+                {"name": "Team Runbook", "category": "NsApi", "observations": ["ours"]}
+            ]})
+            own = client.get("/api/memory/entities", params={"category": "NsApi"}).json()
+            shared = client.get("/api/memory/entities", params={"category": "NsApi", "scope": "shared"}).json()
+            assert set(own["entities"]) == {"Dev Scratch"}
+            assert set(shared["entities"]) == {"Team Runbook"}
+            assert client.get("/api/memory/entities", params={"scope": "team"}).status_code == 400
+        finally:
+            with memory_namespace(namespace):
+                memory_module._invalidate_cache()
+            root, ext = os.path.splitext(LOCAL_MEMORY_FILE)
+            for path in glob.glob(f"{root}.{namespace}{ext}*"):
+                os.remove(path)
+
+
 def test_mcp_jsonrpc_initialize():
     from main import sse_sessions
     import asyncio
@@ -132,3 +252,57 @@ def test_mcp_jsonrpc_initialize():
         assert res_msg["result"]["protocolVersion"] == "2024-11-05"
     finally:
         sse_sessions.pop(session_id, None)
+
+
+@pytest.mark.asyncio
+async def test_sse_keepalives_flow_while_memory_storage_is_slow():
+    import time
+    import asyncio
+    import main
+    from tools import memory as memory_module
+    from tools.memory import recall_entities
+
+    class SlowStore:
+        def load(self, cached_version):
+            time.sleep(0.5)  # blocking GCS download stand-in
+            return None
+
+    request = MagicMock()
+
+    async def is_disconnected():
+        return False
+
+    request.is_disconnected = is_disconnected
+
+    with patch.object(main, "SSE_KEEPALIVE_SECONDS", 0.05), \
+         patch.object(memory_module, "get_store", return_value=SlowStore()):
+        memory_module._state().update({"memory": {"entities": {}, "relations": []}, "version": ("slow",)})
+        response = await main.handle_sse(request, user={})
+        stream = response.body_iterator
+        assert (await stream.__anext__()).startswith("event: endpoint")
+
+        recall = asyncio.create_task(recall_entities())
+        keepalives = 0
+        while not recall.done():
+            if await stream.__anext__() == ": keep-alive\n\n":
+                keepalives += 1
+        await stream.aclose()
+
+    memory_module._invalidate_cache()
+    assert keepalives >= 3
+
+
+def test_lifespan_runs_expiry_reaper():
+    import time
+    import main
+    from tools.memory import REAPER_STATS
+
+    runs_before = REAPER_STATS["runs"]
+    with patch.object(main, "REAPER_INTERVAL_SECONDS", 0.05), TestClient(app) as lifespan_client:
+        deadline = time.monotonic() + 5
+        while REAPER_STATS["runs"] == runs_before and time.monotonic() < deadline:
+            time.sleep(0.05)
+        health = lifespan_client.get("/health").json()
+
+    assert REAPER_STATS["runs"] > runs_before
+    assert health["memory"]["reaper"]["runs"] > runs_before
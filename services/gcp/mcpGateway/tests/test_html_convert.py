@@ -0,0 +1,106 @@
+import os
+import glob
+import pytest
+from unittest.mock import patch
+from tools import html_convert
+from tools.html_convert import html_to_markdown, new_converter, available_backends, resolve_backend
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+FIXTURES = sorted(glob.glob(os.path.join(FIXTURE_DIR, "html", "*.html")))
+BASE_URL = "https://docs.example.com/guide/page.html"
+
+
+def _read(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _golden(path):
+    name = os.path.splitext(os.path.basename(path))[0] + ".md"
+    return _read(os.path.join(FIXTURE_DIR, "markdown", name)).rstrip("\n")
+
+
+@pytest.mark.parametrize("backend", available_backends())
+@pytest.mark.parametrize("path", FIXTURES, ids=os.path.basename)
+def test_backends_match_golden_markdown(path, backend):
+    title, markdown, complete = html_to_markdown(_read(path), backend=backend, base_url=BASE_URL)
+    assert markdown == _golden(path)
+    assert title == html_to_markdown(_read(path), backend="html.parser")[0]
+    assert complete is True
+
+
+@pytest.mark.parametrize("backend", available_backends())
+def test_streaming_backends_match_whole_document_conversion(backend):
+    for path in FIXTURES:
+        html = _read(path)
+        converter = new_converter(None, backend, BASE_URL)
+        for i in range(0, len(html), 7):
+            converter.feed(html[i:i + 7])
+        converter.close()
+        assert converter.result()[1] == _golden(path), path
+
+        # Stopping early yields exactly the prefix of the full conversion
+        full = _golden(path)
+        _, partial, complete = html_to_markdown(html, max_chars=40, backend=backend, base_url=BASE_URL)
+        assert partial[:40] == full[:40]
+        assert complete == (len(full) <= 40) or backend == "bs4"
+
+
+@pytest.mark.parametrize("backend", available_backends())
+def test_link_dense_blocks_are_dropped_as_boilerplate(backend):
+    links = " ".join(f"<a href='/p{i}'>Page {i}</a>" for i in range(12))
+    html = (f"<body><div class='menu'>{links}</div>"
+            f"<div><p>Real content with a <a href='/one'>single link</a> inside a long sentence.</p></div></body>")
+    _, markdown, _ = html_to_markdown(html, backend=backend, base_url="https://example.com/")
+    assert "Page 3" not in markdown
+    assert markdown == "Real content with a [single link](https://example.com/one) inside a long sentence."
+
+
+@pytest.mark.parametrize("backend", [b for b in available_backends() if b != "bs4"])
+@pytest.mark.parametrize("layout", ["<body><div id='app'>{}</div></body>", "<div class='page'><main>{}</main></div>"])
+def test_wrapped_layouts_stop_early_at_max_chars(layout, backend):
+    paragraphs = "".join(f"<div class='entry'><p>Paragraph {i} of a wrapped single page application.</p></div>" for i in range(2000))
+    html = layout.format(paragraphs)
+    full = html_to_markdown(html, backend=backend)[1]
+
+    converter = new_converter(5000, backend, None)
+    fed = 0
+    while fed < len(html) and not converter.done:
+        converter.feed(html[fed:fed + 4096])
+        fed += 4096
+    assert converter.done and fed < len(html) / 4
+    _, partial, complete = html_to_markdown(html, max_chars=5000, backend=backend)
+    assert complete is False and len(partial) > 5000 and full.startswith(partial)
+
+
+@pytest.mark.parametrize("backend", available_backends())
+def test_media_and_article_link_lists_are_not_boilerplate(backend):
+    links = "".join(f"<li><a href='/ref{i}'>Reference {i}</a></li>" for i in range(4))
+    html = (f"<body><div class='hero'><img src='/arch.png' alt='Architecture'></div>"
+            f"<article><p>See also:</p><ul>{links}</ul></article></body>")
+    _, markdown, _ = html_to_markdown(html, backend=backend, base_url="https://example.com/")
+    assert markdown.startswith("![Architecture](https://example.com/arch.png)\n\nSee also:")
+    assert "- [Reference 3](https://example.com/ref3)" in markdown
+
+
+def test_long_documents_convert_in_linear_time():
+    import time
+
+    def convert(sections):
+        html = "<body><article>" + "<h2>T</h2><p>Some <b>text</b> here.</p><ul><li>a</li><li>b</li></ul>" * sections + "</article></body>"
+        started = time.perf_counter()
+        html_to_markdown(html, backend="html.parser")
+        return time.perf_counter() - started
+
+    convert(200)
+    small, large = convert(1000), convert(8000)
+    assert large < small * 8 * 3
+
+
+def test_unavailable_backend_falls_back_to_stdlib(capsys):
+    with patch.object(html_convert, "etree", None):
+        assert "lxml" not in available_backends()
+        assert resolve_backend("auto") == "html.parser"
+        assert resolve_backend("lxml") == "html.parser"
+    assert resolve_backend("no-such-parser") == "html.parser"
+    assert "unavailable" in capsys.readouterr().out
@@ -0,0 +1,234 @@
+import os
+import json
+import pytest
+from unittest.mock import patch
+from tools import memory as memory_module
+from tools.memory import remember_entity, recall_entities, prune_expired_memories, LOCAL_MEMORY_FILE
+from tools.memory_index import MemoryIndex, tokenize
+
+INDEX_FILE = f"{LOCAL_MEMORY_FILE}.index.json"
+
+ENTITIES = {
+    "Cloud Run": {"category": "Infrastructure", "observations": ["Serverless containers on GCP.", "Supports WebSockets."]},
+    "Cloud Functions": {"category": "Infrastructure", "observations": ["Event driven functions."]},
+    "Release Notes": {"category": "Tech Intelligence", "observations": ["Cloud Run added GPU support."]},
+}
+
+
+@pytest.fixture(autouse=True)
+def cleanup_local_memory():
+    for path in (LOCAL_MEMORY_FILE, INDEX_FILE):
+        if os.path.exists(path):
+            os.remove(path)
+    with patch("tools.memory_storage.get_bucket", return_value=None):
+        yield
+    for path in (LOCAL_MEMORY_FILE, INDEX_FILE):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def test_tokenize_lowercases_words():
+    assert tokenize("Cloud-Run v2, GPU!") == ["cloud", "run", "v2", "gpu"]
+
+
+def test_search_requires_every_term_and_ranks_name_matches_first():
+    index = MemoryIndex.build(ENTITIES)
+    ranked = [name for name, _ in index.search("cloud run")]
+    assert ranked == ["Cloud Run", "Release Notes"]
+    assert index.search("cloud websockets")[0][0] == "Cloud Run"
+    assert index.search("cloud nonexistent") == []
+
+
+def test_search_matches_substrings_and_filters_category():
+    index = MemoryIndex.build(ENTITIES)
+    assert {name for name, _ in index.search("serverless contain")} == {"Cloud Run"}
+    assert {name for name, _ in index.search("func")} == {"Cloud Functions"}
+    assert {name for name, _ in index.search("cloud", category="tech intelligence")} == {"Release Notes"}
+
+
+def test_index_updates_and_round_trips():
+    index = MemoryIndex.build(ENTITIES)
+    index.update("Cloud Functions", None)
+    assert index.search("event") == []
+    index.update("Cloud Functions", {"category": "Infrastructure", "observations": ["Now 2nd gen."]})
+    assert [name for name, _ in index.search("2nd")] == ["Cloud Functions"]
+
+    restored = MemoryIndex.from_dict(json.loads(json.dumps(index.to_dict())))
+    assert restored.search("cloud run") == index.search("cloud run")
+
+
+@pytest.mark.asyncio
+async def test_recall_uses_index_with_pagination_and_incremental_updates():
+    for name, data in ENTITIES.items():
+        await remember_entity(name=name, category=data["category"], observations=data["observations"])
+
+    first = await recall_entities(query="cloud", limit=2)
+    assert first["matches"] == 3
+    assert list(first["entities"]) == ["Cloud Functions", "Cloud Run"]
+    second = await recall_entities(query="cloud", limit=2, offset=2)
+    assert list(second["entities"]) == ["Release Notes"]
+
+    await remember_entity(name="Cloud Functions", category="Infrastructure", observations=["Handles Pub/Sub triggers."])
+    assert "Cloud Functions" in (await recall_entities(query="pub sub"))["entities"]
+
+    await remember_entity(name="Old News", category="Temporary", observations=["Cloud outage."], ttl_days=-1)
+    assert "Old News" not in (await recall_entities(query="outage"))["entities"]
+    await prune_expired_memories()
+    assert (await recall_entities(query="outage", include_expired=True))["matches"] == 0
+
+
+@pytest.mark.asyncio
+async def test_persisted_index_is_reused_on_cold_start():
+    await remember_entity(name="Cold Start", category="Perf", observations=["Index is persisted."])
+    await recall_entities(query="cold")
+    assert os.path.exists(INDEX_FILE)
+
+    memory_module._invalidate_cache()
+    with patch.object(MemoryIndex, "build", side_effect=AssertionError("index rebuilt")):
+        recalled = await recall_entities(query="persisted")
+    assert "Cold Start" in recalled["entities"]
+
+
+def test_expiry_index_tracks_due_entities_lazily():
+    from tools.memory_index import ExpiryIndex
+
+    entities = {
+        "Old": {"expires_at": "2020-01-01T00:00:00+00:00", "pinned": False},
+        "Pinned": {"expires_at": None, "pinned": True},
+        "Future": {"expires_at": "2999-01-01T00:00:00+00:00", "pinned": False},
+    }
+    expiry = ExpiryIndex.build(entities)
+    assert expiry.expired_now(entities, "2026-01-01T00:00:00+00:00") == {"Old"}
+
+    # Pinning clears the expiry; the stale heap entry for "Future" is ignored later
+    entities["Old"].update({"pinned": True, "expires_at": None})
+    expiry.update("Old", entities["Old"])
+    entities["Future"]["expires_at"] = "2025-06-01T00:00:00+00:00"
+    expiry.update("Future", entities["Future"])
+    assert expiry.expired_now(entities, "2026-01-01T00:00:00+00:00") == {"Future"}
+    assert expiry.expired_now(entities, "3000-01-01T00:00:00+00:00") == {"Future"}
+
+    expiry.update("Future", None)
+    assert expiry.expired_now(entities, "3000-01-01T00:00:00+00:00") == set()
+
+
+def test_adjacency_index_tracks_both_directions():
+    from tools.memory_index import AdjacencyIndex
+
+    relations = [
+        {"from": "A", "type": "calls", "to": "B"},
+        {"from": "C", "type": "calls", "to": "A"},
+    ]
+    index = AdjacencyIndex.build(relations)
+    assert [n for n, _ in index.neighbors("A", "out")] == ["B"]
+    assert [n for n, _ in index.neighbors("A", "in")] == ["C"]
+    assert sorted(n for n, _ in index.neighbors("A")) == ["B", "C"]
+
+    removed = index.remove_node("A")
+    assert len(removed) == 2
+    assert index.neighbors("B") == [] and index.neighbors("C") == []
+
+
+def test_adjacency_index_tolerates_legacy_relations_without_type():
+    from tools.memory_index import AdjacencyIndex
+
+    index = AdjacencyIndex.build([
+        {"from": "A", "type": None, "to": "B"},
+        {"from": "A", "type": "calls", "to": "C"},
+    ])
+    assert sorted(n for n, _ in index.neighbors("A")) == ["B", "C"]
+    assert [n for n, _ in index.neighbors("A", relation_type="CALLS")] == ["C"]
+
+
+@pytest.mark.asyncio
+async def test_cursor_pagination_is_stable_across_writes():
+    for i in range(5):
+        await remember_entity(name=f"Page {i}", category="Paging", observations=[f"obs {j}" for j in range(4)])
+
+    first = await recall_entities(category="paging", limit=2, fields=["name", "observations"], max_observations=1)
+    assert list(first["entities"]) == ["Page 0", "Page 1"]
+    assert first["entities"]["Page 0"] == {"name": "Page 0", "observations": ["obs 3"], "observations_truncated": 3}
+
+    # A write sorting before the cursor does not shift the next page
+    await remember_entity(name="Page 00", category="Paging", observations=["late arrival"])
+    second = await recall_entities(category="paging", limit=2, cursor=first["next_cursor"])
+    assert list(second["entities"]) == ["Page 2", "Page 3"]
+    third = await recall_entities(category="paging", limit=2, cursor=second["next_cursor"])
+    assert list(third["entities"]) == ["Page 4"] and third["next_cursor"] is None
+
+    with pytest.raises(ValueError):
+        await recall_entities(query="page", cursor=first["next_cursor"])
+    with pytest.raises(ValueError):
+        await recall_entities(fields=["secret"])
+
+
+@pytest.mark.asyncio
+async def test_ranked_query_cursor_walks_every_match_once():
+    for name, data in ENTITIES.items():
+        await remember_entity(name=name, category=data["category"], observations=data["observations"])
+
+    seen, cursor = [], None
+    while True:
+        page = await recall_entities(query="cloud", limit=1, cursor=cursor)
+        seen.extend(page["entities"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == list((await recall_entities(query="cloud"))["entities"])
+    assert len(seen) == 3
+
+
+@pytest.mark.asyncio
+async def test_ranked_query_cursor_survives_writes_that_change_scores():
+    for i in range(6):
+        await remember_entity(name=f"E{i}", category="Ranked", observations=["alpha " * (i + 1) + "release"])
+
+    first = await recall_entities(query="alpha", limit=3)
+    # Unrelated writes change N, idf and the average length, i.e. every BM25 score
+    for i in range(20):
+        await remember_entity(name=f"Filler {i}", category="Other", observations=[f"unrelated note number {i}"])
+    second = await recall_entities(query="alpha", limit=3, cursor=first["next_cursor"])
+
+    assert len(first["entities"]) == len(second["entities"]) == 3
+    assert set(first["entities"]) | set(second["entities"]) == {f"E{i}" for i in range(6)}
+    assert second["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_cursor_resumes_by_name_when_its_snapshot_is_gone():
+    for i in range(6):
+        await remember_entity(name=f"R{i}", category="Ranked", observations=["beta " * (i + 1)])
+
+    first = await recall_entities(query="beta", limit=2)
+    memory_module._state()["cursors"].clear()  # e.g. served by another instance
+    await remember_entity(name="Filler", category="Other", observations=["unrelated"])
+    rest = await recall_entities(query="beta", cursor=first["next_cursor"])
+
+    assert list(first["entities"]) + list(rest["entities"]) == list((await recall_entities(query="beta"))["entities"])
+
+
+@pytest.mark.asyncio
+async def test_cursor_snapshots_keep_only_the_unreturned_ranking_within_bounds():
+    for i in range(6):
+        await remember_entity(name=f"W{i}", category="Window", observations=["gamma " * (i + 1)])
+    cursors = memory_module._state()["cursors"]
+    cursors.clear()
+
+    listing = await recall_entities(category="window", limit=2)
+    assert listing["next_cursor"] is not None and not cursors
+
+    first = await recall_entities(query="gamma", limit=2)
+    (snapshot,) = cursors.values()
+    assert snapshot["names"] == [name for name in (await recall_entities(query="gamma"))["entities"]][2:]
+    second = await recall_entities(query="gamma", limit=2, cursor=first["next_cursor"])
+    assert [len(kept["names"]) for kept in cursors.values()] == [2] and second["matches"] == 6
+
+    with patch.object(memory_module, "CURSOR_TTL_SECONDS", 0):
+        rest = await recall_entities(query="gamma", cursor=second["next_cursor"])
+    assert not cursors and len(rest["entities"]) == 2
+
+    with patch.object(memory_module, "CURSOR_SNAPSHOT_NAMES", 5):
+        for _ in range(3):
+            await recall_entities(query="gamma", limit=2)
+    assert sum(len(kept["names"]) for kept in cursors.values()) <= 5
+
@@ -0,0 +1,432 @@
+import os
+import json
+import random
+import asyncio
+import pytest
+from unittest.mock import patch
+from tests.fake_gcs import FakeBucket, FakeBlob
+from tools import memory as memory_module
+from tools.memory import remember_entity, recall_entities, prune_expired_memories, LOCAL_MEMORY_FILE
+
+JOURNAL_FILE = f"{LOCAL_MEMORY_FILE}.journal"
+INDEX_FILE = f"{LOCAL_MEMORY_FILE}.index.json"
+
+
+def _forget_resident_graph():
+    """Simulates a cold start on another instance."""
+    memory_module._invalidate_cache()
+
+
+@pytest.fixture(autouse=True)
+def journal_mode():
+    for path in (LOCAL_MEMORY_FILE, JOURNAL_FILE, INDEX_FILE):
+        if os.path.exists(path):
+            os.remove(path)
+    with patch.object(memory_module, "MEMORY_STORAGE_MODE", "journal"):
+        yield
+    for path in (LOCAL_MEMORY_FILE, JOURNAL_FILE, INDEX_FILE):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+@pytest.fixture
+def local_only():
+    with patch("tools.memory_storage.get_bucket", return_value=None):
+        yield
+
+
+@pytest.mark.asyncio
+async def test_local_journal_appends_deltas_and_replays(local_only):
+    await remember_entity(name="Journal A", category="Log", observations=["first"])
+    await remember_entity(name="Journal A", category="Log", observations=["second"])
+
+    assert not os.path.exists(LOCAL_MEMORY_FILE)
+    with open(JOURNAL_FILE) as f:
+        records = [json.loads(line) for line in f]
+    assert [r["op"] for r in records] == ["upsert", "observe", "upsert", "observe"]
+
+    _forget_resident_graph()
+    recalled = await recall_entities(query="Journal")
+    assert recalled["entities"]["Journal A"]["observations"] == ["first", "second"]
+
+
+@pytest.mark.asyncio
+async def test_local_journal_tail_is_replayed_incrementally(local_only):
+    await remember_entity(name="Tail Entity", category="Log", observations=["one"])
+    await recall_entities()
+    refreshes = memory_module.CACHE_STATS["refreshes"]
+
+    # Another process appends a record to the journal
+    with open(JOURNAL_FILE, "a") as f:
+        f.write(json.dumps({"op": "observe", "name": "Tail Entity", "observations": ["two"]}) + "\n")
+
+    recalled = await recall_entities(query="Tail")
+    assert memory_module.CACHE_STATS["refreshes"] == refreshes + 1
+    assert recalled["entities"]["Tail Entity"]["observations"] == ["one", "two"]
+
+
+@pytest.mark.asyncio
+async def test_local_journal_compacts_into_snapshot(local_only):
+    with patch("tools.memory_storage.JOURNAL_COMPACT_OPS", 4):
+        await remember_entity(name="Compact A", category="Log", observations=["a"])
+        await remember_entity(name="Compact B", category="Log", observations=["b"])
+
+    assert not os.path.exists(JOURNAL_FILE)
+    with open(LOCAL_MEMORY_FILE) as f:
+        snapshot = json.load(f)
+    assert set(snapshot["entities"]) == {"Compact A", "Compact B"}
+
+    await prune_expired_memories()
+    _forget_resident_graph()
+    recalled = await recall_entities()
+    assert recalled["total_count"] == 2
+
+
+@pytest.mark.asyncio
+async def test_journal_mode_reads_legacy_single_blob(local_only):
+    legacy = {"entities": {"Legacy": {"name": "Legacy", "category": "Old", "observations": ["kept"]}}, "relations": []}
+    with open(LOCAL_MEMORY_FILE, "w") as f:
+        json.dump(legacy, f, indent=2)
+
+    await remember_entity(name="Legacy", category="Old", observations=["added"])
+    _forget_resident_graph()
+    recalled = await recall_entities(query="Legacy")
+    assert recalled["entities"]["Legacy"]["observations"] == ["kept", "added"]
+
+
+@pytest.mark.asyncio
+async def test_gcs_journal_segments_are_shared_between_instances():
+    bucket = FakeBucket()
+    with patch("tools.memory_storage.get_bucket", return_value=bucket):
+        await remember_entity(name="Segment Entity", category="Cloud", observations=["from instance 1"])
+        segments = [n for n in bucket.objects if n.startswith("knowledge_graph.json.journal/")]
+        assert len(segments) == 1
+        assert "knowledge_graph.json" not in bucket.objects
+
+        _forget_resident_graph()
+        await remember_entity(name="Segment Entity", category="Cloud", observations=["from instance 2"])
+        recalled = await recall_entities(query="Segment")
+        assert recalled["entities"]["Segment Entity"]["observations"] == ["from instance 1", "from instance 2"]
+
+        with patch("tools.memory_storage.JOURNAL_COMPACT_OPS", 1):
+            await prune_expired_memories()
+        assert not [n for n in bucket.objects if n.startswith("knowledge_graph.json.journal/")]
+
+        _forget_resident_graph()
+        recalled = await recall_entities(query="Segment")
+        assert len(recalled["entities"]["Segment Entity"]["observations"]) == 2
+
+
+
+@pytest.mark.asyncio
+async def test_journal_writes_with_unknown_version_still_report_success():
+    bucket = FakeBucket()
+    with patch("tools.memory_storage.get_bucket", return_value=bucket):
+        first = await remember_entity(name="Stored", category="Cloud", observations=["first segment"])
+        with patch("tools.memory_storage.JOURNAL_COMPACT_OPS", 1):
+            compacted = await remember_entity(name="Stored", category="Cloud", observations=["compacted"])
+        assert "knowledge_graph.json" in bucket.objects
+        after = await remember_entity(name="Stored", category="Cloud", observations=["after compaction"])
+
+        _forget_resident_graph()
+        recalled = await recall_entities(query="Stored")
+
+    assert [first["status"], compacted["status"], after["status"]] == ["success"] * 3
+    assert recalled["entities"]["Stored"]["observations"] == ["first segment", "compacted", "after compaction"]
+
+
+@pytest.mark.asyncio
+async def test_local_journal_append_after_another_process_reports_success(local_only):
+    await remember_entity(name="Shared Log", category="Log", observations=["ours"])
+    with open(JOURNAL_FILE, "a") as f:
+        f.write(json.dumps({"op": "observe", "name": "Shared Log", "observations": ["theirs"]}) + "\n")
+
+    with patch.object(memory_module, "_load_memory_locked", return_value=memory_module._state()["memory"]):
+        result = await remember_entity(name="Shared Log", category="Log", observations=["ours again"])
+    recalled = await recall_entities(query="Shared Log")
+
+    assert result["status"] == "success"
+    assert recalled["entities"]["Shared Log"]["observations"] == ["ours", "theirs", "ours again"]
+
+class RivalWriterBucket(FakeBucket):
+    """Fake bucket where another instance sometimes commits right before our conditional upload."""
+
+    def __init__(self, rival_probability: float):
+        super().__init__()
+        self.rival_probability = rival_probability
+        self.rival_entities = []
+
+    def blob(self, name: str) -> FakeBlob:
+        blob = super().blob(name)
+        upload = blob.upload_from_string
+
+        def upload_with_rival(data, content_type=None, if_generation_match=None, **kwargs):
+            if name == "knowledge_graph.json" and random.random() < self.rival_probability:
+                self._rival_write()
+            return upload(data, content_type=content_type, if_generation_match=if_generation_match, **kwargs)
+
+        blob.upload_from_string = upload_with_rival
+        return blob
+
+    def _rival_write(self):
+        with self.lock:
+            current = self.objects.get("knowledge_graph.json")
+            graph = json.loads(current[0]) if current else {"entities": {}, "relations": []}
+            rival_name = f"Rival {len(self.rival_entities)}"
+            graph["entities"][rival_name] = {"name": rival_name, "category": "Rival", "observations": ["rival"]}
+            FakeBlob(self, "knowledge_graph.json").upload_from_string(
+                json.dumps(graph), if_generation_match=current[1] if current else 0
+            )
+            self.rival_entities.append(rival_name)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_snapshot_writes_are_not_lost():
+    random.seed(7)
+    bucket = RivalWriterBucket(rival_probability=0.5)
+    conflicts_before = memory_module.WRITE_STATS["conflicts"]
+
+    with patch.object(memory_module, "MEMORY_STORAGE_MODE", "snapshot"), \
+         patch.object(memory_module, "WRITE_MAX_ATTEMPTS", 50), \
+         patch.object(memory_module, "WRITE_BACKOFF_BASE_MS", 1), \
+         patch("tools.memory_storage.get_bucket", return_value=bucket):
+        async def staggered_write(i):
+            await asyncio.sleep(random.uniform(0, 0.1))
+            return await remember_entity(name=f"Task {i % 10}", category="Load", observations=[f"fact {i}"])
+
+        await asyncio.gather(*[staggered_write(i) for i in range(60)])
+
+        memory_module._invalidate_cache()
+        recalled = await recall_entities()
+
+    assert bucket.rival_entities
+    assert memory_module.WRITE_STATS["conflicts"] > conflicts_before
+    for rival_name in bucket.rival_entities:
+        assert rival_name in recalled["entities"]
+    for i in range(60):
+        assert f"fact {i}" in recalled["entities"][f"Task {i % 10}"]["observations"]
+
+
+class RacingReadBucket(FakeBucket):
+    """Fake bucket where another instance commits between our get_blob and the download."""
+
+    def __init__(self, races: int):
+        super().__init__()
+        self.races = races
+
+    def get_blob(self, name: str, **kwargs):
+        blob = super().get_blob(name, **kwargs)
+        if blob is not None and name == "knowledge_graph.json" and self.races:
+            self.races -= 1
+            current = self.objects[name]
+            FakeBlob(self, name).upload_from_string(current[0], if_generation_match=current[1])
+        return blob
+
+
+@pytest.mark.asyncio
+async def test_snapshot_read_racing_a_writer_retries_instead_of_falling_back(local_only):
+    bucket = RacingReadBucket(races=0)
+    with patch.object(memory_module, "MEMORY_STORAGE_MODE", "snapshot"), \
+         patch("tools.memory_storage.get_bucket", return_value=bucket):
+        await remember_entity(name="Raced", category="Remote", observations=["stored in GCS"])
+        # A stale local copy must never be served in place of the bucket
+        with open(LOCAL_MEMORY_FILE, "w") as f:
+            json.dump({"entities": {}, "relations": []}, f)
+
+        bucket.races = 2
+        _forget_resident_graph()
+        recalled = await recall_entities()
+        assert bucket.races == 0
+        assert "Raced" in recalled["entities"]
+
+        from tools import memory_storage
+        bucket.races = memory_storage.GCS_READ_ATTEMPTS
+        _forget_resident_graph()
+        with pytest.raises(memory_storage.StorageReadError):
+            await recall_entities()
+        assert memory_module._state()["memory"] is None
+
+
+@pytest.mark.asyncio
+async def test_local_snapshot_detects_external_overwrite(local_only):
+    with patch.object(memory_module, "MEMORY_STORAGE_MODE", "snapshot"):
+        await remember_entity(name="Local Writer", category="Disk", observations=["ours"])
+
+        # Another process rewrites the file between our load and save
+        original_load = memory_module._load_memory_locked
+        rival_writes = []
+
+        async def load_then_external_write():
+            memory = await original_load()
+            if not rival_writes:
+                rival_writes.append("External")
+                with open(LOCAL_MEMORY_FILE, "w") as f:
+                    json.dump({"entities": {"External": {"name": "External", "category": "Disk", "observations": []}}, "relations": []}, f)
+            return memory
+
+        with patch.object(memory_module, "_load_memory_locked", side_effect=load_then_external_write):
+            await remember_entity(name="Local Writer", category="Disk", observations=["second"])
+
+        memory_module._invalidate_cache()
+        recalled = await recall_entities()
+        assert set(recalled["entities"]) == {"External", "Local Writer"}
+        assert recalled["entities"]["Local Writer"]["observations"] == ["second"]
+
+
+@pytest.fixture
+def sharded_mode():
+    import shutil
+    from tools import memory_storage
+
+    shard_dir = f"{LOCAL_MEMORY_FILE}.shards"
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    _forget_resident_graph()
+    with patch.object(memory_module, "MEMORY_STORAGE_MODE", "sharded"), \
+         patch.object(memory_storage, "SHARD_COUNT", 4):
+        yield memory_storage.get_store("sharded")
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    _forget_resident_graph()
+
+
+def _shard_objects(bucket):
+    return sorted(n for n in bucket.objects if n.startswith("knowledge_graph.json.shards/shard-"))
+
+
+@pytest.mark.asyncio
+async def test_sharded_layout_migrates_monolithic_blob_and_writes_one_shard(sharded_mode):
+    bucket = FakeBucket()
+    legacy = {"entities": {
+        f"Legacy {i}": {"name": f"Legacy {i}", "category": "Old", "observations": [f"fact {i}"], "expires_at": None}
+        for i in range(20)
+    }, "relations": []}
+    bucket.blob("knowledge_graph.json").upload_from_string(json.dumps(legacy))
+
+    with patch("tools.memory_storage.get_bucket", return_value=bucket):
+        recalled = await recall_entities(category="Old")
+        assert recalled["total_count"] == 20
+        assert "knowledge_graph.json.shards/manifest.json" in bucket.objects
+        assert len(_shard_objects(bucket)) == 4
+        assert sharded_mode.migrations >= 1
+
+        uploads = bucket.uploads
+        await remember_entity(name="Legacy 3", category="Old", observations=["fresh fact"])
+        assert bucket.uploads - uploads == 1
+
+        _forget_resident_graph()
+        recalled = await recall_entities(query="Legacy")
+    assert recalled["entities"]["Legacy 3"]["observations"] == ["fact 3", "fresh fact"]
+    assert json.loads(bucket.objects["knowledge_graph.json"][0]) == legacy
+
+
+@pytest.mark.asyncio
+async def test_sharded_refresh_downloads_only_changed_shards(sharded_mode):
+    from tools.memory_storage import shard_of
+
+    bucket = FakeBucket()
+    with patch("tools.memory_storage.get_bucket", return_value=bucket):
+        await memory_module.remember_entities([
+            {"name": f"Node {i}", "category": "Shard", "observations": ["v1"]} for i in range(12)
+        ])
+        await recall_entities()
+
+        # Another instance rewrites one shard: updates one entity and removes another
+        victim = shard_of("Node 0", 4)
+        shard_name = f"knowledge_graph.json.shards/shard-{victim:04d}-of-0004.json"
+        shard = json.loads(bucket.objects[shard_name][0])
+        shard["entities"]["Node 0"]["observations"] = ["v2"]
+        removed = next(name for name in shard["entities"] if name != "Node 0")
+        del shard["entities"][removed]
+        bucket.blob(shard_name).upload_from_string(json.dumps(shard))
+
+        downloads = bucket.downloads
+        recalled = await recall_entities(category="Shard")
+        assert bucket.downloads - downloads == 1
+    assert recalled["entities"]["Node 0"]["observations"] == ["v2"]
+    assert removed not in recalled["entities"]
+    assert recalled["total_count"] == 11
+
+
+@pytest.mark.asyncio
+async def test_sharded_write_conflicts_on_rewritten_shard(sharded_mode):
+    from tools.memory_storage import WriteConflict
+
+    bucket = FakeBucket()
+    with patch("tools.memory_storage.get_bucket", return_value=bucket):
+        await remember_entity(name="Contended", category="Shard", observations=["mine"])
+        loaded = sharded_mode.load(None)
+        shard_name = _shard_objects(bucket)[0]
+        bucket.blob(shard_name).upload_from_string(bucket.objects[shard_name][0])
+
+        with pytest.raises(WriteConflict):
+            sharded_mode.persist(loaded.memory, [{"op": "observe", "name": "Contended", "observations": []}], loaded.version)
+
+
+@pytest.mark.asyncio
+async def test_local_sharded_layout_round_trips(local_only, sharded_mode):
+    with open(LOCAL_MEMORY_FILE, "w") as f:
+        json.dump({"entities": {"Local Legacy": {"name": "Local Legacy", "category": "Old", "observations": ["kept"]}}, "relations": []}, f)
+
+    await remember_entity(name="Local New", category="New", observations=["added"])
+    assert os.path.exists(f"{LOCAL_MEMORY_FILE}.shards/manifest.json")
+
+    _forget_resident_graph()
+    recalled = await recall_entities()
+    assert set(recalled["entities"]) == {"Local Legacy", "Local New"}
+
+
+@pytest.mark.asyncio
+async def test_sharded_relations_follow_their_entities(sharded_mode):
+    from tools.memory import store_relation, query_neighbors
+
+    bucket = FakeBucket()
+    with patch("tools.memory_storage.get_bucket", return_value=bucket):
+        await remember_entity(name="Edge Source", category="Graph", observations=["s"])
+        await remember_entity(name="Edge Target", category="Graph", observations=["t"], ttl_days=-1)
+        await store_relation("Edge Source", "Edge Target", "points_to")
+
+        _forget_resident_graph()
+        res = await query_neighbors("Edge Source", include_expired=True)
+        assert list(res["neighbors"]) == ["Edge Target"]
+
+        await prune_expired_memories()
+        _forget_resident_graph()
+        res = await query_neighbors("Edge Source", include_expired=True)
+    assert res["relations"] == []
+
+
+def test_snapshot_codec_round_trips_every_available_format():
+    from tools.memory_codec import available_formats, encode_graph, decode_graph, FORMAT_MAGIC
+
+    graph = {"entities": {"Ünicode": {"name": "Ünicode", "observations": ["naïve"], "pinned": True, "expires_at": None}}, "relations": []}
+    formats = available_formats()
+    assert "json" in formats and "json+gzip" in formats
+    for fmt in formats:
+        data = encode_graph(graph, fmt)
+        assert data.startswith(FORMAT_MAGIC) == (fmt != "json")
+        assert decode_graph(data) == graph
+    # Legacy pretty-printed snapshots carry no header
+    assert decode_graph(json.dumps(graph, indent=2).encode("utf-8")) == graph
+    with pytest.raises(ValueError):
+        encode_graph(graph, "yaml")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("fmt", ["json+gzip", "msgpack+zstd"])
+async def test_snapshot_format_is_detected_on_load(fmt):
+    from tools import memory_codec
+
+    if fmt not in memory_codec.available_formats():
+        pytest.skip(f"{fmt} is not available")
+    bucket = FakeBucket()
+    with patch.object(memory_module, "MEMORY_STORAGE_MODE", "snapshot"), \
+         patch("tools.memory_storage.get_bucket", return_value=bucket):
+        with patch.object(memory_codec, "SNAPSHOT_FORMAT", fmt):
+            await remember_entity(name="Packed", category="Codec", observations=["binary snapshot"])
+        assert bucket.objects["knowledge_graph.json"][0].startswith(f"MGRAPH1:{fmt}\n".encode("ascii"))
+
+        # A reader configured for plain JSON still understands the snapshot and rewrites it as JSON
+        _forget_resident_graph()
+        recalled = await recall_entities(category="Codec")
+        assert recalled["entities"]["Packed"]["observations"] == ["binary snapshot"]
+        await remember_entity(name="Packed", category="Codec", observations=["now json"])
+        assert bucket.objects["knowledge_graph.json"][0].startswith(b"{")
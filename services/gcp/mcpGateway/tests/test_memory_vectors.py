@@ -0,0 +1,89 @@
+import os
+import pytest
+from unittest.mock import patch
+from tools import memory as memory_module
+from tools.memory import remember_entity, recall_entities, LOCAL_MEMORY_FILE, VECTORS_FILE
+from tools.memory_vectors import VectorIndex, vectorize
+
+GENERATED_FILES = (LOCAL_MEMORY_FILE, f"{LOCAL_MEMORY_FILE}.index.json", f"{VECTORS_FILE}.npy", f"{VECTORS_FILE}.json")
+
+
+@pytest.fixture(autouse=True)
+def cleanup_local_memory():
+    for path in GENERATED_FILES:
+        if os.path.exists(path):
+            os.remove(path)
+    with patch("tools.memory_storage.get_bucket", return_value=None):
+        yield
+    for path in GENERATED_FILES:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def test_vectors_are_normalized_and_share_word_forms():
+    a, b, c = vectorize("autoscaler configuration"), vectorize("autoscaling config"), vectorize("billing export")
+    assert abs(float(a @ a) - 1.0) < 1e-5
+    assert float(a @ b) > 0.4
+    assert float(a @ b) > float(a @ c) + 0.3
+
+
+def test_vector_index_reuses_rows_incrementally():
+    index = VectorIndex.build({"GKE": {"category": "Infra", "observations": ["Cluster autoscaling is enabled."]}})
+    rows = dict(index.rows["GKE"])
+
+    index.update("GKE", {"category": "Infra", "observations": ["Cluster autoscaling is enabled.", "Uses spot VMs."]})
+    assert set(rows.items()) < set(index.rows["GKE"].items())
+
+    index.remove("GKE")
+    assert index.search("autoscaling") == []
+    assert len(index.free) == 3
+
+
+@pytest.mark.asyncio
+async def test_semantic_query_matches_different_wording():
+    await remember_entity(name="GKE Cluster", category="Infrastructure", observations=["Horizontal pod autoscaling configured for the API."])
+    await remember_entity(name="Billing", category="Finance", observations=["Monthly invoices exported to BigQuery."])
+
+    assert (await recall_entities(query="autoscaler config"))["matches"] == 0
+    res = await recall_entities(query="autoscaler config", mode="semantic")
+    assert list(res["entities"]) == ["GKE Cluster"]
+    assert 0 < res["scores"]["GKE Cluster"] <= 1
+
+    # Incrementally updated on write
+    await remember_entity(name="Billing", category="Finance", observations=["Budget alerts notify the autoscaler team."])
+    res = await recall_entities(query="autoscaler config", mode="semantic")
+    assert set(res["entities"]) == {"GKE Cluster", "Billing"}
+    assert (await recall_entities(query="autoscaler", mode="semantic", category="finance"))["matches"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cold_start_memory_maps_saved_matrix():
+    await remember_entity(name="Cloud SQL", category="Database", observations=["Postgres replicas in two regions."])
+    await recall_entities(query="postgres replica", mode="semantic")
+    assert os.path.exists(f"{VECTORS_FILE}.npy")
+
+    memory_module._invalidate_cache()
+    with patch.object(VectorIndex, "build", side_effect=AssertionError("matrix should be reused")):
+        res = await recall_entities(query="postgresql replication", mode="semantic")
+    assert list(res["entities"]) == ["Cloud SQL"]
+    assert isinstance(memory_module._state()["vectors"].matrix, __import__("numpy").memmap)
+
+
+@pytest.mark.asyncio
+async def test_semantic_only_writes_persist_vectors_for_restart():
+    with patch.object(memory_module, "INDEX_PERSIST_SECONDS", 0):
+        await remember_entity(name="Pub/Sub", category="Messaging", observations=["Dead letter topic for failed pushes."])
+        await recall_entities(query="dead letter", mode="semantic")
+        await remember_entity(name="Cloud Tasks", category="Messaging", observations=["Retry queue throttles outbound webhooks."])
+        assert memory_module._state()["index"] is None
+
+    memory_module._invalidate_cache()
+    with patch.object(VectorIndex, "build", side_effect=AssertionError("matrix should be reused")):
+        res = await recall_entities(query="webhook retries", mode="semantic")
+    assert list(res["entities"]) == ["Cloud Tasks"]
+
+
+@pytest.mark.asyncio
+async def test_unknown_query_mode_is_rejected():
+    with pytest.raises(ValueError):
+        await recall_entities(query="x", mode="fuzzy")
@@ -1,7 +1,9 @@
 import os
 import pytest
-from unittest.mock import patch, MagicMock
+import httpx
+from unittest.mock import patch
 from tools.radar import run_tech_radar
+from tools.http_client import open_http_client, close_http_client
 from tools.memory import recall_entities, LOCAL_MEMORY_FILE
 
 @pytest.fixture(autouse=True)
@@ -12,6 +14,12 @@ def cleanup_local_memory():
     if os.path.exists(LOCAL_MEMORY_FILE):
         os.remove(LOCAL_MEMORY_FILE)
 
+@pytest.fixture(autouse=True)
+def isolated_web_cache(tmp_path):
+    from tools import web_fetch
+    with patch.object(web_fetch, "_web_cache", web_fetch._WebCache(str(tmp_path / "web_cache"))):
+        yield
+
 @pytest.mark.asyncio
 async def test_run_tech_radar():
     sample_html = """
@@ -24,18 +32,16 @@ async def test_run_tech_radar():
       </body>
     </html>
     """
-    
-    mock_res = MagicMock()
-    mock_res.status_code = 200
-    mock_res.text = sample_html
-    mock_res.raise_for_status = MagicMock()
 
-    with patch("httpx.AsyncClient.get", return_value=mock_res):
+    await open_http_client(transport=httpx.MockTransport(lambda request: httpx.Response(200, html=sample_html)))
+    try:
         radar_res = await run_tech_radar(
             urls=["https://cloud.google.com/run/docs/release-notes"],
             category="GCP Release",
             ttl_days=60
         )
+    finally:
+        await close_http_client()
 
     assert radar_res["status"] == "completed"
     assert radar_res["processed_count"] == 1
@@ -48,3 +54,23 @@ async def test_run_tech_radar():
     entity = recalled["entities"]["Cloud Run Release Notes"]
     assert entity["category"] == "GCP Release"
     assert entity["expires_at"] is not None
+    assert entity["observations"][0] == "Cloud Run August 2026 Updates: Added native WebSocket support for all regions."
+
+
+def test_observations_skip_converter_code_fences_and_truncation_marker():
+    from tools.radar import _observations
+    from tools.html_convert import html_to_markdown
+
+    html = """<body><h2>Deploy</h2>
+    <pre><code class="language-md">Use ```yaml fences:
+```yaml
+replicas: 3
+```</code></pre>
+    <pre><code>gcloud run deploy</code></pre>
+    <p>Revisions roll out gradually.</p></body>"""
+    _, markdown, _ = html_to_markdown(html)
+    assert markdown.count("~~~") == 2
+    markdown += "\n\n...[Truncated due to length]"
+
+    assert _observations(markdown) == ["Deploy: Revisions roll out gradually."]
+
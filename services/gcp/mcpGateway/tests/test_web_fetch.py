@@ -1,6 +1,28 @@
 import pytest
-from unittest.mock import patch, MagicMock
+import httpx
+from contextlib import asynccontextmanager
+from unittest.mock import patch
 from tools.web_fetch import fetch_web_markdown
+from tools.http_client import open_http_client, close_http_client
+
+
+@pytest.fixture(autouse=True)
+def isolated_web_cache(tmp_path):
+    """Each test gets an empty page cache of its own."""
+    from tools import web_fetch
+    cache = web_fetch._WebCache(str(tmp_path / "web_cache"))
+    with patch.object(web_fetch, "_web_cache", cache):
+        yield cache
+
+
+@asynccontextmanager
+async def serving(handler):
+    """Routes the shared HTTP client through `handler` (request -> httpx.Response)."""
+    await open_http_client(transport=httpx.MockTransport(handler))
+    try:
+        yield
+    finally:
+        await close_http_client()
 
 @pytest.mark.asyncio
 async def test_fetch_web_markdown_success():
@@ -16,13 +38,8 @@ async def test_fetch_web_markdown_success():
       </body>
     </html>
     """
-    
-    mock_response = MagicMock()
-    mock_response.status_code = 200
-    mock_response.text = sample_html
-    mock_response.raise_for_status = MagicMock()
 
-    with patch("httpx.AsyncClient.get", return_value=mock_response):
+    async with serving(lambda request: httpx.Response(200, html=sample_html)):
         result = await fetch_web_markdown("https://example.com/test", max_chars=500)
 
     assert result["status_code"] == 200
@@ -36,13 +53,8 @@ async def test_fetch_web_markdown_success():
 @pytest.mark.asyncio
 async def test_fetch_web_markdown_truncation():
     sample_html = "<html><head><title>Long Page</title></head><body>" + "<p>Word </p>" * 100 + "</body></html>"
-    
-    mock_response = MagicMock()
-    mock_response.status_code = 200
-    mock_response.text = sample_html
-    mock_response.raise_for_status = MagicMock()
 
-    with patch("httpx.AsyncClient.get", return_value=mock_response):
+    async with serving(lambda request: httpx.Response(200, html=sample_html)):
         result = await fetch_web_markdown("https://example.com/long", max_chars=50)
 
     assert result["truncated"] is True
@@ -51,9 +63,370 @@ async def test_fetch_web_markdown_truncation():
 
 @pytest.mark.asyncio
 async def test_fetch_web_markdown_error_handling():
-    with patch("httpx.AsyncClient.get", side_effect=Exception("Connection refused")):
+    def refuse(request):
+        raise httpx.ConnectError("Connection refused", request=request)
+
+    async with serving(refuse):
         result = await fetch_web_markdown("https://invalid-domain-does-not-exist.com")
 
     assert result["status"] == "failed"
     assert "error" in result
     assert "Connection refused" in result["error"]
+
+
+@pytest.mark.asyncio
+async def test_fetch_web_markdown_uses_injected_transport():
+    import httpx
+    from tools.http_client import open_http_client, close_http_client, get_http_client
+
+    seen = []
+
+    def handler(request):
+        seen.append(str(request.url))
+        return httpx.Response(200, html="<html><head><title>Mocked</title></head><body><p>From transport</p></body></html>")
+
+    client = await open_http_client(transport=httpx.MockTransport(handler))
+    try:
+        result = await fetch_web_markdown("https://docs.example.com/a")
+        await fetch_web_markdown("https://docs.example.com/b")
+        assert get_http_client() is client
+    finally:
+        await close_http_client()
+
+    assert result["title"] == "Mocked" and "From transport" in result["markdown"]
+    assert seen == ["https://docs.example.com/a", "https://docs.example.com/b"]
+    assert client.is_closed
+
+
+@pytest.mark.asyncio
+async def test_shared_client_reuses_keepalive_connections():
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from tools.http_client import HTTP_STATS, open_http_client, close_http_client
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            body = f"<html><head><title>Page {self.path}</title></head><body>ok</body></html>".encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    await open_http_client()
+    try:
+        before = dict(HTTP_STATS)
+        for i in range(5):
+            result = await fetch_web_markdown(f"{base}/p{i}")
+            assert result["title"] == f"Page /p{i}"
+    finally:
+        await close_http_client()
+        server.shutdown()
+        server.server_close()
+
+    assert HTTP_STATS["requests"] - before["requests"] == 5
+    assert HTTP_STATS["connections_opened"] - before["connections_opened"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fetch_web_markdown_cache_hit_and_revalidation():
+    import httpx
+    from tools import web_fetch
+    from tools.web_fetch import WEB_CACHE_STATS
+    from tools.http_client import open_http_client, close_http_client
+
+    page = "<html><head><title>Release Notes</title></head><body><p>v2 shipped</p></body></html>"
+    requests = []
+
+    def handler(request):
+        requests.append(dict(request.headers))
+        if request.url.path == "/fresh":
+            return httpx.Response(200, html=page, headers={"Cache-Control": "max-age=3600"})
+        if request.headers.get("if-none-match") == '"v2"':
+            return httpx.Response(304, headers={"ETag": '"v2"', "Cache-Control": "no-cache"})
+        return httpx.Response(200, html=page, headers={"ETag": '"v2"', "Cache-Control": "no-cache"})
+
+    before = dict(WEB_CACHE_STATS)
+    await open_http_client(transport=httpx.MockTransport(handler))
+    try:
+        first = await fetch_web_markdown("https://docs.example.com/fresh")
+        second = await fetch_web_markdown("https://docs.example.com/fresh")
+        await fetch_web_markdown("https://docs.example.com/notes")
+        with patch.object(web_fetch, "new_converter", side_effect=AssertionError("parsed a 304")):
+            revalidated = await fetch_web_markdown("https://docs.example.com/notes", max_chars=5)
+    finally:
+        await close_http_client()
+
+    assert (first["cache"], second["cache"], revalidated["cache"]) == ("miss", "hit", "revalidated")
+    assert second["markdown"] == first["markdown"]
+    assert revalidated["status_code"] == 200 and revalidated["truncated"] is True
+    assert len(requests) == 3 and requests[-1]["if-none-match"] == '"v2"'
+    assert WEB_CACHE_STATS["hits"] - before["hits"] == 1
+    assert WEB_CACHE_STATS["revalidated"] - before["revalidated"] == 1
+    assert WEB_CACHE_STATS["misses"] - before["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_web_cache_evicts_least_recently_used(isolated_web_cache):
+    import os
+    from tools import web_fetch
+
+    entry = {"etag": '"x"', "last_modified": None, "fresh_until": 0, "status_code": 200, "title": "t", "markdown": "m"}
+    with patch.object(web_fetch, "WEB_CACHE_MAX_ENTRIES", 2):
+        isolated_web_cache.put("https://a.example.com/", entry)
+        isolated_web_cache.put("https://b.example.com/", entry)
+        assert isolated_web_cache.get("https://a.example.com/") is not None
+        isolated_web_cache.put("https://c.example.com/", entry)
+
+    assert isolated_web_cache.get("https://b.example.com/") is None
+    assert isolated_web_cache.get("https://a.example.com/")["etag"] == '"x"'
+    assert len(os.listdir(isolated_web_cache.directory)) == 2
+
+    # A new process rebuilds the LRU order from the files on disk
+    reopened = web_fetch._WebCache(isolated_web_cache.directory)
+    assert reopened.get("https://c.example.com/")["title"] == "t"
+
+
+@pytest.mark.asyncio
+async def test_fetch_stops_reading_once_max_chars_are_produced():
+    from tools.html_convert import html_to_markdown
+    from tools.web_fetch import WEB_FETCH_STATS
+
+    page = ("<html><head><title>Huge Docs</title></head><body>"
+            + "".join(f"<p>Paragraph {i} of the reference manual.</p>" for i in range(20000)) + "</body></html>").encode()
+    chunks_sent = []
+
+    async def body():
+        for i in range(0, len(page), 4096):
+            chunks_sent.append(i)
+            yield page[i:i + 4096]
+
+    async with serving(lambda request: httpx.Response(200, headers={"Content-Type": "text/html"}, content=body())):
+        result = await fetch_web_markdown("https://docs.example.com/huge", max_chars=300)
+
+    _, full_text, _ = html_to_markdown(page.decode(), base_url="https://docs.example.com/huge")
+    assert result["truncated"] is True
+    assert result["markdown"] == full_text[:300] + "\n\n...[Truncated due to length]"
+    assert len(chunks_sent) < 5 and WEB_FETCH_STATS["stopped_early"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_fetch_caps_bytes_and_refuses_non_text_content():
+    from tools import web_fetch
+
+    seen = []
+
+    def handler(request):
+        seen.append(request.url.path)
+        if request.url.path == "/report.pdf":
+            return httpx.Response(200, headers={"Content-Type": "application/pdf"}, content=b"%PDF-1.7" + b"0" * 10000)
+        return httpx.Response(200, html="<p>" + "x" * 10000 + "</p>")
+
+    with patch.object(web_fetch, "WEB_FETCH_MAX_BYTES", 1024):
+        async with serving(handler):
+            pdf = await fetch_web_markdown("https://docs.example.com/report.pdf")
+            big = await fetch_web_markdown("https://docs.example.com/big", max_chars=100000)
+
+    assert pdf["status"] == "failed" and "application/pdf" in pdf["error"]
+    assert big["truncated"] is True and big["markdown"].endswith("...[Truncated at download size limit]")
+    assert len(big["markdown"]) < 10000
+
+
+@pytest.mark.asyncio
+async def test_fetch_returns_structured_markdown_and_ignores_old_cache_format(isolated_web_cache):
+    page = ("<html><head><title>Guide</title></head><body><main><h2>Install</h2>"
+            "<ul><li>Read <a href='../faq'>the FAQ</a></li></ul><pre><code>pip install x</code></pre></main></body></html>")
+    isolated_web_cache.put("https://docs.example.com/guide/install", {"format": 1, "fresh_until": 2e9, "title": "Guide", "markdown": "flat text"})
+
+    async with serving(lambda request: httpx.Response(200, html=page)):
+        result = await fetch_web_markdown("https://docs.example.com/guide/install")
+
+    assert result["cache"] == "miss"
+    assert result["markdown"] == "## Install\n\n- Read [the FAQ](https://docs.example.com/faq)\n\n```\npip install x\n```"
+
+
+class _StandIn:
+    """Local HTTP server recording request start times and peak concurrency; `respond(path, hits)`
+    returns (status, headers) for each request."""
+
+    def __init__(self, respond, delay=0.05):
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.starts, self.hits, self.active, self.peak = [], {}, 0, 0
+        lock = threading.Lock()
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                import time
+                with lock:
+                    standin.starts.append(time.monotonic())
+                    standin.hits[self.path] = hits = standin.hits.get(self.path, 0) + 1
+                    standin.active += 1
+                    standin.peak = max(standin.peak, standin.active)
+                time.sleep(delay)
+                status, headers = respond(self.path, hits)
+                body = f"<html><head><title>{self.path}</title></head><body><p>ok</p></body></html>".encode()
+                self.send_response(status)
+                for name, value in {"Content-Type": "text/html", **headers}.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with lock:
+                    standin.active -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.port = self.server.server_port
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.mark.asyncio
+async def test_scheduler_limits_per_host_concurrency_and_interval():
+    import asyncio
+    from tools import web_fetch
+
+    standin = _StandIn(lambda path, hits: (200, {}), delay=0.15)
+    base = f"http://127.0.0.1:{standin.port}"
+    await open_http_client()
+    try:
+        with patch.object(web_fetch, "WEB_FETCH_HOST_CONCURRENCY", 2), patch.object(web_fetch, "WEB_FETCH_HOST_INTERVAL", 0.06):
+            fetches = asyncio.gather(*(fetch_web_markdown(f"{base}/p{i}") for i in range(6)))
+            await asyncio.sleep(0.02)
+            during = web_fetch.fetch_scheduler_stats()
+            results = await fetches
+        after = web_fetch.fetch_scheduler_stats()
+    finally:
+        await close_http_client()
+        standin.close()
+
+    assert [r["title"] for r in results] == [f"/p{i}" for i in range(6)]
+    assert standin.peak == 2
+    gaps = [b - a for a, b in zip(standin.starts, standin.starts[1:])]
+    assert min(gaps) >= 0.055
+    host = during["hosts"][f"127.0.0.1:{standin.port}"]
+    assert host["in_flight"] == 1 and host["queued"] == 5
+    assert after["in_flight"] == 0 and after["queued"] == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_enforces_global_ceiling_across_hosts():
+    import asyncio
+    from tools import web_fetch
+
+    standin = _StandIn(lambda path, hits: (200, {}))
+    await open_http_client()
+    try:
+        with patch.object(web_fetch, "WEB_FETCH_MAX_CONCURRENCY", 1):
+            await asyncio.gather(*(
+                fetch_web_markdown(f"http://{host}:{standin.port}/{host}")
+                for host in ("127.0.0.1", "localhost") for _ in range(2)
+            ))
+    finally:
+        await close_http_client()
+        standin.close()
+
+    assert len(standin.starts) == 4 and standin.peak == 1
+
+
+@pytest.mark.asyncio
+async def test_throttled_fetch_honours_retry_after():
+    import time
+    from tools.web_fetch import WEB_FETCH_STATS
+
+    standin = _StandIn(lambda path, hits: (429, {"Retry-After": "1"}) if hits == 1 else (200, {}), delay=0)
+    before = dict(WEB_FETCH_STATS)
+    await open_http_client()
+    try:
+        started = time.monotonic()
+        result = await fetch_web_markdown(f"http://127.0.0.1:{standin.port}/limited")
+        elapsed = time.monotonic() - started
+    finally:
+        await close_http_client()
+        standin.close()
+
+    assert result["status_code"] == 200 and result["title"] == "/limited"
+    assert standin.hits["/limited"] == 2 and elapsed >= 0.95
+    assert WEB_FETCH_STATS["throttled"] - before["throttled"] == 1
+    assert WEB_FETCH_STATS["retries"] - before["retries"] == 1
+
+
+@pytest.mark.asyncio
+async def test_throttled_fetch_backs_off_then_gives_up():
+    from tools import web_fetch
+
+    standin = _StandIn(lambda path, hits: (503, {"Retry-After": "3600"} if path == "/maintenance" else {}), delay=0)
+    base = f"http://127.0.0.1:{standin.port}"
+    await open_http_client()
+    try:
+        with patch.object(web_fetch, "WEB_FETCH_MAX_RETRIES", 2), patch.object(web_fetch, "WEB_FETCH_BACKOFF_BASE", 0.02):
+            overloaded = await fetch_web_markdown(f"{base}/overloaded")
+            maintenance = await fetch_web_markdown(f"{base}/maintenance")
+    finally:
+        await close_http_client()
+        standin.close()
+
+    assert overloaded["status"] == "failed" and "503" in overloaded["error"]
+    assert standin.hits["/overloaded"] == 3
+    gaps = [b - a for a, b in zip(standin.starts[:3], standin.starts[1:3])]
+    assert gaps[0] >= 0.01 and gaps[1] >= 0.02  # base * 2**attempt, at least half of it with jitter
+    # A Retry-After beyond WEB_FETCH_RETRY_AFTER_MAX is not waited out
+    assert maintenance["status"] == "failed" and standin.hits["/maintenance"] == 1
+
+
+def test_retry_delay_uses_jittered_exponential_backoff():
+    import time
+    from email.utils import formatdate
+    from tools.web_fetch import _retry_delay, WEB_FETCH_BACKOFF_BASE
+
+    for attempt in range(4):
+        delays = {_retry_delay({}, attempt) for _ in range(20)}
+        backoff = WEB_FETCH_BACKOFF_BASE * 2 ** attempt
+        assert all(backoff / 2 <= d <= backoff for d in delays) and len(delays) > 1
+    assert _retry_delay({"retry-after": "7"}, 0) == 7
+    assert 8 <= _retry_delay({"retry-after": formatdate(time.time() + 10, usegmt=True)}, 0) <= 10
+    assert _retry_delay({"retry-after": "86400"}, 0) is None
+
+
+@pytest.mark.asyncio
+async def test_page_cache_does_not_wait_for_memory_storage_io():
+    import asyncio
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from tools import memory_storage
+
+    page = "<html><head><title>Cached</title></head><body><p>fresh for an hour</p></body></html>"
+    async with serving(lambda request: httpx.Response(200, html=page, headers={"Cache-Control": "max-age=3600"})):
+        await fetch_web_markdown("https://docs.example.com/cached")
+
+    # A slow GCS download occupies every memory I/O thread
+    release = threading.Event()
+    stalled = ThreadPoolExecutor(max_workers=1)
+    with patch.object(memory_storage, "_io_executor", stalled):
+        slow = asyncio.ensure_future(memory_storage.run_blocking(release.wait, 5))
+        try:
+            result = await asyncio.wait_for(fetch_web_markdown("https://docs.example.com/cached"), timeout=1)
+        finally:
+            release.set()
+            await slow
+            stalled.shutdown()
+
+    assert result["cache"] == "hit" and result["title"] == "Cached"
@@ -0,0 +1,195 @@
+import os
+import time
+import asyncio
+import weakref
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, List, Optional, Tuple
+from tools.html_convert import html_to_markdown
+
+# Worker processes converting large pages off the event loop (0 converts inline), how many
+# conversions may wait for a worker before callers are refused, and the per-page time limit
+CONVERT_WORKERS = int(os.getenv("WEB_CONVERT_WORKERS", str(min(2, os.cpu_count() or 1))))
+CONVERT_QUEUE_MAX = int(os.getenv("WEB_CONVERT_QUEUE_MAX", "16"))
+CONVERT_TIMEOUT = float(os.getenv("WEB_CONVERT_TIMEOUT_SECONDS", "10"))
+
+CONVERT_STATS: Dict[str, Any] = {
+    "submitted": 0, "completed": 0, "rejected": 0, "timeouts": 0, "failures": 0, "restarts": 0,
+    "queue_depth": 0, "running": 0, "busy_seconds": 0.0
+}
+
+# Each worker is a single-process executor, so a worker stuck on one page can be terminated and
+# replaced without failing the conversions running on the others
+_workers: List[ProcessPoolExecutor] = []
+_idle: List[ProcessPoolExecutor] = []
+_workers_lock = threading.Lock()
+_pool_started_at = 0.0
+# Per-event-loop worker permits (callers beyond CONVERT_WORKERS wait, up to CONVERT_QUEUE_MAX of them)
+_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _warm() -> int:
+    return os.getpid()
+
+
+def _new_worker() -> ProcessPoolExecutor:
+    # spawn: workers must not inherit the parent's threads (storage pools) or sockets
+    worker = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    worker.submit(_warm).result()
+    return worker
+
+
+def _kill_worker(worker: ProcessPoolExecutor) -> None:
+    for process in list((getattr(worker, "_processes", None) or {}).values()):
+        process.terminate()
+    worker.shutdown(wait=False, cancel_futures=True)
+
+
+def start_convert_pool() -> None:
+    """Starts the worker processes (from the app lifespan) and waits until each has booted."""
+    global _pool_started_at
+    if CONVERT_WORKERS <= 0:
+        return
+    with _workers_lock:
+        while len(_workers) < CONVERT_WORKERS:
+            worker = _new_worker()
+            _workers.append(worker)
+            _idle.append(worker)
+        _pool_started_at = _pool_started_at or time.monotonic()
+
+
+def stop_convert_pool(kill: bool = False) -> None:
+    """Shuts the workers down; `kill` terminates them mid-task."""
+    with _workers_lock:
+        workers = list(_workers)
+        _workers.clear()
+        _idle.clear()
+    for worker in workers:
+        if kill:
+            _kill_worker(worker)
+        else:
+            worker.shutdown(wait=True, cancel_futures=True)
+
+
+def _checkout() -> Optional[ProcessPoolExecutor]:
+    with _workers_lock:
+        return _idle.pop() if _idle else None
+
+
+def _checkin(worker: ProcessPoolExecutor) -> None:
+    """Returns a healthy worker to the idle list (or retires it when the pool was stopped or shrunk)."""
+    with _workers_lock:
+        if worker in _workers and len(_workers) <= CONVERT_WORKERS:
+            _idle.append(worker)
+            return
+        if worker in _workers:
+            _workers.remove(worker)
+    worker.shutdown(wait=False)
+
+
+def _replace_worker(worker: ProcessPoolExecutor) -> None:
+    """Terminates one stuck or crashed worker and starts a fresh one in its place."""
+    CONVERT_STATS["restarts"] += 1
+    with _workers_lock:
+        replace = worker in _workers
+        if replace:
+            _workers.remove(worker)
+    _kill_worker(worker)
+    if replace:
+        fresh = _new_worker()
+        with _workers_lock:
+            _workers.append(fresh)
+            _idle.append(fresh)
+
+
+def _add_worker() -> ProcessPoolExecutor:
+    """Starts a worker for a caller that found none idle (the pool is shared by every event loop)."""
+    worker = _new_worker()
+    with _workers_lock:
+        _workers.append(worker)
+    return worker
+
+
+def _slot() -> asyncio.Semaphore:
+    """Per-event-loop semaphore with one permit per worker."""
+    loop = asyncio.get_running_loop()
+    slot = _slots.get(loop)
+    if slot is None:
+        slot = _slots[loop] = asyncio.Semaphore(CONVERT_WORKERS)
+    return slot
+
+
+async def convert_html(html: str, max_chars: Optional[int] = None, base_url: Optional[str] = None) -> Tuple[Optional[str], str, bool]:
+    """
+    Converts a page in a worker process (see html_to_markdown for the result). Callers wait for a
+    free worker, but RuntimeError is raised when CONVERT_QUEUE_MAX are already waiting or the
+    conversion exceeds CONVERT_TIMEOUT; the timed-out worker alone is terminated and replaced,
+    so one giant page cannot hold a worker indefinitely or fail conversions on other workers.
+
+    Args:
+        html: Complete page markup.
+        max_chars: Stop once more than this many characters of markdown were produced.
+        base_url: URL relative links are resolved against.
+    """
+    if CONVERT_WORKERS <= 0:
+        return html_to_markdown(html, max_chars, None, base_url)
+    slot = _slot()
+    if slot.locked() and CONVERT_STATS["queue_depth"] >= CONVERT_QUEUE_MAX:
+        CONVERT_STATS["rejected"] += 1
+        raise RuntimeError("HTML conversion queue is full; try again later.")
+
+    CONVERT_STATS["submitted"] += 1
+    CONVERT_STATS["queue_depth"] += 1
+    try:
+        await slot.acquire()
+    finally:
+        CONVERT_STATS["queue_depth"] -= 1
+    try:
+        if not _workers:
+            await asyncio.to_thread(start_convert_pool)
+        worker = _checkout() or await asyncio.to_thread(_add_worker)
+        CONVERT_STATS["running"] += 1
+        started = time.monotonic()
+        conversion = worker.submit(html_to_markdown, html, max_chars, None, base_url)
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(conversion), timeout=CONVERT_TIMEOUT)
+        except asyncio.TimeoutError:
+            CONVERT_STATS["timeouts"] += 1
+            await asyncio.to_thread(_replace_worker, worker)
+            raise RuntimeError(f"HTML conversion timed out after {CONVERT_TIMEOUT:g}s")
+        except BrokenProcessPool:
+            CONVERT_STATS["failures"] += 1
+            await asyncio.to_thread(_replace_worker, worker)
+            raise RuntimeError("HTML conversion worker stopped unexpectedly")
+        except asyncio.CancelledError:
+            if conversion.running():
+                # The caller is gone but the worker is still busy with its page: replace it on a
+                # thread this cancellation does not reach instead of handing it to the next caller
+                asyncio.get_running_loop().run_in_executor(None, _replace_worker, worker)
+            else:
+                _checkin(worker)
+            raise
+        except BaseException:
+            _checkin(worker)
+            raise
+        finally:
+            CONVERT_STATS["running"] -= 1
+            CONVERT_STATS["busy_seconds"] += time.monotonic() - started
+        _checkin(worker)
+    finally:
+        slot.release()
+    CONVERT_STATS["completed"] += 1
+    return result
+
+
+def convert_stats() -> Dict[str, Any]:
+    """Pool counters plus queue depth and worker utilization since the pool started."""
+    uptime = time.monotonic() - _pool_started_at if _workers else 0.0
+    return {
+        **CONVERT_STATS,
+        "busy_seconds": round(CONVERT_STATS["busy_seconds"], 3),
+        "workers": len(_workers),
+        "utilization": round(CONVERT_STATS["busy_seconds"] / (uptime * CONVERT_WORKERS), 4) if uptime and CONVERT_WORKERS else 0.0,
+    }
@@ -0,0 +1,601 @@
+import os
+import re
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+from typing import Dict, List, Optional, Tuple, Union
+
+try:
+    from lxml import etree
+except ImportError:  # pragma: no cover - listed in requirements.txt
+    etree = None
+
+try:
+    from bs4 import BeautifulSoup, NavigableString, CData, Tag
+except ImportError:  # pragma: no cover - listed in requirements.txt
+    BeautifulSoup = None
+
+# HTML-to-markdown backend: "lxml" (libxml2, C), "html.parser" (stdlib, pure Python), "bs4"
+# (BeautifulSoup over html.parser, buffers the whole page) or "auto" (fastest available)
+HTML_PARSER_BACKEND = os.getenv("HTML_PARSER_BACKEND", "auto")
+AUTO_BACKEND_ORDER = ("lxml", "html.parser")
+# Markup fed to a converter per step, so conversion of a complete document can still stop early
+FEED_CHUNK_CHARS = 64 * 1024
+
+# Boilerplate removal: a scored container holding at least BOILERPLATE_MIN_LINKS links is dropped
+# when more than this share of its text is link text (menus, breadcrumbs, "related" boxes), or
+# when it holds many elements but on average fewer than BOILERPLATE_MIN_TEXT_DENSITY characters
+# of text per element (widgets). Containers without text that hold media, containers inside
+# CONTENT_TAGS and containers holding more than BOILERPLATE_CONTENT_CHARS characters of non-link
+# text are always kept (the latter is decided as soon as it is reached, so wrappers stream)
+BOILERPLATE_LINK_DENSITY = float(os.getenv("HTML_BOILERPLATE_LINK_DENSITY", "0.5"))
+BOILERPLATE_MIN_LINKS = 3
+BOILERPLATE_MIN_TEXT_DENSITY = float(os.getenv("HTML_BOILERPLATE_MIN_TEXT_DENSITY", "3"))
+BOILERPLATE_MIN_ELEMENTS = 20
+BOILERPLATE_CONTENT_CHARS = 1000
+
+# Elements whose content never reaches the output
+SKIPPED_TAGS = frozenset([
+    "script", "style", "nav", "footer", "header", "aside", "svg", "noscript", "template", "iframe",
+    "button", "input", "select", "textarea", "object", "canvas"
+])
+VOID_TAGS = frozenset(["area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"])
+INLINE_TAGS = frozenset([
+    "a", "abbr", "b", "bdi", "bdo", "big", "br", "cite", "code", "data", "del", "dfn", "em", "font", "i", "img",
+    "ins", "kbd", "label", "mark", "q", "s", "samp", "small", "span", "strike", "strong", "sub", "sup", "time",
+    "tt", "u", "var", "wbr"
+])
+# Containers scored for boilerplate, and those whose descendants never are
+SCORED_TAGS = frozenset(["div", "section", "ul", "ol", "table", "dl", "form", "menu"])
+CONTENT_TAGS = frozenset(["main", "article"])
+MEDIA_TAGS = frozenset(["img", "picture", "video", "audio"])
+# Implied end tags: starting the key closes an open element in the set, searching no further than a boundary
+IMPLIED_END = {
+    "li": ({"li"}, {"ul", "ol", "menu", "table"}),
+    "dt": ({"dt", "dd"}, {"dl", "table"}),
+    "dd": ({"dt", "dd"}, {"dl", "table"}),
+    "tr": ({"tr", "td", "th"}, {"table", "thead", "tbody", "tfoot"}),
+    "td": ({"td", "th"}, {"tr", "table"}),
+    "th": ({"td", "th"}, {"tr", "table"}),
+    "thead": ({"thead", "tbody", "tfoot", "tr", "td", "th"}, {"table"}),
+    "tbody": ({"thead", "tbody", "tfoot", "tr", "td", "th"}, {"table"}),
+    "tfoot": ({"thead", "tbody", "tfoot", "tr", "td", "th"}, {"table"}),
+    "body": ({"head"}, set()),
+}
+CLOSES_P = frozenset([
+    "address", "article", "aside", "blockquote", "details", "div", "dl", "fieldset", "figure", "form",
+    "h1", "h2", "h3", "h4", "h5", "h6", "hr", "main", "menu", "ol", "p", "pre", "section", "table", "ul"
+])
+P_SCOPE_BOUNDARY = frozenset(["html", "body", "table", "td", "th", "li", "dd", "dt", "blockquote", "caption"])
+HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+# Elements rendered as a whole rather than as the sequence of their children's blocks, so their
+# finished children cannot be emitted on their own
+WHOLE_TAGS = INLINE_TAGS | frozenset(HEADINGS) | frozenset([
+    "ul", "ol", "menu", "li", "pre", "blockquote", "table", "caption", "thead", "tbody", "tfoot", "tr", "td", "th", "dt"
+])
+
+_WHITESPACE_RE = re.compile(r"[ \t\r\n\f\v]+")
+_SPACES_RE = re.compile(r"[ \t]+")
+_LANG_RE = re.compile(r"(?:^|\s)(?:language|lang)-([\w+#.-]+)")
+_EDGE_RE = re.compile(r"^(\s*)(.*?)(\s*)$", re.S)
+
+Child = Union["_Node", str]
+
+
+class _Node:
+    __slots__ = (
+        "tag", "attrs", "children", "parent", "content", "pending", "streamed",
+        "text_len", "link_len", "links", "elements", "media"
+    )
+
+    def __init__(self, tag: str, attrs: Dict[str, str], parent: Optional["_Node"]):
+        self.tag = tag
+        self.attrs = attrs
+        self.children: List[Child] = []
+        self.parent = parent
+        inside_content = parent is not None and parent.content
+        self.content = inside_content or tag in CONTENT_TAGS
+        # Scored containers hold their children back until it is known whether they are boilerplate
+        self.pending = tag in SCORED_TAGS and not inside_content
+        # Finished children of streamed nodes are rendered and released as soon as they close
+        self.streamed = (parent is None or parent.streamed) and tag not in WHOLE_TAGS and not self.pending
+        # Totals of the text, link text, links, elements and media already inside (released ones included)
+        self.text_len = self.link_len = self.links = self.elements = self.media = 0
+
+
+def _is_block(child: Child) -> bool:
+    return isinstance(child, _Node) and child.tag not in INLINE_TAGS
+
+
+def _wrap(text: str, marker: str) -> str:
+    """Applies an inline marker around the non-blank core of `text`, keeping its edge spaces outside."""
+    lead, core, trail = _EDGE_RE.match(text).groups()
+    return f"{lead}{marker}{core}{marker}{trail}" if core else text
+
+
+class _MarkdownSink:
+    """
+    Backend-independent markdown writer fed with parser events (start / end / data).
+
+    Events build a lightweight element tree; implied end tags (an unclosed <li>, <td> or <p>)
+    are resolved here, so every backend yields the same tree. When an element closes, its text
+    and link-text totals are summed from its children and scored containers that look like
+    boilerplate are dropped. Finished children at any depth are rendered and released as soon
+    as no enclosing scored container is still pending that decision, so conversion can stop
+    once more than `max_chars` characters exist: those are then exactly the start of a full
+    conversion.
+    Each element is totalled once and rendered once, so the whole walk is linear.
+    """
+
+    def __init__(self, max_chars: Optional[int] = None, base_url: Optional[str] = None):
+        self.max_chars = max_chars
+        self.base_url = base_url or ""
+        self.root = _Node("#root", {}, None)
+        self.stack: List[_Node] = [self.root]
+        self.blocks: List[str] = []
+        self.length = -2  # characters of "\n\n".join(blocks)
+        self.buffer: List[str] = []
+        self.skip_tag: Optional[str] = None
+        self.skip_depth = 0
+        self.in_title = False
+        self.title_parts: List[str] = []
+        self.done = False
+        # Open scored containers still waiting for their boilerplate decision
+        self.pending_open = 0
+
+    # Parser events
+
+    def _start(self, tag: str, attrs: Dict[str, str]) -> None:
+        if self.skip_tag is not None:
+            if tag == self.skip_tag:
+                self.skip_depth += 1
+            return
+        self._flush()
+        if tag == "title":
+            self.in_title = True
+            return
+        if tag == "base" and attrs.get("href"):
+            self.base_url = urljoin(self.base_url, attrs["href"])
+        if tag in SKIPPED_TAGS:
+            if tag not in VOID_TAGS:
+                self.skip_tag, self.skip_depth = tag, 1
+            return
+        if tag in CLOSES_P:
+            self._close_implied({"p"}, P_SCOPE_BOUNDARY)
+        if tag in IMPLIED_END:
+            self._close_implied(*IMPLIED_END[tag])
+        node = _Node(tag, attrs, self.stack[-1])
+        self.stack[-1].children.append(node)
+        if tag in VOID_TAGS:
+            self._closed(node)
+        else:
+            self.stack.append(node)
+            self.pending_open += node.pending
+
+    def _end(self, tag: str) -> None:
+        if self.skip_tag is not None:
+            if tag == self.skip_tag:
+                self.skip_depth -= 1
+                if not self.skip_depth:
+                    self.skip_tag = None
+            return
+        self._flush()
+        if tag == "title":
+            self.in_title = False
+            return
+        if tag in VOID_TAGS:
+            return
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].tag == tag:
+                self._pop_to(i)
+                return
+
+    def _data(self, data: str) -> None:
+        if self.skip_tag is None and not self.done:
+            self.buffer.append(data)
+
+    def _flush(self) -> None:
+        if not self.buffer:
+            return
+        data = "".join(self.buffer)
+        self.buffer = []
+        if self.in_title:
+            self.title_parts.append(data)
+            return
+        node = self.stack[-1]
+        node.children.append(data)
+        node.text_len += len(data.strip())
+        if self.pending_open and node.text_len - node.link_len > BOILERPLATE_CONTENT_CHARS:
+            self._content_found()
+
+    def _close_implied(self, tags: set, boundary) -> None:
+        for i in range(len(self.stack) - 1, 0, -1):
+            tag = self.stack[i].tag
+            if tag in tags:
+                self._pop_to(i)
+                return
+            if tag in boundary:
+                return
+
+    def _pop_to(self, index: int) -> None:
+        while len(self.stack) > index:
+            self._closed(self.stack.pop())
+
+    def _closed(self, node: _Node) -> None:
+        """Adds a finished element to its parent's totals, unless it is boilerplate, and streams it when it can."""
+        if node.tag == "a":
+            node.link_len, node.links = node.text_len, node.links + 1
+        parent = node.parent
+        if node.pending:
+            self.pending_open -= 1
+            if self._is_boilerplate(node):
+                # A closing element is the last child of its parent
+                parent.children.pop()
+                return
+        parent.text_len += node.text_len
+        parent.link_len += node.link_len
+        parent.links += node.links
+        parent.elements += node.elements + 1
+        parent.media += node.media + (node.tag in MEDIA_TAGS)
+        if self.pending_open and parent.text_len - parent.link_len > BOILERPLATE_CONTENT_CHARS:
+            self._content_found()
+        elif parent.streamed and _is_block(node):
+            self._emit(parent)
+
+    def _content_found(self) -> None:
+        """
+        Marks the innermost open element, which now holds enough non-link text to be content, and
+        every open element around it as decided, then streams what the newly streamed ones hold.
+        """
+        self.pending_open = 0
+        for i in range(1, len(self.stack)):
+            node = self.stack[i]
+            node.pending = False
+            if node.streamed or not self.stack[i - 1].streamed or node.tag in WHOLE_TAGS:
+                continue
+            node.streamed = True
+            if i == len(self.stack) - 1:
+                self._emit(node)
+            elif _is_block(self.stack[i + 1]):
+                # Everything before the open child is finished
+                self._emit(node, keep_open=True)
+
+    @staticmethod
+    def _is_boilerplate(node: _Node) -> bool:
+        if node.text_len == 0:
+            return node.media == 0
+        if node.links >= BOILERPLATE_MIN_LINKS and node.link_len > BOILERPLATE_LINK_DENSITY * node.text_len:
+            return True
+        return node.elements >= BOILERPLATE_MIN_ELEMENTS and node.text_len < BOILERPLATE_MIN_TEXT_DENSITY * node.elements
+
+    def _emit(self, container: _Node, keep_open: bool = False) -> None:
+        """Renders and releases the finished children of a streamed container (all but its open last child)."""
+        children = container.children
+        for block in _MarkdownRenderer(self.base_url).blocks(children[:-1] if keep_open else children):
+            self.blocks.append(block)
+            self.length += len(block) + 2
+        container.children = children[-1:] if keep_open else []
+        if self.max_chars is not None and self.length > self.max_chars:
+            self.done = True
+
+    def finish(self) -> None:
+        """Closes every open element once the parser has consumed the whole document."""
+        self._flush()
+        self._pop_to(1)
+        if self.root.children:
+            self._emit(self.root)
+
+    def result(self) -> Tuple[Optional[str], str]:
+        """(page title or None, markdown produced so far)."""
+        title = _WHITESPACE_RE.sub(" ", "".join(self.title_parts)).strip() or None
+        return title, "\n\n".join(self.blocks)
+
+
+class _MarkdownRenderer:
+    """Renders finished element subtrees to markdown blocks."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+
+    def blocks(self, children: List[Child]) -> List[str]:
+        """Block-level markdown of a child list; runs of inline content become paragraphs."""
+        out: List[str] = []
+        run: List[Child] = []
+        for child in children:
+            if _is_block(child):
+                self._paragraph(run, out)
+                run = []
+                out.extend(self.block(child))
+            else:
+                run.append(child)
+        self._paragraph(run, out)
+        return out
+
+    def _paragraph(self, run: List[Child], out: List[str]) -> None:
+        if run:
+            text = self.paragraph_text(run)
+            if text:
+                out.append(text)
+
+    def paragraph_text(self, children: List[Child]) -> str:
+        text = _SPACES_RE.sub(" ", self.inline(children))
+        return "\n".join(line.strip() for line in text.split("\n") if line.strip())
+
+    def block(self, node: _Node) -> List[str]:
+        tag = node.tag
+        if tag in HEADINGS:
+            text = self.paragraph_text(node.children).replace("\n", " ")
+            return [f"{'#' * HEADINGS[tag]} {text}"] if text else []
+        if tag in ("ul", "ol", "menu"):
+            text = self.list(node)
+            return [text] if text else []
+        if tag == "pre":
+            code = self.code_block(node)
+            return [code] if code else []
+        if tag == "blockquote":
+            inner = "\n\n".join(self.blocks(node.children))
+            return ["\n".join(f"> {line}" if line else ">" for line in inner.split("\n"))] if inner else []
+        if tag == "table":
+            text = self.table(node)
+            return [text] if text else []
+        if tag == "hr":
+            return ["---"]
+        if tag == "dt":
+            text = self.paragraph_text(node.children)
+            return [f"**{text}**"] if text else []
+        return self.blocks(node.children)
+
+    def list(self, node: _Node) -> str:
+        start = str(node.attrs.get("start") or "1")
+        number = int(start) if start.isdigit() else 1
+        lines: List[str] = []
+        for child in node.children:
+            if not isinstance(child, _Node) or child.tag != "li":
+                continue
+            item = self.blocks(child.children)
+            if not item:
+                continue
+            marker = f"{number}. " if node.tag == "ol" else "- "
+            number += 1
+            indent = " " * len(marker)
+            for i, line in enumerate("\n".join(item).split("\n")):
+                lines.append(((marker if i == 0 else indent) + line) if line else "")
+        return "\n".join(lines)
+
+    def code_block(self, node: _Node) -> str:
+        code = self.raw_text(node)
+        if code.startswith("\n"):
+            code = code[1:]
+        code = code.rstrip()
+        if not code.strip():
+            return ""
+        language = ""
+        for candidate in [node] + [c for c in node.children if isinstance(c, _Node) and c.tag == "code"][:1]:
+            match = _LANG_RE.search(candidate.attrs.get("class") or "")
+            if match:
+                language = match.group(1)
+                break
+        fence = "~~~" if "```" in code else "```"
+        return f"{fence}{language}\n{code}\n{fence}"
+
+    def table(self, node: _Node) -> str:
+        rows: List[List[str]] = []
+        # Rows in document order, from the table itself and its row groups
+        stack: List[Child] = list(reversed(node.children))
+        while stack:
+            child = stack.pop()
+            if not isinstance(child, _Node):
+                continue
+            if child.tag in ("thead", "tbody", "tfoot"):
+                stack.extend(reversed(child.children))
+            elif child.tag == "tr":
+                cells = [
+                    self.paragraph_text(cell.children).replace("\n", " ").replace("|", "\\|")
+                    for cell in child.children if isinstance(cell, _Node) and cell.tag in ("td", "th")
+                ]
+                if any(cells):
+                    rows.append(cells)
+        if not rows:
+            return ""
+        width = max(len(row) for row in rows)
+        rows = [row + [""] * (width - len(row)) for row in rows]
+        lines = ["| " + " | ".join(rows[0]) + " |", "| " + " | ".join(["---"] * width) + " |"]
+        lines += ["| " + " | ".join(row) + " |" for row in rows[1:]]
+        return "\n".join(lines)
+
+    def inline(self, children: List[Child]) -> str:
+        parts: List[str] = []
+        for child in children:
+            if isinstance(child, str):
+                parts.append(_WHITESPACE_RE.sub(" ", child))
+                continue
+            tag = child.tag
+            if tag == "br":
+                parts.append("\n")
+            elif tag == "img":
+                alt = _WHITESPACE_RE.sub(" ", child.attrs.get("alt") or "").strip()
+                src = self.url(child.attrs.get("src"))
+                if alt and src:
+                    parts.append(f"![{alt}]({src})")
+            elif tag == "a":
+                text = self.inline(child.children)
+                href = self.url(child.attrs.get("href"))
+                parts.append(_wrap(text, "") if not (href and text.strip()) else self._link(text, href))
+            elif tag in ("strong", "b"):
+                parts.append(_wrap(self.inline(child.children), "**"))
+            elif tag in ("em", "i"):
+                parts.append(_wrap(self.inline(child.children), "*"))
+            elif tag in ("code", "kbd", "samp", "tt"):
+                code = _WHITESPACE_RE.sub(" ", self.raw_text(child))
+                parts.append(_wrap(code, "``" if "`" in code else "`"))
+            elif tag in INLINE_TAGS:
+                parts.append(self.inline(child.children))
+            else:
+                # Block element inside inline content (e.g. a <div> in a link or table cell)
+                parts.append(" " + self.inline(child.children) + " ")
+        return "".join(parts)
+
+    @staticmethod
+    def _link(text: str, href: str) -> str:
+        lead, core, trail = _EDGE_RE.match(text).groups()
+        return f"{lead}[{core}]({href}){trail}"
+
+    def raw_text(self, node: _Node) -> str:
+        parts: List[str] = []
+        stack: List[Child] = [node]
+        while stack:
+            child = stack.pop()
+            if isinstance(child, str):
+                parts.append(child)
+            elif child.tag == "br":
+                parts.append("\n")
+            else:
+                stack.extend(reversed(child.children))
+        return "".join(parts)
+
+    def url(self, href: Optional[str]) -> Optional[str]:
+        """Absolute URL of a link target; None for in-page anchors and script links."""
+        href = (href or "").strip()
+        if not href or href.startswith("#") or href.lower().startswith(("javascript:", "data:")):
+            return None
+        return urljoin(self.base_url, href).replace(" ", "%20").replace("(", "%28").replace(")", "%29")
+
+
+class HtmlParserConverter(_MarkdownSink, HTMLParser):
+    """Streaming converter on the stdlib tokenizer (pure Python, always available)."""
+
+    def __init__(self, max_chars: Optional[int] = None, base_url: Optional[str] = None):
+        _MarkdownSink.__init__(self, max_chars, base_url)
+        HTMLParser.__init__(self, convert_charrefs=True)
+
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, {name: value or "" for name, value in attrs})
+
+    def handle_endtag(self, tag):
+        self._end(tag)
+
+    def handle_data(self, data):
+        self._data(data)
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def feed(self, data: str) -> None:
+        """Parses the next chunk of markup; a no-op once enough markdown has been produced."""
+        if not self.done:
+            HTMLParser.feed(self, data)
+
+    def close(self) -> None:
+        HTMLParser.close(self)
+        self.finish()
+
+
+class _LxmlTarget:
+    """lxml parser target forwarding parse events to a converter."""
+
+    def __init__(self, sink: _MarkdownSink):
+        self.start = lambda tag, attrib: sink._start(tag, dict(attrib))
+        self.end = sink._end
+        self.data = sink._data
+        self.comment = lambda text: sink._flush()
+
+    def close(self):
+        return None
+
+
+class LxmlConverter(_MarkdownSink):
+    """Streaming converter on libxml2's HTML parser (lxml, C-accelerated)."""
+
+    def __init__(self, max_chars: Optional[int] = None, base_url: Optional[str] = None):
+        super().__init__(max_chars, base_url)
+        self.parser = etree.HTMLParser(target=_LxmlTarget(self))
+
+    def feed(self, data: str) -> None:
+        if not self.done:
+            self.parser.feed(data)
+
+    def close(self) -> None:
+        self.parser.close()
+        self.finish()
+
+
+class SoupConverter(_MarkdownSink):
+    """BeautifulSoup backend: buffers the page, parses it on close() and walks the tree once."""
+
+    def __init__(self, max_chars: Optional[int] = None, base_url: Optional[str] = None):
+        super().__init__(max_chars, base_url)
+        self.parts: List[str] = []
+
+    def feed(self, data: str) -> None:
+        self.parts.append(data)
+
+    def close(self) -> None:
+        soup = BeautifulSoup("".join(self.parts), "html.parser")
+        self.parts = []
+        # Iterative pre-order walk; a tag's name is pushed below its children as its end marker
+        stack: list = list(reversed(soup.contents))
+        while stack and not self.done:
+            item = stack.pop()
+            if isinstance(item, Tag):
+                self._start(item.name, {k: " ".join(v) if isinstance(v, list) else v for k, v in item.attrs.items()})
+                stack.append(item.name)
+                stack.extend(reversed(item.contents))
+            elif not isinstance(item, NavigableString):
+                self._end(item)
+            elif type(item) in (NavigableString, CData):
+                self._data(str(item))
+            else:
+                self._flush()  # comments, doctypes and other markup split text nodes
+        if not self.done:
+            self.finish()
+
+
+BACKENDS = {"lxml": LxmlConverter, "html.parser": HtmlParserConverter, "bs4": SoupConverter}
+_warned_backends = set()
+
+
+def available_backends() -> List[str]:
+    """Backends whose parser library is installed."""
+    missing = {"lxml": etree is None, "bs4": BeautifulSoup is None}
+    return [name for name in BACKENDS if not missing.get(name)]
+
+
+def resolve_backend(name: Optional[str] = None) -> str:
+    """Maps a configured backend (default HTML_PARSER_BACKEND) to an available one."""
+    name = name or HTML_PARSER_BACKEND
+    available = available_backends()
+    if name == "auto":
+        return next(b for b in AUTO_BACKEND_ORDER if b in available)
+    if name in available:
+        return name
+    if name not in _warned_backends:
+        _warned_backends.add(name)
+        print(f"Warning: HTML parser backend '{name}' is unavailable; falling back to 'html.parser'.")
+    return "html.parser"
+
+
+def new_converter(max_chars: Optional[int] = None, backend: Optional[str] = None, base_url: Optional[str] = None):
+    """Returns a converter (feed / done / close / result) of the resolved backend."""
+    return BACKENDS[resolve_backend(backend)](max_chars, base_url)
+
+
+def html_to_markdown(
+    html: str, max_chars: Optional[int] = None, backend: Optional[str] = None, base_url: Optional[str] = None
+) -> Tuple[Optional[str], str, bool]:
+    """
+    Converts a complete HTML document to markdown. Returns (title, markdown, complete), where
+    `complete` is False when conversion stopped early after producing more than `max_chars`
+    characters. Relative links and images are resolved against `base_url` (or <base href>).
+    """
+    converter = new_converter(max_chars, backend, base_url)
+    for i in range(0, len(html), FEED_CHUNK_CHARS):
+        converter.feed(html[i:i + FEED_CHUNK_CHARS])
+        if converter.done:
+            break
+    if not converter.done:
+        converter.close()
+    title, markdown = converter.result()
+    return title, markdown, not converter.done
+
+
+def backend_stats() -> Dict[str, object]:
+    return {"configured": HTML_PARSER_BACKEND, "active": resolve_backend(), "available": available_backends()}
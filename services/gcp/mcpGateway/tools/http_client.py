@@ -0,0 +1,100 @@
+import os
+import asyncio
+import weakref
+from typing import Dict, Any, Optional
+import httpx
+
+try:
+    import h2  # noqa: F401 - enables httpx's HTTP/2 support (pip install httpx[http2])
+except ImportError:
+    h2 = None
+
+# Connection pool shared by every outbound fetch: total connections, idle keep-alive connections
+# kept per pool and how long an idle connection may be reused
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT_SECONDS", "15"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+# HTTP/2 is negotiated via ALPN when enabled and the h2 package is installed
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() == "true"
+
+HTTP_STATS: Dict[str, int] = {"requests": 0, "connections_opened": 0, "tls_handshakes": 0, "clients_opened": 0}
+
+# One client per event loop (the app lifespan opens the serving loop's client; other loops,
+# such as tests', get one lazily)
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+async def _trace(event_name: str, info: Dict[str, Any]) -> None:
+    """httpcore trace hook: a connect event means the request could not reuse a pooled connection."""
+    if event_name == "connection.connect_tcp.complete":
+        HTTP_STATS["connections_opened"] += 1
+    elif event_name == "connection.start_tls.complete":
+        HTTP_STATS["tls_handshakes"] += 1
+
+
+async def _on_request(request: httpx.Request) -> None:
+    HTTP_STATS["requests"] += 1
+    request.extensions["trace"] = _trace
+
+
+def _new_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    http2 = HTTP2_ENABLED
+    if http2 and h2 is None:
+        print("Warning: HTTP2_ENABLED is set but the h2 package is not installed; using HTTP/1.1.")
+        http2 = False
+    HTTP_STATS["clients_opened"] += 1
+    return httpx.AsyncClient(
+        follow_redirects=True,
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        ),
+        http2=http2,
+        transport=transport,
+        event_hooks={"request": [_on_request]}
+    )
+
+
+async def open_http_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """
+    Opens the shared client for the running event loop, replacing (and closing) any previous one.
+
+    Args:
+        transport: Optional transport override, e.g. httpx.MockTransport in tests.
+    """
+    loop = asyncio.get_running_loop()
+    previous = _clients.pop(loop, None)
+    if previous is not None:
+        await previous.aclose()
+    client = _clients[loop] = _new_client(transport)
+    return client
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Returns the running event loop's shared client, opening one on first use."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _clients[loop] = _new_client()
+    return client
+
+
+async def close_http_client() -> None:
+    """Closes the running event loop's shared client and its pooled connections."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def http_stats() -> Dict[str, Any]:
+    """Request and connection counters; requests that opened no connection reused a pooled one."""
+    return {
+        **HTTP_STATS,
+        "connections_reused": max(0, HTTP_STATS["requests"] - HTTP_STATS["connections_opened"]),
+        "http2": HTTP2_ENABLED and h2 is not None,
+        "open_clients": len(_clients),
+    }
@@ -1,77 +1,800 @@
 import os
 import re
 import json
+import time
+import base64
+import hashlib
+import random
+import uuid
+import asyncio
+import weakref
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Any, List, Optional
-from google.cloud import storage
+from typing import Dict, Any, List, Optional, AsyncIterator, AsyncIterable
+from tools.memory_storage import (
+    LOCAL_MEMORY_FILE, SHARED_NAMESPACE, STORED_UNVERSIONED, WriteConflict, get_store, drop_stores, namespace_paths, read_sidecar, write_sidecar,
+    run_blocking
+)
+from tools.memory_index import MemoryIndex, ExpiryIndex, AdjacencyIndex, SizeIndex
+from tools.memory_vectors import VectorIndex
 
-GCS_BUCKET_NAME = os.getenv("MEMORY_GCS_BUCKET", "mcp-memory-precise-works-456015-h9")
-LOCAL_MEMORY_FILE = os.getenv("LOCAL_MEMORY_FILE", "/tmp/mcp_memory.json")
 DEFAULT_RETENTION_DAYS = int(os.getenv("MEMORY_RETENTION_DAYS", "30"))
+MEMORY_STORAGE_MODE = os.getenv("MEMORY_STORAGE_MODE", "snapshot")
+INDEX_SUFFIX = ".index.json"
+INDEX_PERSIST_SECONDS = float(os.getenv("MEMORY_INDEX_PERSIST_SECONDS", "300"))
+# Semantic query matrix, memory-mapped from local disk (mmap needs a local file even when the graph is on GCS)
+VECTORS_FILE = f"{LOCAL_MEMORY_FILE}.vectors"
 
-# Secret and Credential Sanitization Regexes
+# Optimistic-concurrency retry policy for conflicting writes (full-jitter exponential backoff)
+WRITE_MAX_ATTEMPTS = int(os.getenv("MEMORY_WRITE_MAX_ATTEMPTS", "8"))
+WRITE_BACKOFF_BASE_MS = float(os.getenv("MEMORY_WRITE_BACKOFF_BASE_MS", "25"))
+WRITE_BACKOFF_MAX_MS = float(os.getenv("MEMORY_WRITE_BACKOFF_MAX_MS", "1000"))
+
+# Group commit: writes arriving within one window (or until N records queue up) share one persist
+BATCH_WINDOW_MS = float(os.getenv("MEMORY_BATCH_WINDOW_MS", "10"))
+BATCH_MAX_OPS = int(os.getenv("MEMORY_BATCH_MAX_OPS", "500"))
+
+# Optional per-entity observation cap (0 = unbounded) and which observations it evicts first:
+# "oldest" (first stored) or "least_recent" (least recently re-observed)
+MAX_OBSERVATIONS = int(os.getenv("MEMORY_MAX_OBSERVATIONS", "0"))
+OBSERVATION_EVICTION = os.getenv("MEMORY_OBSERVATION_EVICTION", "oldest")
+
+# Optional size budget (0 = unlimited). When exceeded, unpinned entities are evicted by "lru" (least
+# recently recalled or updated) or "lfu" (least often recalled) until usage is back under
+# MEMORY_EVICTION_TARGET of the budget
+MAX_ENTITIES = int(os.getenv("MEMORY_MAX_ENTITIES", "0"))
+MAX_BYTES = int(os.getenv("MEMORY_MAX_BYTES", "0"))
+EVICTION_POLICY = os.getenv("MEMORY_EVICTION_POLICY", "lru")
+EVICTION_TARGET = float(os.getenv("MEMORY_EVICTION_TARGET", "0.9"))
+
+# Upper bound on records accepted by one bulk write
+BULK_MAX_RECORDS = int(os.getenv("MEMORY_BULK_MAX_RECORDS", "100"))
+
+# NDJSON export/import: entities per streamed chunk, records per import batch (one persist each)
+# and the longest accepted import line
+EXPORT_CHUNK_ENTITIES = int(os.getenv("MEMORY_EXPORT_CHUNK_ENTITIES", "500"))
+IMPORT_BATCH_RECORDS = int(os.getenv("MEMORY_IMPORT_BATCH_RECORDS", "1000"))
+IMPORT_MAX_LINE_BYTES = int(os.getenv("MEMORY_IMPORT_MAX_LINE_BYTES", str(1024 * 1024)))
+
+# Unreturned remainders of ranked query results kept per namespace so `next_cursor` pages follow the
+# order of the first page even when writes change relevance scores: at most this many snapshots and
+# names in total, each dropped after CURSOR_TTL_SECONDS unused (cursors whose snapshot was dropped
+# resume by name; name listings never need one)
+CURSOR_SNAPSHOTS = int(os.getenv("MEMORY_CURSOR_SNAPSHOTS", "64"))
+CURSOR_SNAPSHOT_NAMES = int(os.getenv("MEMORY_CURSOR_SNAPSHOT_NAMES", "20000"))
+CURSOR_TTL_SECONDS = float(os.getenv("MEMORY_CURSOR_TTL_SECONDS", "600"))
+
+# Relation traversal limits for query_neighbors
+NEIGHBOR_MAX_HOPS = int(os.getenv("MEMORY_NEIGHBOR_MAX_HOPS", "3"))
+NEIGHBOR_MAX_NODES = int(os.getenv("MEMORY_NEIGHBOR_MAX_NODES", "100"))
+
+# Background TTL reaper (0 disables it) and the most entities it evicts per pass
+REAPER_INTERVAL_SECONDS = float(os.getenv("MEMORY_REAPER_INTERVAL_SECONDS", "60"))
+REAPER_BATCH = int(os.getenv("MEMORY_REAPER_BATCH", "500"))
+
+# Memory namespaces: "shared" (every user reads and writes one graph) or "user" (a graph per verified
+# identity, plus the shared graph for calls that ask for the shared scope when enabled)
+NAMESPACE_MODE = os.getenv("MEMORY_NAMESPACE_MODE", "shared")
+SHARED_SCOPE_ENABLED = os.getenv("MEMORY_SHARED_SCOPE_ENABLED", "true").lower() == "true"
+
+# User namespaces kept resident (graph, indexes, storage handle) beyond which the least recently
+# used are dropped, and the idle time after which the reaper drops one regardless
+NAMESPACE_RESIDENT_MAX = int(os.getenv("MEMORY_NAMESPACE_RESIDENT_MAX", "32"))
+NAMESPACE_IDLE_SECONDS = float(os.getenv("MEMORY_NAMESPACE_IDLE_SECONDS", "900"))
+
+# Namespace served by the current request or task
+_namespace: contextvars.ContextVar = contextvars.ContextVar("memory_namespace", default=SHARED_NAMESPACE)
+
+# Resident knowledge graph cache per namespace (the search indexes are built lazily on first query)
+_states: Dict[str, Dict[str, Any]] = {}
+# User namespaces by last use (least recent first) and the calls currently inside each namespace
+_namespace_used: "OrderedDict[str, float]" = OrderedDict()
+_namespace_active: Dict[str, int] = {}
+NAMESPACE_STATS = {"evictions": 0}
+_graph_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Lock]]" = weakref.WeakKeyDictionary()
+CACHE_STATS = {"hits": 0, "misses": 0, "refreshes": 0}
+WRITE_STATS = {"commits": 0, "conflicts": 0, "retries": 0, "failures": 0, "max_attempts": 0}
+BATCH_STATS = {"submitted": 0, "batches": 0, "largest_batch": 0}
+BUDGET_STATS = {"passes": 0, "evicted": 0, "last_evicted": 0}
+REAPER_STATS = {"runs": 0, "evicted": 0, "errors": 0, "last_evicted": 0, "last_run_ms": None, "last_run_at": None}
+
+# Secret and Credential Sanitization Regexes: (pattern, replacement, triggers).
+# Triggers are lowercase literal prefixes every match starts with. A text is only scanned when
+# it contains a trigger, and the scanner only tries the alternation at positions starting with
+# a trigger's first character. Patterns registered without triggers disable both shortcuts.
+# Patterns must not use numeric backreferences.
 SECRET_PATTERNS = [
-    (r"(sk-[a-zA-Z0-9_-]{20,})", "[REDACTED_API_KEY]"),
-    (r"(AIzaSy[a-zA-Z0-9_-]{30,})", "[REDACTED_GOOGLE_KEY]"),
-    (r"(ghp_[a-zA-Z0-9]{36})", "[REDACTED_GITHUB_TOKEN]"),
-    (r"(Bearer\s+[a-zA-Z0-9._-]{20,})", "[REDACTED_BEARER_TOKEN]"),
-    (r"(password\s*=\s*['\"][^'\"]+['\"])", "password='[REDACTED]'"),
+    (r"(sk-[a-zA-Z0-9_-]{20,})", "[REDACTED_API_KEY]", ["sk-"]),
+    (r"(AIzaSy[a-zA-Z0-9_-]{30,})", "[REDACTED_GOOGLE_KEY]", ["aizasy"]),
+    (r"(ghp_[a-zA-Z0-9]{36})", "[REDACTED_GITHUB_TOKEN]", ["ghp_"]),
+    (r"(Bearer\s+[a-zA-Z0-9._-]{20,})", "[REDACTED_BEARER_TOKEN]", ["bearer"]),
+    (r"(password\s*=\s*['\"][^'\"]+['\"])", "password='[REDACTED]'", ["password"]),
 ]
 
+_secret_scanner: Optional[re.Pattern] = None
+_secret_replacements: Dict[str, str] = {}
+_secret_triggers: Optional[tuple] = None
+
+
+def _compile_secret_scanner() -> None:
+    """Combines SECRET_PATTERNS into one alternation with a named group per pattern."""
+    global _secret_scanner, _secret_replacements, _secret_triggers
+    alternatives = []
+    replacements = {}
+    triggers = []
+    for i, (pattern, replacement, pattern_triggers) in enumerate(SECRET_PATTERNS):
+        group = f"secret{i}"
+        alternatives.append(f"(?P<{group}>{pattern})")
+        replacements[group] = replacement
+        if pattern_triggers is None or triggers is None:
+            triggers = None
+        else:
+            triggers.extend(t.lower() for t in pattern_triggers)
+    scanner = "|".join(alternatives)
+    if triggers:
+        first_chars = "".join(sorted({re.escape(t[0]) for t in triggers}))
+        scanner = f"(?=[{first_chars}])(?:{scanner})"
+    _secret_scanner = re.compile(scanner, flags=re.IGNORECASE)
+    _secret_replacements = replacements
+    _secret_triggers = tuple(triggers) if triggers else None
+
+
+def _validate_secret_pattern(pattern: Any, replacement: Any, triggers: Any) -> None:
+    """Raises ValueError unless the pattern can join the combined scanner as its own named group."""
+    if not isinstance(pattern, str) or not isinstance(replacement, str):
+        raise ValueError("pattern and replacement must be strings")
+    if triggers is not None and (
+        not isinstance(triggers, list) or not triggers or not all(isinstance(t, str) and t for t in triggers)
+    ):
+        raise ValueError("triggers must be a non-empty list of strings")
+    if _has_backreference(pattern):
+        raise ValueError(f"pattern {pattern!r} must not use backreferences")
+    try:
+        compiled = re.compile(f"(?P<secret>{pattern})", flags=re.IGNORECASE)
+    except re.error as e:
+        raise ValueError(f"invalid regular expression {pattern!r}: {e}")
+    if len(compiled.groupindex) > 1:
+        raise ValueError(f"pattern {pattern!r} must not use named groups")
+
+
+def _has_backreference(pattern: str) -> bool:
+    """
+    True for \\<n>, (?P=name) and (?(group)...) references, which would point at other patterns'
+    groups (or the wrapping `secret` group) once the pattern joins the combined scanner.
+    """
+    i, in_class = 0, False
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            following = pattern[i + 1:i + 4]
+            # \0 and three octal digits are octal escapes; any other \<digit> is a group reference
+            if not in_class and following[:1] and following[:1] in "123456789" and not (
+                len(following) == 3 and all(c in "01234567" for c in following)
+            ):
+                return True
+            i += 2
+            continue
+        if in_class:
+            if char == "]":
+                in_class = False
+        elif char == "[":
+            in_class = True
+            # A leading "]" (after an optional "^") is literal inside the class
+            if pattern[i + 1:i + 2] == "^":
+                i += 1
+            if pattern[i + 1:i + 2] == "]":
+                i += 1
+        elif pattern.startswith(("(?P=", "(?("), i):
+            return True
+        i += 1
+    return False
+
+
+def register_secret_pattern(pattern: str, replacement: str, triggers: Optional[List[str]] = None) -> None:
+    """
+    Adds a secret pattern to the single-pass sanitizer. Raises ValueError for a pattern that does
+    not compile, uses named groups or backreferences, or has triggers that are not a list of strings.
+
+    Args:
+        pattern: Regular expression (matched case-insensitively).
+        replacement: Literal text substituted for each match.
+        triggers: Lowercase literal prefixes every match starts with.
+            Omit to always scan (disables the prefilter).
+    """
+    _validate_secret_pattern(pattern, replacement, triggers)
+    SECRET_PATTERNS.append((pattern, replacement, triggers))
+    _compile_secret_scanner()
+
+
+def _register_configured_secret_patterns() -> None:
+    """
+    Loads operator patterns from MEMORY_SECRET_PATTERNS: a JSON list of {pattern, replacement,
+    triggers}. Invalid entries are skipped with a warning so a typo cannot stop the gateway.
+    """
+    raw = os.getenv("MEMORY_SECRET_PATTERNS")
+    entries = []
+    if raw:
+        try:
+            entries = json.loads(raw)
+            if not isinstance(entries, list):
+                raise ValueError("expected a JSON list")
+        except ValueError as e:
+            print(f"Warning: Ignoring invalid MEMORY_SECRET_PATTERNS: {e}")
+            entries = []
+    for i, entry in enumerate(entries):
+        try:
+            if not isinstance(entry, dict) or "pattern" not in entry:
+                raise ValueError("expected an object with a 'pattern'")
+            pattern, replacement, triggers = entry["pattern"], entry.get("replacement", "[REDACTED]"), entry.get("triggers")
+            _validate_secret_pattern(pattern, replacement, triggers)
+        except ValueError as e:
+            print(f"Warning: Ignoring MEMORY_SECRET_PATTERNS entry {i}: {e}")
+            continue
+        SECRET_PATTERNS.append((pattern, replacement, triggers))
+    _compile_secret_scanner()
+
+
 def sanitize_text(text: str) -> str:
-    """Sanitizes sensitive patterns (API keys, bearer tokens, passwords) from text."""
+    """Sanitizes sensitive patterns (API keys, bearer tokens, passwords) from text in a single pass."""
     if not isinstance(text, str):
         return text
-    sanitized = text
-    for pattern, replacement in SECRET_PATTERNS:
-        sanitized = re.sub(pattern, replacement, sanitized, flags=re.IGNORECASE)
-    return sanitized
+    if _secret_triggers is not None:
+        lowered = text.lower()
+        if not any(trigger in lowered for trigger in _secret_triggers):
+            return text
+    return _secret_scanner.sub(lambda m: _secret_replacements[m.lastgroup], text)
+
+
+_register_configured_secret_patterns()
+
+
+def _state() -> Dict[str, Any]:
+    """Resident graph, derived indexes and pending recall statistics of the current namespace."""
+    namespace = _namespace.get()
+    state = _states.get(namespace)
+    if state is None:
+        state = _states[namespace] = {
+            "memory": None, "version": None, "index": None, "vectors": None, "expiry": None, "adjacency": None,
+            "sizes": None, "observations": {}, "index_persisted_at": 0.0,
+            # Recalls not yet written back as 'touch' records: {name: [recall count, last recalled at]}
+            "pending_access": {},
+            # Remaining ranked names (and semantic scores) behind outstanding cursors, least recently paged first
+            "cursors": OrderedDict()
+        }
+    return state
+
+
+def namespace_for_user(user: Optional[Dict[str, Any]], scope: Optional[str] = None) -> str:
+    """
+    Maps a verified identity (the `sub` or `email` claim) to its memory namespace. Identities are
+    hashed so object names carry no personal data. Returns the shared namespace when namespaces are
+    off, when the identity has no claims, or when `scope` is 'shared' and shared access is enabled.
+    """
+    if scope not in (None, "user", "shared"):
+        raise ValueError(f"Unknown memory scope: '{scope}'")
+    if NAMESPACE_MODE != "user":
+        return SHARED_NAMESPACE
+    if scope == "shared":
+        if not SHARED_SCOPE_ENABLED:
+            raise ValueError("The shared memory scope is disabled.")
+        return SHARED_NAMESPACE
+    identity = (user or {}).get("sub") or (user or {}).get("email")
+    if not identity:
+        return SHARED_NAMESPACE
+    return "u-" + hashlib.sha256(str(identity).encode("utf-8")).hexdigest()[:24]
+
+
+@contextmanager
+def memory_namespace(namespace: str, touch: bool = True):
+    """
+    Routes memory calls made inside the block (and tasks they start) to `namespace`. Entering a
+    user namespace marks it recently used (unless `touch` is False, as for background passes)
+    and may drop the state of others beyond NAMESPACE_RESIDENT_MAX.
+    """
+    _namespace_active[namespace] = _namespace_active.get(namespace, 0) + 1
+    if touch and namespace != SHARED_NAMESPACE:
+        _namespace_used[namespace] = time.monotonic()
+        _namespace_used.move_to_end(namespace)
+        if len(_namespace_used) > NAMESPACE_RESIDENT_MAX:
+            _evict_namespaces()
+    token = _namespace.set(namespace)
+    try:
+        yield namespace
+    finally:
+        _namespace.reset(token)
+        _namespace_active[namespace] -= 1
+        if not _namespace_active[namespace]:
+            del _namespace_active[namespace]
+
+
+def _namespace_busy(namespace: str) -> bool:
+    """True while a call, a held lock, a queued write or unsaved recall statistics need the namespace's state."""
+    if _namespace_active.get(namespace) or _states.get(namespace, {}).get("pending_access"):
+        return True
+    for locks in list(_graph_locks.values()):
+        lock = locks.get(namespace)
+        if lock is not None and lock.locked():
+            return True
+    for batchers in list(_batchers.values()):
+        batcher = batchers.get(namespace)
+        if batcher is not None and (batcher.pending or (batcher.flusher is not None and not batcher.flusher.done())):
+            return True
+    return False
+
+
+def _evict_namespaces() -> List[str]:
+    """
+    Drops the resident state of user namespaces idle for NAMESPACE_IDLE_SECONDS, and of the least
+    recently used beyond NAMESPACE_RESIDENT_MAX; busy namespaces are kept until a later pass.
+    The graph is re-read from storage when the namespace is used again.
+    """
+    excess = len(_namespace_used) - NAMESPACE_RESIDENT_MAX
+    cutoff = time.monotonic() - NAMESPACE_IDLE_SECONDS
+    dropped = []
+    for namespace, used_at in list(_namespace_used.items()):
+        if len(dropped) >= excess and used_at > cutoff:
+            break
+        if _namespace_busy(namespace):
+            continue
+        with memory_namespace(namespace, touch=False):
+            _invalidate_cache()
+        _states.pop(namespace, None)
+        del _namespace_used[namespace]
+        for registry in (_graph_locks, _batchers):
+            for per_namespace in list(registry.values()):
+                per_namespace.pop(namespace, None)
+        drop_stores(namespace)
+        dropped.append(namespace)
+    NAMESPACE_STATS["evictions"] += len(dropped)
+    return dropped
+
+
+def _cache_put(memory: Dict[str, Any], version: Optional[tuple]) -> Dict[str, Any]:
+    if memory is not _state()["memory"]:
+        _state()["index"] = None
+        _state()["vectors"] = None
+        _state()["expiry"] = None
+        _state()["adjacency"] = None
+        _state()["sizes"] = None
+        _state()["observations"] = {}
+    _state()["memory"] = memory
+    _state()["version"] = version
+    return memory
+
+
+def _version_stamp(version: Any) -> Any:
+    """JSON-normalized storage version used to validate persisted sidecars."""
+    return json.loads(json.dumps(version))
 
 
-def _load_memory() -> Dict[str, Any]:
-    """Loads memory dictionary from GCS or local storage."""
-    if GCS_BUCKET_NAME:
+def _vectors_path() -> str:
+    namespace = _namespace.get()
+    if namespace == SHARED_NAMESPACE:
+        return VECTORS_FILE
+    return f"{namespace_paths(namespace)[1]}.vectors"
+
+
+async def _persist_index() -> None:
+    index, vectors, version = _state()["index"], _state()["vectors"], _state()["version"]
+    if version is None or version == ("empty",):
+        return
+    persisted = True
+    if vectors is not None:
         try:
-            client = storage.Client()
-            bucket = client.bucket(GCS_BUCKET_NAME)
-            blob = bucket.blob("knowledge_graph.json")
-            if blob.exists():
-                return json.loads(blob.download_as_text())
+            await run_blocking(vectors.save, _vectors_path(), _version_stamp(version))
         except Exception as e:
-            print(f"Warning: Failed to load memory from GCS: {e}")
+            print(f"Warning: Failed to save memory vectors: {e}")
+            persisted = False
+    if index is not None:
+        data = json.dumps({"version": _version_stamp(version), **index.to_dict()}, separators=(",", ":"))
+        persisted = await run_blocking(write_sidecar, INDEX_SUFFIX, data, _namespace.get()) and persisted
+    if persisted:
+        _state()["index_persisted_at"] = time.monotonic()
+
 
-    if os.path.exists(LOCAL_MEMORY_FILE):
+async def _get_index() -> MemoryIndex:
+    """Returns the search index for the resident graph, loading the persisted copy when it is current."""
+    if _state()["index"] is not None:
+        return _state()["index"]
+    data = await run_blocking(read_sidecar, INDEX_SUFFIX, _namespace.get())
+    if data:
         try:
-            with open(LOCAL_MEMORY_FILE, "r") as f:
-                return json.load(f)
-        except Exception:
-            pass
+            persisted = json.loads(data)
+            if persisted.get("version") == _version_stamp(_state()["version"]):
+                _state()["index"] = MemoryIndex.from_dict(persisted)
+                return _state()["index"]
+        except Exception as e:
+            print(f"Warning: Ignoring unreadable memory index: {e}")
+    _state()["index"] = MemoryIndex.build(_state()["memory"].get("entities", {}))
+    await _persist_index()
+    return _state()["index"]
+
+
+async def _get_vectors() -> VectorIndex:
+    """Returns the semantic vector index, memory-mapping the saved matrix when it is current."""
+    if _state()["vectors"] is not None:
+        return _state()["vectors"]
+    vectors = await run_blocking(VectorIndex.load, _vectors_path(), _version_stamp(_state()["version"]))
+    if vectors is not None:
+        _state()["vectors"] = vectors
+        return vectors
+    _state()["vectors"] = VectorIndex.build(_state()["memory"].get("entities", {}))
+    await _persist_index()
+    return _state()["vectors"]
+
+
+def _get_expiry() -> ExpiryIndex:
+    """Returns the expiry heap for the resident graph, building it on first use."""
+    if _state()["expiry"] is None:
+        _state()["expiry"] = ExpiryIndex.build(_state()["memory"].get("entities", {}))
+    return _state()["expiry"]
+
+
+def _get_sizes() -> SizeIndex:
+    """Returns the per-entity size index used for budget checks, building it on first use."""
+    if _state()["sizes"] is None:
+        _state()["sizes"] = SizeIndex.build(_state()["memory"].get("entities", {}))
+    return _state()["sizes"]
+
+
+def _update_index(memory: Dict[str, Any], ops: List[Dict[str, Any]], results: List[List[str]]) -> None:
+    """Incrementally updates the resident search, expiry and size indexes for the entities touched by `ops`."""
+    indexes = [
+        index for index in (_state()["index"], _state()["vectors"], _state()["expiry"], _state()["sizes"])
+        if index is not None
+    ]
+    if not indexes:
+        return
+    entities = memory.get("entities", {})
+    touched = set()
+    for op, removed in zip(ops, results):
+        touched.update(removed)
+        if "name" in op:
+            touched.add(op["name"])
+        elif op["op"] == "touch":
+            touched.update(op["names"])
+    for name in touched:
+        for index in indexes:
+            index.update(name, entities.get(name))
+
+
+def _invalidate_cache() -> None:
+    """Drops the resident graph so the next load re-reads storage."""
+    _state().update({
+        "memory": None, "version": None, "index": None, "vectors": None, "expiry": None, "adjacency": None,
+        "sizes": None, "observations": {}
+    })
+
+
+def memory_stats() -> Dict[str, Any]:
+    """Returns resident cache, storage backend and write contention counters for health reporting."""
+    memory = _state()["memory"]
+    return {
+        "cache": {
+            **CACHE_STATS,
+            "namespace": _namespace.get(),
+            "resident_namespaces": sum(1 for state in _states.values() if state["memory"] is not None),
+            "namespace_limit": NAMESPACE_RESIDENT_MAX,
+            "namespace_idle_seconds": NAMESPACE_IDLE_SECONDS,
+            "namespace_evictions": NAMESPACE_STATS["evictions"],
+            "resident": memory is not None,
+            "entities": len(memory.get("entities", {})) if memory is not None else 0,
+        },
+        "storage": get_store(MEMORY_STORAGE_MODE, _namespace.get()).stats(),
+        "writes": dict(WRITE_STATS),
+        "batching": dict(BATCH_STATS),
+        "reaper": dict(REAPER_STATS),
+        "budget": {
+            "policy": EVICTION_POLICY,
+            "max_entities": MAX_ENTITIES,
+            "max_bytes": MAX_BYTES,
+            "bytes": _get_sizes().total_bytes if memory is not None else None,
+            "pending_access": len(_state()["pending_access"]),
+            **BUDGET_STATS,
+        },
+    }
+
+
+def _graph_lock() -> asyncio.Lock:
+    """Per-event-loop, per-namespace lock serializing resident graph mutation with the storage I/O around it."""
+    locks = _graph_locks.setdefault(asyncio.get_running_loop(), {})
+    namespace = _namespace.get()
+    lock = locks.get(namespace)
+    if lock is None:
+        lock = locks[namespace] = asyncio.Lock()
+    return lock
+
+
+async def _load_memory() -> Dict[str, Any]:
+    """
+    Returns the resident memory dictionary, revalidating it against the storage backend and
+    only downloading and parsing the graph (or replaying new journal records) when it changed.
+    """
+    async with _graph_lock():
+        return await _load_memory_locked()
+
+
+async def _load_memory_locked() -> Dict[str, Any]:
+    cached_version = _state()["version"] if _state()["memory"] is not None else None
+    loaded = await run_blocking(get_store(MEMORY_STORAGE_MODE, _namespace.get()).load, cached_version)
+    if loaded is None:
+        CACHE_STATS["hits"] += 1
+        return _state()["memory"]
+
+    if loaded.memory is None:
+        CACHE_STATS["refreshes"] += 1
+        memory = _state()["memory"]
+    else:
+        CACHE_STATS["misses"] += 1
+        memory = _cache_put(loaded.memory, None)
+    results = [_apply_op(memory, op) for op in loaded.ops]
+    _cache_put(memory, loaded.version)
+    _update_index(memory, loaded.ops, results)
+    return memory
+
+
+async def _save_memory(memory: Dict[str, Any], ops: List[Dict[str, Any]]) -> bool:
+    """Persists `memory` (or just the `ops` that produced it, in journal mode) and refreshes the cache."""
+    version = await run_blocking(get_store(MEMORY_STORAGE_MODE, _namespace.get()).persist, memory, ops, _state()["version"])
+    _cache_put(memory, None if version == STORED_UNVERSIONED else version)
+    return version is not None
+
+
+def _is_expired(data: Dict[str, Any], now_iso: str) -> bool:
+    expires_at = data.get("expires_at")
+    return bool(expires_at) and expires_at < now_iso and not data.get("pinned", False)
 
-    return {"entities": {}, "relations": []}
 
+def _observation_set(name: str, observations: List[str]) -> set:
+    """Hashed view of an entity's observations for O(1) de-duplication, kept beside the resident graph."""
+    seen = _state()["observations"].get(name)
+    if seen is None or len(seen) != len(observations):
+        seen = _state()["observations"][name] = set(observations)
+    return seen
 
-def _save_memory(memory: Dict[str, Any]) -> bool:
-    """Saves memory dictionary to GCS or local storage."""
-    data = json.dumps(memory, indent=2)
 
-    if GCS_BUCKET_NAME:
+def _get_adjacency(memory: Dict[str, Any]) -> AdjacencyIndex:
+    """Returns the relation adjacency index for the resident graph, building it on first use."""
+    if _state()["adjacency"] is None:
+        _state()["adjacency"] = AdjacencyIndex.build(memory.get("relations", []))
+    return _state()["adjacency"]
+
+
+def _remove_entities(memory: Dict[str, Any], names: List[str]) -> None:
+    """Deletes entities together with every relation that starts or ends at them."""
+    entities = memory["entities"]
+    removed_relations = []
+    adjacency = _get_adjacency(memory) if memory.get("relations") else None
+    for name in names:
+        del entities[name]
+        _state()["observations"].pop(name, None)
+        if adjacency is not None:
+            removed_relations.extend(adjacency.remove_node(name))
+    if removed_relations:
+        removed_ids = {id(relation) for relation in removed_relations}
+        memory["relations"] = [r for r in memory["relations"] if id(r) not in removed_ids]
+
+
+def _apply_op(memory: Dict[str, Any], op: Dict[str, Any]) -> List[str]:
+    """
+    Applies one mutation record to the resident graph. Records are idempotent so journal replays are safe.
+    Returns the names of removed entities (only non-empty for 'prune', which removes every expired
+    entity, or only the expired ones among its optional 'names', 'drop', which removes 'names', and
+    'evict', which removes the unpinned ones among 'names').
+    Removing an entity also removes its relations; 'relate' is skipped unless both endpoints exist.
+    """
+    entities = memory.setdefault("entities", {})
+    kind = op["op"]
+
+    if kind == "upsert":
+        entity = entities.get(op["name"])
+        if entity is None:
+            entities[op["name"]] = {
+                "name": op["name"],
+                "category": op["category"],
+                "observations": [],
+                "created_at": op["at"],
+                "last_updated_at": op["at"],
+                "expires_at": op["expires_at"],
+                "pinned": op["pinned"]
+            }
+        else:
+            entity["last_updated_at"] = op["at"]
+            if op["pinned"]:
+                entity["pinned"] = True
+                entity["expires_at"] = None
+
+    elif kind == "observe":
+        entity = entities.get(op["name"])
+        if entity is not None:
+            existing_obs = entity.setdefault("observations", [])
+            seen = _observation_set(op["name"], existing_obs)
+            cap = op.get("cap")
+            if cap and op.get("evict") == "least_recent":
+                # Keep the list in recency order: everything observed now moves to the end
+                touched = dict.fromkeys(op["observations"])
+                seen.update(touched)
+                existing_obs[:] = [obs for obs in existing_obs if obs not in touched] + list(touched)
+            else:
+                for obs in op["observations"]:
+                    if obs not in seen:
+                        seen.add(obs)
+                        existing_obs.append(obs)
+            if cap and len(existing_obs) > cap:
+                evicted = existing_obs[:len(existing_obs) - cap]
+                del existing_obs[:len(existing_obs) - cap]
+                seen.difference_update(evicted)
+
+    elif kind == "prune":
+        candidates = op["names"] if "names" in op else entities
+        pruned = [name for name in candidates if name in entities and _is_expired(entities[name], op["at"])]
+        _remove_entities(memory, pruned)
+        return pruned
+
+    elif kind == "put":
+        # Whole-entity replacement, emitted by storage backends that refresh part of the graph
+        entities[op["name"]] = op["entity"]
+        _state()["observations"].pop(op["name"], None)
+
+    elif kind == "drop":
+        dropped = [name for name in op["names"] if name in entities]
+        _remove_entities(memory, dropped)
+        return dropped
+
+    elif kind == "evict":
+        evicted = [name for name in op["names"] if name in entities and not entities[name].get("pinned", False)]
+        _remove_entities(memory, evicted)
+        return evicted
+
+    elif kind == "merge":
+        # Imported entity: union of observations, earliest creation, latest update and expiry
+        incoming = op["entity"]
+        entity = entities.get(op["name"])
+        if entity is None:
+            entities[op["name"]] = {**incoming, "observations": list(incoming["observations"])}
+        else:
+            existing_obs = entity.setdefault("observations", [])
+            seen = _observation_set(op["name"], existing_obs)
+            for obs in incoming["observations"]:
+                if obs not in seen:
+                    seen.add(obs)
+                    existing_obs.append(obs)
+            entity["created_at"] = min(entity.get("created_at") or incoming["created_at"], incoming["created_at"])
+            entity["last_updated_at"] = max(entity.get("last_updated_at") or "", incoming["last_updated_at"])
+            if incoming["pinned"]:
+                entity["pinned"] = True
+                entity["expires_at"] = None
+            elif not entity.get("pinned", False) and entity.get("expires_at"):
+                entity["expires_at"] = max(entity["expires_at"], incoming["expires_at"] or entity["expires_at"])
+            if "recall_count" in incoming:
+                entity["recall_count"] = max(entity.get("recall_count", 0), incoming["recall_count"])
+            if incoming.get("last_recalled_at"):
+                entity["last_recalled_at"] = max(entity.get("last_recalled_at") or "", incoming["last_recalled_at"])
+
+    elif kind == "touch":
+        # Recall statistics merge by maximum, so replaying or racing records never inflates them
+        for name, (count, at) in op["access"].items():
+            entity = entities.get(name)
+            if entity is not None:
+                entity["recall_count"] = max(entity.get("recall_count", 0), count)
+                if at > (entity.get("last_recalled_at") or ""):
+                    entity["last_recalled_at"] = at
+
+    elif kind == "relate":
+        if op["from"] in entities and op["to"] in entities:
+            adjacency = _get_adjacency(memory)
+            relation = adjacency.edges.get((op["from"], op["type"], op["to"]))
+            if relation is None:
+                relation = {"from": op["from"], "type": op["type"], "to": op["to"], "created_at": op["at"]}
+                memory.setdefault("relations", []).append(relation)
+                adjacency.add(relation)
+            relation["last_updated_at"] = op["at"]
+
+    else:
+        raise ValueError(f"Unknown memory operation: '{kind}'")
+    return []
+
+
+async def _commit(ops: List[Dict[str, Any]]):
+    """
+    Applies `ops` to the current graph and persists them. When another writer changed the stored
+    graph first, the graph is re-read and `ops` re-applied after a jittered backoff.
+    Returns (memory, saved, per-op results).
+    """
+    for attempt in range(1, WRITE_MAX_ATTEMPTS + 1):
         try:
-            client = storage.Client()
-            bucket = client.bucket(GCS_BUCKET_NAME)
-            blob = bucket.blob("knowledge_graph.json")
-            blob.upload_from_string(data, content_type="application/json")
-            return True
-        except Exception as e:
-            print(f"Warning: Failed to save memory to GCS: {e}")
+            async with _graph_lock():
+                memory = await _load_memory_locked()
+                results = [_apply_op(memory, op) for op in ops]
+                _update_index(memory, ops, results)
+                try:
+                    saved = await _save_memory(memory, ops)
+                except BaseException:
+                    _invalidate_cache()
+                    raise
+        except WriteConflict:
+            WRITE_STATS["conflicts"] += 1
+            if attempt == WRITE_MAX_ATTEMPTS:
+                WRITE_STATS["failures"] += 1
+                raise WriteConflict(f"Memory write still conflicting after {attempt} attempts; retry later.")
+            WRITE_STATS["retries"] += 1
+            backoff_ms = min(WRITE_BACKOFF_MAX_MS, WRITE_BACKOFF_BASE_MS * 2 ** (attempt - 1))
+            await asyncio.sleep(random.uniform(0, backoff_ms) / 1000)
+            continue
+
+        WRITE_STATS["commits"] += 1
+        WRITE_STATS["max_attempts"] = max(WRITE_STATS["max_attempts"], attempt)
+        resident = _state()["index"] is not None or _state()["vectors"] is not None
+        if saved and resident and time.monotonic() - _state()["index_persisted_at"] >= INDEX_PERSIST_SECONDS:
+            await _persist_index()
+        return memory, saved, results
 
-    try:
-        os.makedirs(os.path.dirname(LOCAL_MEMORY_FILE), exist_ok=True)
-        with open(LOCAL_MEMORY_FILE, "w") as f:
-            f.write(data)
-        return True
-    except Exception as e:
-        print(f"Error saving local memory: {e}")
-        return False
+
+class _WriteBatcher:
+    """
+    Coalesces concurrent writes on one event loop. Callers queue their records and await a
+    future; a single flusher task applies everything queued within BATCH_WINDOW_MS (or once
+    BATCH_MAX_OPS records are waiting) and persists them with one commit.
+    """
+
+    def __init__(self):
+        self.pending: List[tuple] = []
+        self.pending_ops = 0
+        self.full = asyncio.Event()
+        self.flusher: Optional[asyncio.Task] = None
+
+    async def submit(self, ops: List[Dict[str, Any]]):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((ops, future))
+        self.pending_ops += len(ops)
+        BATCH_STATS["submitted"] += 1
+        if self.pending_ops >= BATCH_MAX_OPS:
+            self.full.set()
+        if self.flusher is None or self.flusher.done():
+            # The task copies the caller's context, so it commits to the caller's namespace
+            self.flusher = asyncio.create_task(self._flush_loop())
+        return await future
+
+    async def _flush_loop(self):
+        while self.pending:
+            if BATCH_WINDOW_MS > 0 and self.pending_ops < BATCH_MAX_OPS:
+                try:
+                    await asyncio.wait_for(self.full.wait(), timeout=BATCH_WINDOW_MS / 1000)
+                except asyncio.TimeoutError:
+                    pass
+            batch, self.pending, self.pending_ops = self.pending, [], 0
+            self.full.clear()
+            BATCH_STATS["batches"] += 1
+            BATCH_STATS["largest_batch"] = max(BATCH_STATS["largest_batch"], len(batch))
+
+            all_ops = [op for ops, _ in batch for op in ops]
+            try:
+                memory, saved, results = await _commit(all_ops)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            start = 0
+            for ops, future in batch:
+                if not future.done():
+                    future.set_result((memory, saved, results[start:start + len(ops)]))
+                start += len(ops)
+
+
+_batchers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, _WriteBatcher]]" = weakref.WeakKeyDictionary()
+
+
+async def _submit(ops: List[Dict[str, Any]]):
+    """Queues `ops` for the next group commit of the current namespace and waits until they are durable."""
+    batchers = _batchers.setdefault(asyncio.get_running_loop(), {})
+    namespace = _namespace.get()
+    batcher = batchers.get(namespace)
+    if batcher is None:
+        batcher = batchers[namespace] = _WriteBatcher()
+    return await batcher.submit(ops)
 
 
 async def remember_entity(
@@ -91,100 +814,692 @@ async def remember_entity(
         ttl_days: Retention period in days (default 30 days). Set None for infinite.
         pinned: If True, prevents automatic expiration pruning.
     """
-    memory = _load_memory()
-    entities = memory.setdefault("entities", {})
-    now = datetime.now(timezone.utc)
-    now_iso = now.isoformat()
+    clean_name, ops = _entity_ops(name, category, observations, ttl_days, pinned, datetime.now(timezone.utc))
+    memory, saved, _ = await _submit(ops)
+    entity = memory["entities"].get(clean_name)
+    if _budget_exceeded():
+        await evict_to_budget()
+    return {
+        "status": "success" if saved else "warning_local_only",
+        "entity": entity
+    }
+
 
+def _entity_ops(
+    name: str,
+    category: str,
+    observations: List[str],
+    ttl_days: Optional[int],
+    pinned: bool,
+    now: datetime
+):
+    """Sanitizes one entity write and returns (clean_name, [upsert, observe] records)."""
     clean_name = sanitize_text(name)
-    clean_category = sanitize_text(category)
-    clean_obs = [sanitize_text(obs) for obs in observations]
 
     expires_at = None
     if ttl_days and not pinned:
         expires_at = (now + timedelta(days=ttl_days)).isoformat()
 
-    if clean_name not in entities:
-        entities[clean_name] = {
+    ops = [
+        {
+            "op": "upsert",
             "name": clean_name,
-            "category": clean_category,
-            "observations": [],
-            "created_at": now_iso,
-            "last_updated_at": now_iso,
+            "category": sanitize_text(category),
+            "at": now.isoformat(),
             "expires_at": expires_at,
             "pinned": pinned
-        }
-    else:
-        entities[clean_name]["last_updated_at"] = now_iso
-        if pinned:
-            entities[clean_name]["pinned"] = True
-            entities[clean_name]["expires_at"] = None
+        },
+        {"op": "observe", "name": clean_name, "observations": [sanitize_text(obs) for obs in observations]}
+    ]
+    if MAX_OBSERVATIONS > 0:
+        ops[1].update({"cap": MAX_OBSERVATIONS, "evict": OBSERVATION_EVICTION})
+    return clean_name, ops
+
+
+def _validate_record(record: Any) -> Optional[str]:
+    """Returns why a bulk memory record is invalid, or None when it can be stored."""
+    if not isinstance(record, dict):
+        return "record must be an object"
+    for field in ("name", "category"):
+        if not isinstance(record.get(field), str) or not record[field].strip():
+            return f"'{field}' must be a non-empty string"
+    observations = record.get("observations")
+    if not isinstance(observations, list) or not all(isinstance(obs, str) for obs in observations):
+        return "'observations' must be a list of strings"
+    ttl_days = record.get("ttl_days", DEFAULT_RETENTION_DAYS)
+    if ttl_days is not None and (isinstance(ttl_days, bool) or not isinstance(ttl_days, int)):
+        return "'ttl_days' must be an integer or null"
+    if not isinstance(record.get("pinned", False), bool):
+        return "'pinned' must be a boolean"
+    return None
 
-    existing_obs = entities[clean_name].setdefault("observations", [])
-    for obs in clean_obs:
-        if obs not in existing_obs:
-            existing_obs.append(obs)
 
-    saved = _save_memory(memory)
+async def remember_entities(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Stores many entities in one atomic load/sanitize/save cycle.
+
+    Args:
+        records: Up to MEMORY_BULK_MAX_RECORDS objects with `name`, `category`, `observations`
+            and optional `ttl_days` / `pinned` (same meaning as remember_entity).
+
+    Invalid records are reported and skipped; all valid records are committed together.
+    """
+    if not isinstance(records, list):
+        raise ValueError("'records' must be a list of memory records.")
+    if len(records) > BULK_MAX_RECORDS:
+        raise ValueError(f"Too many records: {len(records)} (limit {BULK_MAX_RECORDS}).")
+
+    now = datetime.now(timezone.utc)
+    results = []
+    ops = []
+    for i, record in enumerate(records):
+        error = _validate_record(record)
+        if error:
+            results.append({"index": i, "status": "error", "error": error})
+            continue
+        clean_name, record_ops = _entity_ops(
+            record["name"],
+            record["category"],
+            record["observations"],
+            record.get("ttl_days", DEFAULT_RETENTION_DAYS),
+            record.get("pinned", False),
+            now
+        )
+        ops.extend(record_ops)
+        results.append({"index": i, "name": clean_name, "status": "stored"})
+
+    saved = True
+    if ops:
+        _, saved, _ = await _submit(ops)
+        if _budget_exceeded():
+            await evict_to_budget()
+    stored = sum(1 for r in results if r["status"] == "stored")
     return {
         "status": "success" if saved else "warning_local_only",
-        "entity": entities[clean_name]
+        "stored_count": stored,
+        "error_count": len(results) - stored,
+        "results": results
     }
 
 
-async def recall_entities(query: Optional[str] = None, include_expired: bool = False) -> Dict[str, Any]:
+ENTITY_FIELDS = (
+    "name", "category", "observations", "created_at", "last_updated_at", "expires_at", "pinned",
+    "recall_count", "last_recalled_at"
+)
+
+
+def _query_fingerprint(query: Optional[str], category: Optional[str], mode: str) -> str:
+    return hashlib.blake2b(json.dumps([query or "", (category or "").lower(), mode]).encode("utf-8"), digest_size=6).hexdigest()
+
+
+def _encode_cursor(fingerprint: str, snapshot: str, position: int, name: str) -> str:
+    data = json.dumps([fingerprint, snapshot, position, name]).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, fingerprint: str) -> tuple:
+    """(snapshot id, position in the ranked list, last returned name) of a `next_cursor`."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        cursor_fingerprint, snapshot, position, name = data
+        after = (str(snapshot), int(position), str(name))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor.")
+    if cursor_fingerprint != fingerprint:
+        raise ValueError("Cursor does not belong to this query; repeat the original query, category and mode.")
+    return after
+
+
+def _resume_position(ranked: List[tuple], after: tuple, by_name: bool) -> int:
+    """Where a cursor whose snapshot is gone continues in a freshly ranked list."""
+    _, position, name = after
+    if by_name:
+        # Name order is unaffected by writes: continue after the last returned name
+        return next((i for i, (candidate, _) in enumerate(ranked) if candidate > name), len(ranked))
+    for i, (candidate, _) in enumerate(ranked):
+        if candidate == name:
+            return i + 1
+    return min(position, len(ranked))
+
+
+def _cursor_snapshot(snapshot_id: str) -> Optional[Dict[str, Any]]:
+    """The stored remainder behind a cursor, or None when it expired or was never kept."""
+    cursors = _state()["cursors"]
+    now = time.monotonic()
+    while cursors and now - next(iter(cursors.values()))["used_at"] >= CURSOR_TTL_SECONDS:
+        cursors.popitem(last=False)
+    snapshot = cursors.get(snapshot_id) if snapshot_id else None
+    if snapshot is not None:
+        snapshot["used_at"] = now
+        cursors.move_to_end(snapshot_id)
+    return snapshot
+
+
+def _keep_cursor_snapshot(snapshot_id: str, snapshot: Dict[str, Any]) -> None:
+    """Stores a cursor's remainder, dropping the least recently paged ones beyond the count and name budgets."""
+    cursors = _state()["cursors"]
+    snapshot["used_at"] = time.monotonic()
+    cursors[snapshot_id] = snapshot
+    cursors.move_to_end(snapshot_id)
+    stored = sum(len(kept["names"]) for kept in cursors.values())
+    while cursors and (len(cursors) > CURSOR_SNAPSHOTS or stored > CURSOR_SNAPSHOT_NAMES):
+        stored -= len(cursors.popitem(last=False)[1]["names"])
+
+
+def _project(entity: Dict[str, Any], fields: Optional[List[str]], max_observations: Optional[int]) -> Dict[str, Any]:
+    """Copy of `entity` with only `fields`, keeping at most the `max_observations` most recent observations."""
+    if fields is None and max_observations is None:
+        return entity
+    projected = {key: value for key, value in entity.items() if fields is None or key in fields}
+    observations = projected.get("observations")
+    if max_observations is not None and observations is not None and len(observations) > max_observations:
+        projected["observations"] = observations[len(observations) - max_observations:] if max_observations else []
+        projected["observations_truncated"] = len(observations) - max_observations
+    return projected
+
+
+async def recall_entities(
+    query: Optional[str] = None,
+    include_expired: bool = False,
+    category: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    mode: str = "keyword",
+    cursor: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    max_observations: Optional[int] = None
+) -> Dict[str, Any]:
     """
     Recalls unexpired entities and observations stored in long-term memory.
     
     Args:
-        query: Optional search term to filter entity names or observations.
+        query: Optional search terms. In keyword mode every term must appear in the entity name,
+            category or observations, and matches are ranked by relevance (BM25).
         include_expired: If True, includes items past their expiration date.
+        category: Optional category filter (case-insensitive exact match).
+        limit: Maximum number of entities to return (default all).
+        offset: Number of matching entities to skip.
+        mode: 'keyword' or 'semantic' (cosine similarity of hashed character n-gram vectors,
+            which also matches differently worded facts; scores are returned alongside).
+        cursor: `next_cursor` from the previous page of the same query.
+        fields: Entity fields to return (default all of ENTITY_FIELDS).
+        max_observations: Return at most this many of each entity's most recent observations.
+
+    Results are ordered by name, or by score then name for queries. Cursors page through the
+    ranking taken for the first page, so writes in between neither shift nor repeat results
+    (entities removed meanwhile are skipped, new ones appear in a fresh query).
     """
-    memory = _load_memory()
+    if mode not in ("keyword", "semantic"):
+        raise ValueError(f"Unknown query mode: '{mode}'")
+    if fields is not None:
+        unknown = [field for field in fields if field not in ENTITY_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown entity field(s): {', '.join(unknown)}. Expected any of: {', '.join(ENTITY_FIELDS)}")
+    if max_observations is not None and max_observations < 0:
+        raise ValueError("max_observations must not be negative.")
+    fingerprint = _query_fingerprint(query, category, mode)
+    after = _decode_cursor(cursor, fingerprint) if cursor else None
+    semantic = bool(query) and mode == "semantic"
+    async with _graph_lock():
+        memory = await _load_memory_locked()
+        index = (await _get_vectors() if semantic else await _get_index()) if query else None
     entities = memory.get("entities", {})
     now_iso = datetime.now(timezone.utc).isoformat()
+    expired = set() if include_expired else _get_expiry().expired_now(entities, now_iso)
+    category_lower = category.lower() if category is not None else None
 
-    valid_entities = {}
-    for name, data in entities.items():
-        expires_at = data.get("expires_at")
-        if not include_expired and expires_at and expires_at < now_iso and not data.get("pinned", False):
-            continue
-        valid_entities[name] = data
+    snapshot = _cursor_snapshot(after[0]) if after is not None and query else None
+    if snapshot is not None and after[1] < snapshot["base"]:
+        snapshot = None  # an earlier page is requested again; its part of the ranking is no longer kept
+    # Positions in `ranked` are offset by `base` when it is a stored remainder
+    base, total = 0, None
+    if snapshot is not None:
+        scores = snapshot["scores"] or [0.0] * len(snapshot["names"])
+        ranked, base, total = list(zip(snapshot["names"], scores)), snapshot["base"], snapshot["total"]
+        start = after[1] - base
+    elif not query:
+        ranked = sorted(
+            (name, 0.0) for name, data in entities.items()
+            if name not in expired
+            and (category_lower is None or (data.get("category") or "").lower() == category_lower)
+        )
+    elif semantic:
+        ranked = [
+            (name, score) for name, score in index.search(query)
+            if name in entities and name not in expired
+            and (category_lower is None or (entities[name].get("category") or "").lower() == category_lower)
+        ]
+    else:
+        ranked = [(name, score) for name, score in index.search(query, category=category) if name not in expired]
+    if snapshot is None:
+        start = _resume_position(ranked, after, by_name=not query) if after is not None else 0
+
+    # Positions in `ranked` of the entities still present, from the cursor on
+    live = (
+        i for i in range(start, len(ranked))
+        if snapshot is None or (ranked[i][0] in entities and ranked[i][0] not in expired)
+    )
+    positions = []
+    skip, more = offset, False
+    for i in live:
+        if skip:
+            skip -= 1
+        elif limit is not None and len(positions) == limit:
+            more = True
+            break
+        else:
+            positions.append(i)
+    page = [ranked[i] for i in positions]
+    next_cursor = None
+    if page and more:
+        snapshot_id = ""
+        if query:
+            snapshot_id = after[0] if snapshot is not None else uuid.uuid4().hex[:12]
+            remainder = ranked[positions[-1] + 1:]
+            _keep_cursor_snapshot(snapshot_id, {
+                "names": [name for name, _ in remainder],
+                "scores": [score for _, score in remainder] if semantic else None,
+                "base": base + positions[-1] + 1,
+                "total": total if total is not None else len(ranked)
+            })
+        next_cursor = _encode_cursor(fingerprint, snapshot_id, base + positions[-1] + 1, page[-1][0])
+
+    if total is None:
+        total = len(ranked)
+    result: Dict[str, Any] = {"query": query, "matches": total} if query else {"total_count": total}
+    if semantic:
+        result["mode"] = mode
+    result["entities"] = {name: _project(entities[name], fields, max_observations) for name, _ in page}
+    for name, _ in page:
+        access = _state()["pending_access"].setdefault(name, [0, now_iso])
+        access[0] += 1
+        access[1] = now_iso
+    if semantic:
+        result["scores"] = dict(page)
+    result["next_cursor"] = next_cursor
+    return result
+
+
+def _relation_field_error(fields: Dict[str, Any]) -> Optional[str]:
+    """Error message unless every relation field (name -> value) is a non-empty string."""
+    for field, value in fields.items():
+        if not isinstance(value, str) or not value.strip():
+            return f"'{field}' must be a non-empty string"
+    return None
+
+
+def _unknown_endpoints(memory: Dict[str, Any], op: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    missing = [name for name in (op["from"], op["to"]) if name not in memory["entities"]]
+    if missing:
+        return {"status": "error", "error": f"Unknown entity: {', '.join(repr(name) for name in missing)}"}
+    return None
+
+
+async def store_relation(from_name: str, to_name: str, relation_type: str) -> Dict[str, Any]:
+    """
+    Stores a directed, typed relation between two existing entities.
+
+    Args:
+        from_name: Source entity name (e.g. 'Cloud Run').
+        to_name: Target entity name (e.g. 'Artifact Registry').
+        relation_type: Relation label in active voice (e.g. 'pulls_images_from').
+
+    Storing the same relation again only refreshes its timestamp. Relations are removed
+    together with either endpoint when it expires.
+    """
+    error = _relation_field_error({"from": from_name, "to": to_name, "relation_type": relation_type})
+    if error:
+        return {"status": "error", "error": error}
+    op = {
+        "op": "relate",
+        "from": sanitize_text(from_name),
+        "type": sanitize_text(relation_type),
+        "to": sanitize_text(to_name),
+        "at": datetime.now(timezone.utc).isoformat()
+    }
+    # Rejected before anything is written; checked again after the commit in case an endpoint
+    # was removed in between (the record is then a no-op)
+    error = _unknown_endpoints(await _load_memory(), op)
+    if error is not None:
+        return error
+    memory, saved, _ = await _submit([op])
+    error = _unknown_endpoints(memory, op)
+    if error is not None:
+        return error
+    return {
+        "status": "success" if saved else "warning_local_only",
+        "relation": _get_adjacency(memory).edges.get((op["from"], op["type"], op["to"]))
+    }
 
-    if not query:
-        return {"total_count": len(valid_entities), "entities": valid_entities}
 
-    query_lower = query.lower()
-    filtered = {}
-    for name, data in valid_entities.items():
-        if query_lower in name.lower() or any(query_lower in obs.lower() for obs in data.get("observations", [])):
-            filtered[name] = data
+async def query_neighbors(
+    name: str,
+    hops: int = 1,
+    direction: str = "both",
+    relation_type: Optional[str] = None,
+    max_nodes: Optional[int] = None,
+    include_expired: bool = False
+) -> Dict[str, Any]:
+    """
+    Returns the entities reachable from `name` through relations, breadth first.
 
-    return {"query": query, "matches": len(filtered), "entities": filtered}
+    Args:
+        name: Entity to start from.
+        hops: Maximum path length (capped at MEMORY_NEIGHBOR_MAX_HOPS).
+        direction: 'out' (relations from the entity), 'in' (relations to it) or 'both'.
+        relation_type: Optional relation label filter (case-insensitive).
+        max_nodes: Maximum number of neighbors to return (capped at MEMORY_NEIGHBOR_MAX_NODES).
+        include_expired: If True, traverses through entities past their expiration date.
+    """
+    if direction not in ("out", "in", "both"):
+        raise ValueError(f"Unknown direction: '{direction}'")
+    hops = max(1, min(hops, NEIGHBOR_MAX_HOPS))
+    max_nodes = max(1, min(max_nodes or NEIGHBOR_MAX_NODES, NEIGHBOR_MAX_NODES))
 
+    async with _graph_lock():
+        memory = await _load_memory_locked()
+    entities = memory.get("entities", {})
+    now_iso = datetime.now(timezone.utc).isoformat()
+    expired = set() if include_expired else _get_expiry().expired_now(entities, now_iso)
+    if name not in entities or name in expired:
+        return {"entity": name, "found": False, "neighbors": {}, "relations": [], "truncated": False}
+
+    depths, relations, truncated = _get_adjacency(memory).bfs(
+        name, hops, max_nodes, direction, relation_type,
+        visible=lambda n: n in entities and n not in expired
+    )
+    return {
+        "entity": name,
+        "found": True,
+        "neighbors": {
+            neighbor: {"depth": depth, **entities[neighbor]}
+            for neighbor, depth in depths.items() if neighbor != name
+        },
+        "relations": relations,
+        "truncated": truncated
+    }
 
-async def prune_expired_memories() -> Dict[str, Any]:
-    """Prunes expired, unpinned memories from storage based on retention policy."""
-    memory = _load_memory()
+
+async def export_records() -> AsyncIterator[str]:
+    """
+    Streams the graph as NDJSON: one {"record": "entity", ...} line per entity, then one
+    {"record": "relation", ...} line per relation. Entities are serialized EXPORT_CHUNK_ENTITIES
+    at a time from the resident graph, so the full export text never exists in memory.
+    """
+    memory = await _load_memory()
     entities = memory.get("entities", {})
+    names = list(entities)
+    for start in range(0, len(names), EXPORT_CHUNK_ENTITIES):
+        lines = [
+            json.dumps({"record": "entity", **entities[name]}, ensure_ascii=False) + "\n"
+            for name in names[start:start + EXPORT_CHUNK_ENTITIES] if name in entities
+        ]
+        yield "".join(lines)
+    relations = list(memory.get("relations", []))
+    for start in range(0, len(relations), EXPORT_CHUNK_ENTITIES):
+        yield "".join(
+            json.dumps({"record": "relation", **relation}, ensure_ascii=False) + "\n"
+            for relation in relations[start:start + EXPORT_CHUNK_ENTITIES]
+        )
+
+
+def _import_op(record: Any, now_iso: str) -> Dict[str, Any]:
+    """Validates and sanitizes one import line into a 'merge' or 'relate' record."""
+    if not isinstance(record, dict):
+        raise ValueError("line must be a JSON object")
+    kind = record.get("record", "entity")
+    if kind == "relation":
+        error = _relation_field_error({field: record.get(field) for field in ("from", "type", "to")})
+        if error:
+            raise ValueError(error)
+        return {
+            "op": "relate",
+            "from": sanitize_text(record["from"]),
+            "type": sanitize_text(record["type"]),
+            "to": sanitize_text(record["to"]),
+            "at": record.get("last_updated_at") or now_iso
+        }
+    if kind != "entity":
+        raise ValueError(f"unknown record type '{kind}'")
+    error = _validate_record({**record, "ttl_days": None, "observations": record.get("observations", [])})
+    if error:
+        raise ValueError(error)
+    for field in ("created_at", "last_updated_at", "expires_at", "last_recalled_at"):
+        if record.get(field) is not None and not isinstance(record[field], str):
+            raise ValueError(f"'{field}' must be an ISO timestamp string or null")
+    pinned = bool(record.get("pinned", False))
+    name = sanitize_text(record["name"])
+    entity = {
+        "name": name,
+        "category": sanitize_text(record["category"]),
+        "observations": list(dict.fromkeys(sanitize_text(obs) for obs in record.get("observations", []))),
+        "created_at": record.get("created_at") or now_iso,
+        "last_updated_at": record.get("last_updated_at") or record.get("created_at") or now_iso,
+        "expires_at": None if pinned else record.get("expires_at"),
+        "pinned": pinned
+    }
+    if isinstance(record.get("recall_count"), int):
+        entity["recall_count"] = record["recall_count"]
+    if record.get("last_recalled_at"):
+        entity["last_recalled_at"] = record["last_recalled_at"]
+    return {"op": "merge", "name": name, "entity": entity}
+
+
+async def import_records(chunks: AsyncIterable[bytes]) -> Dict[str, Any]:
+    """
+    Merges an NDJSON stream (as produced by export_records) into the graph.
+
+    Args:
+        chunks: Raw byte chunks of the upload, consumed incrementally.
+
+    Lines are sanitized and committed in batches of IMPORT_BATCH_RECORDS with one persist per
+    batch, so memory use is bounded by the batch rather than the upload. Invalid lines are
+    skipped and reported; lines longer than IMPORT_MAX_LINE_BYTES abort the import.
+    """
     now_iso = datetime.now(timezone.utc).isoformat()
+    report = {"entities": 0, "relations": 0, "batches": 0, "error_count": 0, "errors": [], "saved": True}
+    batch: List[Dict[str, Any]] = []
+    line_no = 0
 
-    pruned = []
-    retained = {}
+    async def flush():
+        _, saved, _ = await _submit(batch)
+        report["batches"] += 1
+        report["saved"] = report["saved"] and saved
+        batch.clear()
+        if _budget_exceeded():
+            await evict_to_budget()
 
-    for name, data in entities.items():
-        expires_at = data.get("expires_at")
-        if expires_at and expires_at < now_iso and not data.get("pinned", False):
-            pruned.append(name)
-        else:
-            retained[name] = data
+    def handle(line: bytes):
+        if not line.strip():
+            return
+        try:
+            op = _import_op(json.loads(line), now_iso)
+        except ValueError as e:
+            report["error_count"] += 1
+            if len(report["errors"]) < 20:
+                report["errors"].append({"line": line_no, "error": str(e)})
+            return
+        report["relations" if op["op"] == "relate" else "entities"] += 1
+        batch.append(op)
+
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > IMPORT_MAX_LINE_BYTES:
+            raise ValueError(f"Import line {line_no + len(lines) + 1} exceeds {IMPORT_MAX_LINE_BYTES} bytes.")
+        for line in lines:
+            line_no += 1
+            handle(line)
+            if len(batch) >= IMPORT_BATCH_RECORDS:
+                await flush()
+    if buffer:
+        line_no += 1
+        handle(buffer)
+    if batch:
+        await flush()
 
-    memory["entities"] = retained
-    saved = _save_memory(memory)
+    saved = report.pop("saved")
+    return {"status": "success" if saved else "warning_local_only", "lines": line_no, **report}
+
+
+async def prune_expired_memories(evict: bool = False) -> Dict[str, Any]:
+    """
+    Prunes expired, unpinned memories from storage based on retention policy.
+
+    Args:
+        evict: If True, also runs a budget eviction pass (see evict_to_budget).
+    """
+    memory, saved, results = await _submit([{"op": "prune", "at": datetime.now(timezone.utc).isoformat()}])
+    pruned = results[0]
+    evicted = (await evict_to_budget())["evicted_entities"] if evict else []
 
     return {
         "status": "success" if saved else "warning_local_only",
         "pruned_count": len(pruned),
         "pruned_entities": pruned,
-        "retained_count": len(retained)
+        "evicted_count": len(evicted),
+        "evicted_entities": evicted,
+        "retained_count": len(memory["entities"])
     }
+
+
+def _over_budget(count: int, total_bytes: int, ratio: float = 1.0) -> bool:
+    return (MAX_ENTITIES > 0 and count > MAX_ENTITIES * ratio) or (MAX_BYTES > 0 and total_bytes > MAX_BYTES * ratio)
+
+
+def _budget_exceeded() -> bool:
+    """Cheap check of the resident graph against MEMORY_MAX_ENTITIES / MEMORY_MAX_BYTES."""
+    memory = _state()["memory"]
+    if memory is None or (MAX_ENTITIES <= 0 and MAX_BYTES <= 0):
+        return False
+    return _over_budget(len(memory.get("entities", {})), _get_sizes().total_bytes)
+
+
+def _eviction_key(name: str, entity: Dict[str, Any]) -> tuple:
+    # Recalled and later updated (or the reverse): whichever happened last counts
+    last_used = max(entity.get("last_recalled_at") or "", entity.get("last_updated_at") or entity.get("created_at") or "")
+    if EVICTION_POLICY == "lfu":
+        return (entity.get("recall_count", 0), last_used, name)
+    return (last_used, name)
+
+
+async def flush_access_stats() -> int:
+    """Writes pending recall counts and times back to the graph as one 'touch' record."""
+    pending_access = _state()["pending_access"]
+    if not pending_access:
+        return 0
+    pending = dict(pending_access)
+    pending_access.clear()
+    entities = (await _load_memory())["entities"]
+    access = {
+        name: [entities[name].get("recall_count", 0) + count, at]
+        for name, (count, at) in pending.items() if name in entities
+    }
+    if access:
+        try:
+            await _submit([{"op": "touch", "names": sorted(access), "access": access}])
+        except Exception:
+            for name, (count, at) in pending.items():
+                current = pending_access.setdefault(name, [0, at])
+                current[0] += count
+                current[1] = max(current[1], at)
+            raise
+    return len(access)
+
+
+async def evict_to_budget() -> Dict[str, Any]:
+    """
+    When the graph exceeds MEMORY_MAX_ENTITIES or MEMORY_MAX_BYTES, evicts unpinned entities in
+    MEMORY_EVICTION_POLICY order ('lru' or 'lfu') until usage is under MEMORY_EVICTION_TARGET
+    of the budget. Pending recall statistics are written first so the order reflects them.
+    """
+    if MAX_ENTITIES <= 0 and MAX_BYTES <= 0:
+        return {"evicted_count": 0, "evicted_entities": []}
+    await flush_access_stats()
+    async with _graph_lock():
+        memory = await _load_memory_locked()
+        sizes = _get_sizes()
+    entities = memory.get("entities", {})
+    count, total_bytes = len(entities), sizes.total_bytes
+
+    victims = []
+    if _over_budget(count, total_bytes):
+        candidates = sorted(
+            _eviction_key(name, entity) for name, entity in entities.items()
+            if not entity.get("pinned", False)
+        )
+        for candidate in candidates:
+            if not _over_budget(count, total_bytes, EVICTION_TARGET):
+                break
+            name = candidate[-1]
+            victims.append(name)
+            count -= 1
+            total_bytes -= sizes.sizes.get(name, 0)
+
+    evicted = []
+    if victims:
+        _, _, results = await _submit([{"op": "evict", "names": victims}])
+        evicted = results[0]
+    BUDGET_STATS["passes"] += 1
+    BUDGET_STATS["evicted"] += len(evicted)
+    BUDGET_STATS["last_evicted"] = len(evicted)
+    return {"evicted_count": len(evicted), "evicted_entities": evicted}
+
+
+async def reap_expired_memories(max_entities: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Evicts entities that are due according to the expiry heap, at most `max_entities` per pass
+    (default MEMORY_REAPER_BATCH), without scanning the whole graph.
+    """
+    started = time.perf_counter()
+    now_iso = datetime.now(timezone.utc).isoformat()
+    async with _graph_lock():
+        memory = await _load_memory_locked()
+        due = sorted(_get_expiry().expired_now(memory.get("entities", {}), now_iso))
+    due = due[:max_entities or REAPER_BATCH]
+
+    evicted = []
+    if due:
+        _, _, results = await _submit([{"op": "prune", "at": now_iso, "names": due}])
+        evicted = results[0]
+
+    duration_ms = (time.perf_counter() - started) * 1000
+    REAPER_STATS["runs"] += 1
+    REAPER_STATS["evicted"] += len(evicted)
+    REAPER_STATS["last_evicted"] = len(evicted)
+    REAPER_STATS["last_run_ms"] = round(duration_ms, 3)
+    REAPER_STATS["last_run_at"] = now_iso
+    return {"evicted_count": len(evicted), "evicted_entities": evicted, "duration_ms": duration_ms}
+
+
+async def run_expiry_reaper(interval_seconds: float = REAPER_INTERVAL_SECONDS) -> None:
+    """
+    Background task (started from the app lifespan) that reaps due entities every interval,
+    writes back pending recall statistics and enforces the size budget.
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        # Idle user namespaces write back their recall statistics and are dropped instead of reaped
+        cutoff = time.monotonic() - NAMESPACE_IDLE_SECONDS
+        for namespace in [ns for ns, used_at in _namespace_used.items() if used_at <= cutoff]:
+            with memory_namespace(namespace, touch=False):
+                try:
+                    await flush_access_stats()
+                except Exception as e:
+                    REAPER_STATS["errors"] += 1
+                    print(f"Warning: Failed to flush recall statistics of idle namespace '{namespace}': {e}")
+        _evict_namespaces()
+
+        # The shared graph, plus every user namespace that is resident in this process
+        namespaces = {SHARED_NAMESPACE} | {ns for ns, state in _states.items() if state["memory"] is not None}
+        for namespace in sorted(namespaces):
+            with memory_namespace(namespace, touch=False):
+                try:
+                    await reap_expired_memories()
+                    await flush_access_stats()
+                    if _budget_exceeded():
+                        await evict_to_budget()
+                except Exception as e:
+                    REAPER_STATS["errors"] += 1
+                    print(f"Warning: Memory expiry reaper pass failed for namespace '{namespace}': {e}")
@@ -0,0 +1,88 @@
+import os
+import json
+import gzip
+from typing import Dict, Any, Tuple
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - listed in requirements.txt
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - listed in requirements.txt
+    zstandard = None
+
+# Serialization of graph snapshots: "<encoding>" or "<encoding>+<compression>", where encoding is
+# json or msgpack and compression is gzip or zstd. Plain "json" is written without a header, so
+# those snapshots stay readable by any JSON tool; every other format starts with FORMAT_MAGIC.
+SNAPSHOT_FORMAT = os.getenv("MEMORY_SNAPSHOT_FORMAT", "json")
+FORMAT_MAGIC = b"MGRAPH1:"
+GZIP_LEVEL = int(os.getenv("MEMORY_SNAPSHOT_GZIP_LEVEL", "6"))
+ZSTD_LEVEL = int(os.getenv("MEMORY_SNAPSHOT_ZSTD_LEVEL", "3"))
+
+ENCODINGS = ("json", "msgpack")
+COMPRESSIONS = ("gzip", "zstd")
+
+
+def _parse_format(fmt: str) -> Tuple[str, str]:
+    encoding, _, compression = fmt.partition("+")
+    if encoding not in ENCODINGS or (compression and compression not in COMPRESSIONS):
+        raise ValueError(f"Unknown memory snapshot format: '{fmt}'")
+    if encoding == "msgpack" and msgpack is None:
+        raise ValueError("Snapshot format 'msgpack' requires the msgpack package")
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("Snapshot compression 'zstd' requires the zstandard package")
+    return encoding, compression
+
+
+def available_formats() -> list:
+    """Every format this process can both write and read."""
+    formats = []
+    for encoding in ENCODINGS:
+        for compression in ("",) + COMPRESSIONS:
+            fmt = f"{encoding}+{compression}" if compression else encoding
+            try:
+                _parse_format(fmt)
+            except ValueError:
+                continue
+            formats.append(fmt)
+    return formats
+
+
+def encode_graph(graph: Dict[str, Any], fmt: str = None) -> bytes:
+    """Serializes a graph snapshot in `fmt` (default MEMORY_SNAPSHOT_FORMAT)."""
+    fmt = fmt or SNAPSHOT_FORMAT
+    encoding, compression = _parse_format(fmt)
+    if encoding == "json":
+        body = json.dumps(graph, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    else:
+        body = msgpack.packb(graph, use_bin_type=True)
+    if fmt == "json":
+        return body
+    if compression == "gzip":
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    elif compression == "zstd":
+        body = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    return FORMAT_MAGIC + fmt.encode("ascii") + b"\n" + body
+
+
+def decode_graph(data: bytes) -> Dict[str, Any]:
+    """Parses a snapshot in any supported format, detected from its header (headerless data is JSON)."""
+    if not data.startswith(FORMAT_MAGIC):
+        return json.loads(data)
+    header_end = data.index(b"\n", len(FORMAT_MAGIC))
+    encoding, compression = _parse_format(data[len(FORMAT_MAGIC):header_end].decode("ascii"))
+    body = data[header_end + 1:]
+    if compression == "gzip":
+        body = gzip.decompress(body)
+    elif compression == "zstd":
+        body = zstandard.ZstdDecompressor().decompress(body)
+    if encoding == "json":
+        return json.loads(body)
+    return msgpack.unpackb(body, raw=False, strict_map_key=False)
+
+
+def content_type(fmt: str = None) -> str:
+    """Content type for GCS objects written in `fmt`."""
+    return "application/json" if (fmt or SNAPSHOT_FORMAT) == "json" else "application/octet-stream"
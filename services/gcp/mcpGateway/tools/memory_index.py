@@ -0,0 +1,326 @@
+import re
+import json
+import math
+import heapq
+from collections import Counter
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Field weights applied to term frequencies and BM25 tuning constants
+NAME_WEIGHT = 3
+CATEGORY_WEIGHT = 2
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercases and splits text into word tokens."""
+    if not isinstance(text, str):
+        return []
+    return TOKEN_RE.findall(text.lower())
+
+
+def _trigrams(token: str) -> Set[str]:
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+class MemoryIndex:
+    """
+    Inverted index over entity names, categories and observations.
+
+    Each entity is a document of field-weighted token frequencies. Postings map tokens to
+    documents, and a trigram index over the token vocabulary lets a query term match any
+    token containing it, which keeps the old substring-style recall without scanning text.
+    """
+
+    def __init__(self):
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.vocab_trigrams: Dict[str, Set[str]] = {}
+        self.total_length = 0
+
+    @classmethod
+    def build(cls, entities: Dict[str, Dict[str, Any]]) -> "MemoryIndex":
+        index = cls()
+        for name, entity in entities.items():
+            index.update(name, entity)
+        return index
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MemoryIndex":
+        index = cls()
+        for name, doc in data.get("docs", {}).items():
+            index._add_doc(name, doc["category"], Counter(doc["tf"]))
+        return index
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "docs": {
+                name: {"category": doc["category"], "tf": dict(doc["tf"])}
+                for name, doc in self.docs.items()
+            }
+        }
+
+    def update(self, name: str, entity: Optional[Dict[str, Any]]) -> None:
+        """Re-indexes one entity; passing None removes it."""
+        self.remove(name)
+        if entity is None:
+            return
+        tf: Counter = Counter()
+        for token in tokenize(name):
+            tf[token] += NAME_WEIGHT
+        category = entity.get("category") or ""
+        for token in tokenize(category):
+            tf[token] += CATEGORY_WEIGHT
+        for obs in entity.get("observations", []):
+            tf.update(tokenize(obs))
+        self._add_doc(name, category.lower(), tf)
+
+    def remove(self, name: str) -> None:
+        doc = self.docs.pop(name, None)
+        if doc is None:
+            return
+        self.total_length -= doc["len"]
+        for token in doc["tf"]:
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(name, None)
+            if not posting:
+                del self.postings[token]
+                for trigram in _trigrams(token):
+                    tokens = self.vocab_trigrams.get(trigram)
+                    if tokens is not None:
+                        tokens.discard(token)
+                        if not tokens:
+                            del self.vocab_trigrams[trigram]
+
+    def _add_doc(self, name: str, category: str, tf: Counter) -> None:
+        length = sum(tf.values())
+        self.docs[name] = {"category": category, "tf": tf, "len": length}
+        self.total_length += length
+        for token, count in tf.items():
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = {}
+                for trigram in _trigrams(token):
+                    self.vocab_trigrams.setdefault(trigram, set()).add(token)
+            posting[name] = count
+
+    def _matching_tokens(self, term: str) -> Set[str]:
+        """Vocabulary tokens containing `term` as a substring."""
+        if len(term) < 3:
+            return {token for token in self.postings if term in token}
+        candidates: Optional[Set[str]] = None
+        for trigram in _trigrams(term):
+            tokens = self.vocab_trigrams.get(trigram)
+            if not tokens:
+                return set()
+            candidates = set(tokens) if candidates is None else candidates & tokens
+        return {token for token in candidates if term in token}
+
+    def search(self, query: str, category: Optional[str] = None) -> List[Tuple[str, float]]:
+        """
+        Returns (name, score) pairs for entities matching every query term (and the category,
+        when given), ranked by BM25 score with ties broken by name.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.docs:
+            return []
+
+        term_tfs: List[Dict[str, int]] = []
+        for term in terms:
+            tfs: Dict[str, int] = {}
+            for token in self._matching_tokens(term):
+                for name, count in self.postings[token].items():
+                    tfs[name] = tfs.get(name, 0) + count
+            if not tfs:
+                return []
+            term_tfs.append(tfs)
+
+        term_tfs.sort(key=len)
+        matched = set(term_tfs[0])
+        for tfs in term_tfs[1:]:
+            matched &= tfs.keys()
+        if category is not None:
+            category_lower = category.lower()
+            matched = {name for name in matched if self.docs[name]["category"] == category_lower}
+        if not matched:
+            return []
+
+        n_docs = len(self.docs)
+        avg_length = self.total_length / n_docs or 1.0
+        scores = dict.fromkeys(matched, 0.0)
+        for tfs in term_tfs:
+            idf = math.log(1 + (n_docs - len(tfs) + 0.5) / (len(tfs) + 0.5))
+            for name in matched:
+                tf = tfs[name]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.docs[name]["len"] / avg_length)
+                scores[name] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+class ExpiryIndex:
+    """
+    Min-heap of (expires_at, name) for unpinned entities with a TTL.
+
+    Entries are invalidated lazily: a popped entry only counts when it still matches the
+    entity's current expiry. Popped, still-valid entries are kept in `expired` until the entity
+    is pruned or updated, so checking expiry costs O(newly expired) instead of O(all entities).
+    """
+
+    def __init__(self):
+        self.heap: List[Tuple[str, str]] = []
+        self.expired: Set[str] = set()
+
+    @classmethod
+    def build(cls, entities: Dict[str, Dict[str, Any]]) -> "ExpiryIndex":
+        index = cls()
+        index.heap = [
+            (entity["expires_at"], name) for name, entity in entities.items()
+            if entity.get("expires_at") and not entity.get("pinned", False)
+        ]
+        heapq.heapify(index.heap)
+        return index
+
+    def update(self, name: str, entity: Optional[Dict[str, Any]]) -> None:
+        """Tracks an entity's current expiry; passing None forgets it."""
+        self.expired.discard(name)
+        if entity is not None and entity.get("expires_at") and not entity.get("pinned", False):
+            heapq.heappush(self.heap, (entity["expires_at"], name))
+
+    def next_expiry(self) -> Optional[str]:
+        return self.heap[0][0] if self.heap else None
+
+    def expired_now(self, entities: Dict[str, Dict[str, Any]], now_iso: str) -> Set[str]:
+        """Returns the names of entities expired at `now_iso`."""
+        while self.heap and self.heap[0][0] < now_iso:
+            expires_at, name = heapq.heappop(self.heap)
+            entity = entities.get(name)
+            if entity is not None and entity.get("expires_at") == expires_at and not entity.get("pinned", False):
+                self.expired.add(name)
+        if len(self.heap) > 2 * len(entities) + 64:
+            live = self.expired
+            self.heap = ExpiryIndex.build({n: e for n, e in entities.items() if n not in live}).heap
+        return self.expired
+
+
+class AdjacencyIndex:
+    """
+    Outgoing and incoming edges per entity over the graph's `relations` list, keyed by
+    (from, type, to) so storing a relation twice only refreshes it.
+    """
+
+    def __init__(self):
+        self.edges: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self.outgoing: Dict[str, Set[Tuple[str, str, str]]] = {}
+        self.incoming: Dict[str, Set[Tuple[str, str, str]]] = {}
+
+    @staticmethod
+    def key(relation: Dict[str, Any]) -> Tuple[str, str, str]:
+        return (relation["from"], relation["type"], relation["to"])
+
+    @classmethod
+    def build(cls, relations: List[Dict[str, Any]]) -> "AdjacencyIndex":
+        index = cls()
+        for relation in relations:
+            if isinstance(relation, dict) and {"from", "type", "to"} <= relation.keys():
+                index.add(relation)
+        return index
+
+    def add(self, relation: Dict[str, Any]) -> None:
+        key = self.key(relation)
+        self.edges[key] = relation
+        self.outgoing.setdefault(key[0], set()).add(key)
+        self.incoming.setdefault(key[2], set()).add(key)
+
+    def remove_node(self, name: str) -> List[Dict[str, Any]]:
+        """Forgets every edge touching `name`; returns the removed relation records."""
+        keys = self.outgoing.pop(name, set()) | self.incoming.pop(name, set())
+        for key in keys:
+            self.outgoing.get(key[0], set()).discard(key)
+            self.incoming.get(key[2], set()).discard(key)
+        return [self.edges.pop(key) for key in keys if key in self.edges]
+
+    def neighbors(self, name: str, direction: str = "both", relation_type: Optional[str] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """(neighbor, relation) pairs adjacent to `name`, sorted for deterministic traversal."""
+        keys: List[Tuple[str, str, str]] = []
+        if direction in ("out", "both"):
+            keys.extend(self.outgoing.get(name, ()))
+        if direction in ("in", "both"):
+            keys.extend(self.incoming.get(name, ()))
+        pairs = []
+        # Relations stored before their fields were validated may carry None parts
+        for key in sorted(set(keys), key=lambda k: tuple(part or "" for part in k)):
+            if relation_type is not None and (key[1] or "").lower() != relation_type.lower():
+                continue
+            pairs.append((key[2] if key[0] == name else key[0], self.edges[key]))
+        return pairs
+
+    def bfs(
+        self,
+        start: str,
+        hops: int,
+        max_nodes: int,
+        direction: str = "both",
+        relation_type: Optional[str] = None,
+        visible=None
+    ) -> Tuple[Dict[str, int], List[Dict[str, Any]], bool]:
+        """
+        Breadth-first traversal up to `hops` edges from `start`, discovering at most `max_nodes`
+        nodes besides it. `visible(name)` hides nodes (e.g. expired entities). Returns
+        ({name: depth}, traversed relations, whether the node budget cut the traversal short).
+        """
+        depths = {start: 0}
+        edges: List[Dict[str, Any]] = []
+        seen_edges: Set[Tuple[str, str, str]] = set()
+        frontier = [start]
+        truncated = False
+        for depth in range(1, hops + 1):
+            next_frontier = []
+            for node in frontier:
+                for neighbor, relation in self.neighbors(node, direction, relation_type):
+                    if visible is not None and not visible(neighbor):
+                        continue
+                    if neighbor not in depths:
+                        if len(depths) > max_nodes:
+                            truncated = True
+                            continue
+                        depths[neighbor] = depth
+                        next_frontier.append(neighbor)
+                    key = self.key(relation)
+                    if key not in seen_edges:
+                        seen_edges.add(key)
+                        edges.append(relation)
+            if not next_frontier or truncated:
+                break
+            frontier = next_frontier
+        return depths, edges, truncated
+
+
+class SizeIndex:
+    """Serialized size of every entity, kept current per write so budget checks are O(1)."""
+
+    def __init__(self):
+        self.sizes: Dict[str, int] = {}
+        self.total_bytes = 0
+
+    @classmethod
+    def build(cls, entities: Dict[str, Dict[str, Any]]) -> "SizeIndex":
+        index = cls()
+        for name, entity in entities.items():
+            index.update(name, entity)
+        return index
+
+    @staticmethod
+    def measure(entity: Dict[str, Any]) -> int:
+        return len(json.dumps(entity, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+
+    def update(self, name: str, entity: Optional[Dict[str, Any]]) -> None:
+        """Re-measures one entity; passing None forgets it."""
+        self.total_bytes -= self.sizes.pop(name, 0)
+        if entity is not None:
+            size = self.measure(entity)
+            self.sizes[name] = size
+            self.total_bytes += size
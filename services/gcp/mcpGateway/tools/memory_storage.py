@@ -0,0 +1,827 @@
+import os
+import json
+import time
+import uuid
+import zlib
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, NamedTuple, Tuple
+from google.cloud import storage
+from google.api_core.exceptions import NotFound, PreconditionFailed
+from tools.memory_codec import encode_graph, decode_graph, content_type
+
+GCS_BUCKET_NAME = os.getenv("MEMORY_GCS_BUCKET", "mcp-memory-precise-works-456015-h9")
+LOCAL_MEMORY_FILE = os.getenv("LOCAL_MEMORY_FILE", "/tmp/mcp_memory.json")
+MEMORY_BLOB_NAME = os.getenv("MEMORY_BLOB_NAME", "knowledge_graph.json")
+# Namespace whose graph lives at the original MEMORY_BLOB_NAME / LOCAL_MEMORY_FILE
+SHARED_NAMESPACE = "shared"
+GCS_RETRY_SECONDS = float(os.getenv("MEMORY_GCS_RETRY_SECONDS", "60"))
+# Reads repeated when an object is rewritten (or a folded journal segment deleted) mid-read
+GCS_READ_ATTEMPTS = int(os.getenv("MEMORY_GCS_READ_ATTEMPTS", "5"))
+
+# Journal compaction thresholds (whichever is crossed first triggers a new snapshot)
+JOURNAL_COMPACT_OPS = int(os.getenv("MEMORY_JOURNAL_COMPACT_OPS", "500"))
+JOURNAL_COMPACT_BYTES = int(os.getenv("MEMORY_JOURNAL_COMPACT_BYTES", str(1024 * 1024)))
+
+# Sharded layout: shard count for newly created layouts (existing ones keep their manifest's count)
+SHARD_COUNT = int(os.getenv("MEMORY_SHARD_COUNT", "16"))
+SHARD_FETCH_WORKERS = int(os.getenv("MEMORY_SHARD_FETCH_WORKERS", "8"))
+
+# Bounded thread pool for blocking storage calls (GCS client and file I/O)
+IO_WORKERS = int(os.getenv("MEMORY_IO_WORKERS", "4"))
+
+# Process-wide GCS handle
+_gcs_bucket = None
+_gcs_failed_at: Optional[float] = None
+_gcs_lock = threading.Lock()
+_io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="memory-io")
+# Separate pool for per-shard transfers, which are fanned out from calls already running on _io_executor
+_shard_executor = ThreadPoolExecutor(max_workers=SHARD_FETCH_WORKERS, thread_name_prefix="memory-shard")
+
+
+async def run_blocking(func, *args):
+    """Runs a blocking storage call on the memory I/O thread pool so the event loop keeps serving."""
+    return await asyncio.get_running_loop().run_in_executor(_io_executor, functools.partial(func, *args))
+
+
+def get_bucket():
+    """Returns the process-wide GCS bucket handle, or None when GCS is unavailable."""
+    global _gcs_bucket, _gcs_failed_at
+    if not GCS_BUCKET_NAME:
+        return None
+    if _gcs_bucket is not None and _gcs_bucket.name == GCS_BUCKET_NAME:
+        return _gcs_bucket
+    with _gcs_lock:
+        if _gcs_bucket is not None and _gcs_bucket.name == GCS_BUCKET_NAME:
+            return _gcs_bucket
+        if _gcs_failed_at is not None and time.monotonic() - _gcs_failed_at < GCS_RETRY_SECONDS:
+            return None
+        try:
+            _gcs_bucket = storage.Client().bucket(GCS_BUCKET_NAME)
+            _gcs_failed_at = None
+        except Exception as e:
+            print(f"Warning: Failed to create GCS client: {e}")
+            _gcs_bucket = None
+            _gcs_failed_at = time.monotonic()
+        return _gcs_bucket
+
+
+class WriteConflict(Exception):
+    """Raised when the stored graph changed since it was loaded, so the write must be re-applied."""
+
+
+class StorageReadError(Exception):
+    """
+    Raised when the configured GCS bucket could not be read. Callers must not fall back to the
+    local file or an empty graph, which would be served (and written back) as the real memory.
+    """
+
+
+def _read_consistent(read):
+    """Runs a GCS read, repeating it when a concurrent writer replaced an object it was reading."""
+    for attempt in range(1, GCS_READ_ATTEMPTS + 1):
+        try:
+            return read()
+        except (PreconditionFailed, NotFound):
+            if attempt == GCS_READ_ATTEMPTS:
+                raise
+
+
+def empty_graph() -> Dict[str, Any]:
+    return {"entities": {}, "relations": []}
+
+
+# Returned by persist() when the write succeeded but the new storage version is not known, so the
+# caller's cached graph must be re-read before it is trusted again (unlike None, which is a failure)
+STORED_UNVERSIONED = ("unversioned",)
+
+
+class Loaded(NamedTuple):
+    """Result of a storage read. `memory` is None when `ops` extend the caller's cached graph."""
+    memory: Optional[Dict[str, Any]]
+    ops: List[Dict[str, Any]]
+    version: Any
+
+
+def _local_stat(path: str) -> Optional[tuple]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _write_local(path: str, data) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb" if isinstance(data, bytes) else "w") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _read_local_graph(path: str) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        return decode_graph(f.read())
+
+
+def _decode_ops(data: str) -> List[Dict[str, Any]]:
+    return [json.loads(line) for line in data.splitlines() if line.strip()]
+
+
+def _encode_ops(ops: List[Dict[str, Any]]) -> str:
+    return "".join(json.dumps(op, separators=(",", ":")) + "\n" for op in ops)
+
+
+def namespace_paths(namespace: str) -> Tuple[str, str]:
+    """
+    (GCS object name, local file path) of a namespace's graph. The shared namespace keeps the
+    original MEMORY_BLOB_NAME / LOCAL_MEMORY_FILE so existing deployments read their data unchanged.
+    """
+    if namespace == SHARED_NAMESPACE:
+        return MEMORY_BLOB_NAME, LOCAL_MEMORY_FILE
+    root, ext = os.path.splitext(LOCAL_MEMORY_FILE)
+    return f"namespaces/{namespace}/{MEMORY_BLOB_NAME}", f"{root}.{namespace}{ext}"
+
+
+class _NamespacedStore:
+    """Base for storage backends; each instance serves one namespace's objects."""
+
+    def __init__(self, namespace: str = None):
+        self.namespace = namespace or SHARED_NAMESPACE
+
+    @property
+    def blob_name(self) -> str:
+        return namespace_paths(self.namespace)[0]
+
+    @property
+    def local_path(self) -> str:
+        return namespace_paths(self.namespace)[1]
+
+
+class SnapshotStore(_NamespacedStore):
+    """Stores the whole graph as a single `knowledge_graph.json` object, rewritten on every save."""
+
+    mode = "snapshot"
+
+    def load(self, cached_version: Any) -> Optional[Loaded]:
+        """Returns None when the stored graph still matches `cached_version`."""
+        bucket = get_bucket()
+        if bucket is not None:
+            try:
+                loaded = _read_consistent(lambda: self._load_gcs(bucket, cached_version))
+            except Exception as e:
+                raise StorageReadError(f"Failed to load memory from GCS: {e}") from e
+            if loaded is not False:
+                return loaded
+
+        stat = _local_stat(self.local_path)
+        if stat is not None:
+            version = ("local",) + stat
+            if version == cached_version:
+                return None
+            try:
+                memory = _read_local_graph(self.local_path)
+                memory.pop("journal_folded", None)
+                return Loaded(memory, [], version)
+            except Exception:
+                pass
+
+        if cached_version == ("empty",):
+            return None
+        return Loaded(empty_graph(), [], ("empty",))
+
+    def _load_gcs(self, bucket, cached_version: Any):
+        """Loaded, None when unchanged, or False when the bucket holds no graph yet."""
+        blob = bucket.get_blob(self.blob_name)
+        if blob is None:
+            return False
+        version = ("gcs", blob.generation, blob.metageneration)
+        if version == cached_version:
+            return None
+        memory = decode_graph(blob.download_as_bytes(if_generation_match=blob.generation))
+        memory.pop("journal_folded", None)
+        return Loaded(memory, [], version)
+
+    def persist(self, memory: Dict[str, Any], ops: List[Dict[str, Any]], cached_version: Any) -> Optional[Any]:
+        """
+        Writes the full graph only if the stored copy is still the one `memory` was loaded from
+        (GCS `if_generation_match`, or a best-effort stat check locally). Returns the new storage
+        version, None on failure, and raises WriteConflict when another writer got there first.
+        """
+        data = encode_graph(memory)
+
+        bucket = get_bucket()
+        if bucket is not None:
+            expected_generation = cached_version[1] if cached_version and cached_version[0] == "gcs" else 0
+            try:
+                blob = bucket.blob(self.blob_name)
+                blob.upload_from_string(data, content_type=content_type(), if_generation_match=expected_generation)
+                return ("gcs", blob.generation, blob.metageneration)
+            except PreconditionFailed as e:
+                raise WriteConflict(str(e))
+            except Exception as e:
+                print(f"Warning: Failed to save memory to GCS: {e}")
+
+        if cached_version and cached_version[0] in ("local", "empty"):
+            current = _local_stat(self.local_path)
+            if cached_version != (("local",) + current if current else ("empty",)):
+                raise WriteConflict(f"{self.local_path} changed since it was loaded")
+        try:
+            _write_local(self.local_path, data)
+            return ("local",) + _local_stat(self.local_path)
+        except Exception as e:
+            print(f"Error saving local memory: {e}")
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"storage_mode": self.mode}
+
+
+class JournalStore(_NamespacedStore):
+    """
+    Stores the graph as a snapshot plus an append-only journal of mutation records.
+
+    Locally the journal is a JSONL file next to the snapshot; on GCS every save creates a
+    small create-only segment object under `<blob>.journal/`. Reads replay the snapshot plus
+    the journal (only the unseen tail when the snapshot is unchanged), and once the journal
+    crosses JOURNAL_COMPACT_OPS or JOURNAL_COMPACT_BYTES the graph is folded into a new
+    snapshot. Replaying a record twice is harmless, so a crash mid-compaction loses nothing.
+    Existing single-blob snapshots are read as-is, which makes migration automatic.
+    """
+
+    mode = "journal"
+
+    def __init__(self, namespace: str = None):
+        super().__init__(namespace)
+        self.journal_ops = 0
+        self.journal_bytes = 0
+        self.compactions = 0
+
+    @property
+    def journal_path(self) -> str:
+        return f"{self.local_path}.journal"
+
+    @property
+    def segment_prefix(self) -> str:
+        return f"{self.blob_name}.journal/"
+
+    def load(self, cached_version: Any) -> Optional[Loaded]:
+        """Returns None when neither the snapshot nor the journal changed since `cached_version`."""
+        bucket = get_bucket()
+        if bucket is not None:
+            try:
+                loaded = _read_consistent(lambda: self._load_gcs(bucket, cached_version))
+            except Exception as e:
+                raise StorageReadError(f"Failed to load memory journal from GCS: {e}") from e
+            if loaded is not False:
+                return loaded
+        return self._load_local(cached_version)
+
+    def _load_gcs(self, bucket, cached_version: Any):
+        snapshot = bucket.get_blob(self.blob_name)
+        segments = {b.name: b for b in bucket.list_blobs(prefix=self.segment_prefix)}
+        if snapshot is None and not segments:
+            return False
+        snapshot_gen = snapshot.generation if snapshot is not None else 0
+        names = tuple(sorted(segments))
+        version = ("gcs-journal", snapshot_gen, names)
+        if version == cached_version:
+            return None
+
+        if cached_version and cached_version[0] == "gcs-journal" and cached_version[1] == snapshot_gen:
+            seen = set(cached_version[2])
+            new_names = [n for n in names if n not in seen]
+            if seen.issubset(names) and (not seen or new_names[0] > max(seen)):
+                ops = self._download_segments(segments, new_names)
+                return Loaded(None, ops, version)
+
+        memory = empty_graph()
+        if snapshot is not None:
+            memory = decode_graph(snapshot.download_as_bytes(if_generation_match=snapshot_gen))
+        folded = set(memory.pop("journal_folded", []))
+        self.journal_ops = self.journal_bytes = 0
+        ops = self._download_segments(segments, [n for n in names if n not in folded])
+        return Loaded(memory, ops, version)
+
+    def _download_segments(self, segments: Dict[str, Any], names: List[str]) -> List[Dict[str, Any]]:
+        ops = []
+        for name in names:
+            data = segments[name].download_as_text()
+            self.journal_bytes += len(data)
+            ops.extend(_decode_ops(data))
+        self.journal_ops += len(ops)
+        return ops
+
+    def _load_local(self, cached_version: Any) -> Optional[Loaded]:
+        snapshot_stat = _local_stat(self.local_path)
+        journal_stat = _local_stat(self.journal_path)
+        if snapshot_stat is None and journal_stat is None:
+            if cached_version == ("empty",):
+                return None
+            self.journal_ops = self.journal_bytes = 0
+            return Loaded(empty_graph(), [], ("empty",))
+
+        journal_ino = journal_stat[0] if journal_stat else None
+        journal_size = journal_stat[2] if journal_stat else 0
+        if (
+            cached_version
+            and cached_version[0] == "local-journal"
+            and cached_version[1] == snapshot_stat
+            and cached_version[2] == journal_ino
+            and cached_version[3] <= journal_size
+        ):
+            if cached_version[3] == journal_size:
+                return None
+            ops, offset = self._read_journal(cached_version[3])
+            return Loaded(None, ops, ("local-journal", snapshot_stat, journal_ino, offset))
+
+        memory = empty_graph()
+        if snapshot_stat is not None:
+            try:
+                memory = _read_local_graph(self.local_path)
+                memory.pop("journal_folded", None)
+            except Exception as e:
+                print(f"Warning: Failed to read memory snapshot: {e}")
+        self.journal_ops = self.journal_bytes = 0
+        ops, offset = self._read_journal(0) if journal_stat else ([], 0)
+        return Loaded(memory, ops, ("local-journal", snapshot_stat, journal_ino, offset))
+
+    def _read_journal(self, offset: int):
+        """Reads complete journal lines from `offset`; a partially written last line is left for later."""
+        with open(self.journal_path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        ops = _decode_ops(data[:end].decode("utf-8"))
+        self.journal_ops += len(ops)
+        self.journal_bytes += end
+        return ops, offset + end
+
+    def persist(self, memory: Dict[str, Any], ops: List[Dict[str, Any]], cached_version: Any) -> Optional[Any]:
+        """
+        Appends `ops` to the journal (compacting when due). Returns the new version, STORED_UNVERSIONED
+        when the ops were stored but the resulting version is unknown (the next load re-reads), or
+        None on failure.
+        """
+        if not ops:
+            return cached_version
+        data = _encode_ops(ops)
+
+        bucket = get_bucket()
+        if bucket is not None:
+            try:
+                return self._persist_gcs(bucket, memory, ops, data, cached_version)
+            except Exception as e:
+                print(f"Warning: Failed to append memory journal to GCS: {e}")
+
+        try:
+            return self._persist_local(memory, ops, data, cached_version)
+        except Exception as e:
+            print(f"Error appending local memory journal: {e}")
+            return None
+
+    def _persist_gcs(self, bucket, memory, ops, data, cached_version):
+        name = f"{self.segment_prefix}{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.jsonl"
+        bucket.blob(name).upload_from_string(data, content_type="application/x-ndjson", if_generation_match=0)
+        self.journal_ops += len(ops)
+        self.journal_bytes += len(data)
+
+        if not cached_version or cached_version[0] != "gcs-journal":
+            return STORED_UNVERSIONED
+        names = cached_version[2] + (name,)
+        if not self._compaction_due():
+            return (cached_version[0], cached_version[1], names)
+
+        snapshot = encode_graph({**memory, "journal_folded": list(names)})
+        blob = bucket.blob(self.blob_name)
+        try:
+            blob.upload_from_string(snapshot, content_type=content_type(), if_generation_match=cached_version[1])
+        except Exception as e:
+            print(f"Warning: Skipped memory journal compaction: {e}")
+            return (cached_version[0], cached_version[1], names)
+        for folded in names:
+            try:
+                bucket.blob(folded).delete()
+            except Exception:
+                pass
+        self._compacted()
+        return STORED_UNVERSIONED
+
+    def _persist_local(self, memory, ops, data, cached_version):
+        snapshot_stat = _local_stat(self.local_path)
+        journal_stat = _local_stat(self.journal_path)
+        prior = ("local-journal", snapshot_stat, journal_stat[0] if journal_stat else None, journal_stat[2] if journal_stat else 0)
+        os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+        with open(self.journal_path, "a") as f:
+            f.write(data)
+        self.journal_ops += len(ops)
+        self.journal_bytes += len(data)
+
+        if self._compaction_due():
+            _write_local(self.local_path, encode_graph(memory))
+            os.remove(self.journal_path)
+            self._compacted()
+            return ("local-journal", _local_stat(self.local_path), None, 0)
+
+        if cached_version == prior or (cached_version == ("empty",) and prior[1:] == (None, None, 0)):
+            journal_stat = _local_stat(self.journal_path)
+            return ("local-journal", snapshot_stat, journal_stat[0], journal_stat[2])
+        # Another process appended first: our ops are in the journal, after theirs
+        return STORED_UNVERSIONED
+
+    def _compaction_due(self) -> bool:
+        return self.journal_ops >= JOURNAL_COMPACT_OPS or self.journal_bytes >= JOURNAL_COMPACT_BYTES
+
+    def _compacted(self) -> None:
+        self.journal_ops = self.journal_bytes = 0
+        self.compactions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "storage_mode": self.mode,
+            "journal_ops": self.journal_ops,
+            "journal_bytes": self.journal_bytes,
+            "compactions": self.compactions,
+        }
+
+
+def shard_of(name: str, shard_count: int) -> int:
+    """Stable shard number for an entity name (the same in every process, unlike hash())."""
+    return zlib.crc32(name.encode("utf-8")) % shard_count
+
+
+class _GcsShardArea:
+    """Shard and manifest objects under `<blob>.shards/` in the GCS bucket; tokens are generations."""
+
+    kind = "gcs"
+
+    def __init__(self, bucket, blob_name: str):
+        self.bucket = bucket
+        self.prefix = f"{blob_name}.shards/"
+
+    def read_manifest(self, known_token: Any = None):
+        """Returns (manifest or None when still `known_token`, token), or None when there is no manifest."""
+        blob = self.bucket.get_blob(f"{self.prefix}manifest.json")
+        if blob is None:
+            return None
+        if blob.generation == known_token:
+            return None, known_token
+        return json.loads(blob.download_as_text()), blob.generation
+
+    def list_shards(self) -> Dict[str, Any]:
+        return {
+            b.name[len(self.prefix):]: b.generation
+            for b in self.bucket.list_blobs(prefix=f"{self.prefix}shard-")
+        }
+
+    def read(self, name: str) -> bytes:
+        # A shard rewritten after the listing is simply newer than its token; the next load refetches it
+        return self.bucket.blob(f"{self.prefix}{name}").download_as_bytes()
+
+    def write(self, name: str, data, expected: Any, check: bool = True) -> Any:
+        """Writes an object if its token is still `expected` (None: must not exist); returns the new token."""
+        blob = self.bucket.blob(f"{self.prefix}{name}")
+        try:
+            blob.upload_from_string(
+                data, content_type="application/json" if isinstance(data, str) else content_type(),
+                if_generation_match=(expected or 0) if check else None
+            )
+        except PreconditionFailed as e:
+            raise WriteConflict(str(e))
+        return blob.generation
+
+
+class _LocalShardArea:
+    """Shard and manifest files in `<local graph file>.shards/`; tokens are stat tuples (best-effort checks)."""
+
+    kind = "local"
+
+    def __init__(self, local_path: str):
+        self.prefix = f"{local_path}.shards/"
+
+    def read_manifest(self, known_token: Any = None):
+        path = f"{self.prefix}manifest.json"
+        stat = _local_stat(path)
+        if stat is None:
+            return None
+        if stat == known_token:
+            return None, known_token
+        with open(path, "r") as f:
+            return json.load(f), stat
+
+    def list_shards(self) -> Dict[str, Any]:
+        try:
+            names = [n for n in os.listdir(self.prefix) if n.startswith("shard-") and n.endswith(".json")]
+        except OSError:
+            return {}
+        tokens = {n: _local_stat(f"{self.prefix}{n}") for n in names}
+        return {n: token for n, token in tokens.items() if token is not None}
+
+    def read(self, name: str) -> bytes:
+        with open(f"{self.prefix}{name}", "rb") as f:
+            return f.read()
+
+    def write(self, name: str, data, expected: Any, check: bool = True) -> Any:
+        path = f"{self.prefix}{name}"
+        if check and _local_stat(path) != expected:
+            raise WriteConflict(f"{path} changed since it was loaded")
+        _write_local(path, data)
+        return _local_stat(path)
+
+
+class ShardedStore(_NamespacedStore):
+    """
+    Partitions entities into shard objects by a stable hash of their (sanitized) name.
+
+    A small manifest records the shard count; shard generations come from one object listing,
+    so a read only downloads the shards that changed (in parallel) and a write only rewrites
+    the shards its records touch, each guarded by its own generation precondition. A write that
+    spans shards is not atomic across them, but records are idempotent and a conflicting write
+    is re-applied in full. When no manifest exists yet, the monolithic `knowledge_graph.json`
+    (or the local snapshot file) is partitioned into shards once; the old blob is left in place.
+    """
+
+    mode = "sharded"
+
+    def __init__(self, namespace: str = None):
+        super().__init__(namespace)
+        self._reset(None, None, SHARD_COUNT)
+        self.shards_fetched = 0
+        self.shards_written = 0
+        self.migrations = 0
+
+    def _reset(self, area_kind: Optional[str], manifest_token: Any, shard_count: int) -> None:
+        self.area_kind = area_kind
+        self.manifest_token = manifest_token
+        self.shard_count = shard_count
+        self.tokens: Dict[int, Any] = {}
+        self.members: Dict[int, set] = {}
+        self.relation_shards: set = set()
+
+    def _version(self) -> Any:
+        if self.manifest_token is None:
+            return ("empty",)
+        return ("sharded", self.area_kind, self.manifest_token, tuple(sorted(self.tokens.items())))
+
+    def _shard_name(self, i: int) -> str:
+        return f"shard-{i:04d}-of-{self.shard_count:04d}.json"
+
+    def _relation_shard(self, relation: Dict[str, Any]) -> int:
+        source = relation.get("from")
+        return shard_of(source, self.shard_count) if isinstance(source, str) else 0
+
+    def _area(self):
+        bucket = get_bucket()
+        return _GcsShardArea(bucket, self.blob_name) if bucket is not None else _LocalShardArea(self.local_path)
+
+    def load(self, cached_version: Any) -> Optional[Loaded]:
+        """Returns None when no shard changed since `cached_version`."""
+        area = self._area()
+        if area.kind != "gcs":
+            return self._load(area, cached_version)
+        try:
+            return _read_consistent(lambda: self._load(area, cached_version))
+        except Exception as e:
+            raise StorageReadError(f"Failed to load memory shards from GCS: {e}") from e
+
+    def _load(self, area, cached_version: Any) -> Optional[Loaded]:
+        manifest = area.read_manifest(self.manifest_token if self.area_kind == area.kind else None)
+        if manifest is None:
+            return self._migrate(area, cached_version)
+        data, manifest_token = manifest
+
+        previous_version = self._version()
+        incremental = (
+            cached_version is not None
+            and cached_version == previous_version
+            and self.area_kind == area.kind
+            and self.manifest_token == manifest_token
+        )
+        if not incremental:
+            if data is None:
+                data = area.read_manifest()[0]
+            self._reset(area.kind, manifest_token, int(data["shard_count"]))
+        listed = area.list_shards()
+        tokens = {
+            i: listed[self._shard_name(i)] for i in range(self.shard_count)
+            if self._shard_name(i) in listed
+        }
+        changed = [i for i in range(self.shard_count) if tokens.get(i) != self.tokens.get(i)]
+        self.tokens = tokens
+        version = self._version()
+        if incremental and not changed:
+            return None
+
+        shards = self._fetch(area, changed)
+        if incremental and not (self.relation_shards & set(changed)) and not any(s["relations"] for s in shards.values()):
+            ops = []
+            for i in changed:
+                entities = shards[i]["entities"]
+                ops.extend({"op": "put", "name": name, "entity": entity} for name, entity in entities.items())
+                gone = self.members.get(i, set()) - entities.keys()
+                if gone:
+                    ops.append({"op": "drop", "names": sorted(gone)})
+                self.members[i] = set(entities)
+            return Loaded(None, ops, version)
+
+        if incremental:
+            shards.update(self._fetch(area, [i for i in tokens if i not in shards]))
+        memory = empty_graph()
+        self.members, self.relation_shards = {}, set()
+        for i in sorted(shards):
+            memory["entities"].update(shards[i]["entities"])
+            memory["relations"].extend(shards[i]["relations"])
+            self.members[i] = set(shards[i]["entities"])
+            if shards[i]["relations"]:
+                self.relation_shards.add(i)
+        return Loaded(memory, [], version)
+
+    def _fetch(self, area, indexes: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Downloads the given shards in parallel; shards without an object are empty."""
+        present = [i for i in indexes if i in self.tokens]
+
+        def fetch(i):
+            shard = decode_graph(area.read(self._shard_name(i)))
+            return {"entities": shard.get("entities", {}), "relations": shard.get("relations", [])}
+
+        shards = {i: empty_graph() for i in indexes}
+        shards.update(zip(present, _shard_executor.map(fetch, present)))
+        self.shards_fetched += len(present)
+        return shards
+
+    def _migrate(self, area, cached_version: Any) -> Optional[Loaded]:
+        """Partitions the monolithic graph into a new sharded layout (or starts an empty one)."""
+        legacy = get_store("snapshot", self.namespace).load(None)
+        self._reset(area.kind, None, SHARD_COUNT)
+        if legacy.version == ("empty",):
+            if cached_version == ("empty",):
+                return None
+            return Loaded(empty_graph(), [], ("empty",))
+
+        memory = legacy.memory
+        memory.setdefault("entities", {})
+        memory.setdefault("relations", [])
+        for name in memory["entities"]:
+            self.members.setdefault(shard_of(name, self.shard_count), set()).add(name)
+        for relation in memory["relations"]:
+            self.relation_shards.add(self._relation_shard(relation))
+        # Shards first, manifest last: until the manifest exists readers keep using the old blob
+        self._write_shards(area, memory, set(self.members) | self.relation_shards, check=False)
+        try:
+            self.manifest_token = area.write("manifest.json", json.dumps({"shard_count": self.shard_count}), None)
+        except WriteConflict:
+            # Another instance finished the migration first; read its layout instead
+            self._reset(None, None, SHARD_COUNT)
+            return self._load(area, None)
+        self.migrations += 1
+        print(f"Migrated memory graph into {self.shard_count} shards ({len(memory['entities'])} entities).")
+        return Loaded(memory, [], self._version())
+
+    def _write_shards(self, area, memory: Dict[str, Any], indexes: set, check: bool = True) -> None:
+        """Rewrites the given shards from `memory` in parallel, updating tokens for those that succeed."""
+        entities = memory.get("entities", {})
+        relations = memory.get("relations", [])
+
+        def write(i):
+            shard = {
+                "entities": {name: entities[name] for name in sorted(self.members.get(i, ()))},
+                "relations": [r for r in relations if self._relation_shard(r) == i],
+            }
+            try:
+                return i, area.write(self._shard_name(i), encode_graph(shard), self.tokens.get(i), check), None
+            except Exception as e:
+                return i, None, e
+
+        errors = []
+        for i, token, error in _shard_executor.map(write, sorted(indexes)):
+            if error is not None:
+                errors.append(error)
+                continue
+            self.tokens[i] = token
+            self.shards_written += 1
+        for error in errors:
+            if isinstance(error, WriteConflict):
+                raise error
+        if errors:
+            raise errors[0]
+
+    def persist(self, memory: Dict[str, Any], ops: List[Dict[str, Any]], cached_version: Any) -> Optional[Any]:
+        """
+        Rewrites only the shards touched by `ops`. Returns the new version, None on failure, and
+        raises WriteConflict when the layout or one of those shards changed since it was loaded.
+        """
+        if cached_version != self._version():
+            raise WriteConflict("memory shards changed since they were loaded")
+        area = self._area()
+        if self.manifest_token is not None and area.kind != self.area_kind:
+            print(f"Warning: Memory shards were loaded from {self.area_kind} storage but only {area.kind} is available")
+            return None
+        entities = memory.get("entities", {})
+
+        touched = set()
+        for op in ops:
+            names = [op["name"]] if "name" in op else op.get("names")
+            if names is None and op["op"] == "prune":
+                # Unscoped prune: any shard that lost a member
+                names = [n for members in self.members.values() for n in members if n not in entities]
+            removed = False
+            for name in names or []:
+                i = shard_of(name, self.shard_count)
+                touched.add(i)
+                if name in entities:
+                    self.members.setdefault(i, set()).add(name)
+                else:
+                    self.members.get(i, set()).discard(name)
+                    removed = True
+            if isinstance(op.get("from"), str):
+                i = self._relation_shard(op)
+                touched.add(i)
+                self.relation_shards.add(i)
+            elif removed:
+                # Removed entities take their relations along, which may live in any shard
+                touched.update(self.relation_shards)
+        if not touched:
+            return cached_version
+
+        try:
+            self._write_shards(area, memory, touched)
+            if self.manifest_token is None:
+                self.area_kind = area.kind
+                self.manifest_token = area.write("manifest.json", json.dumps({"shard_count": self.shard_count}), None)
+        except WriteConflict:
+            self._reset(None, None, SHARD_COUNT)
+            raise
+        except Exception as e:
+            print(f"Warning: Failed to save memory shards to {area.kind} storage: {e}")
+            self._reset(None, None, SHARD_COUNT)
+            return None
+        return self._version()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "storage_mode": self.mode,
+            "shard_count": self.shard_count,
+            "shards_fetched": self.shards_fetched,
+            "shards_written": self.shards_written,
+            "migrations": self.migrations,
+        }
+
+
+STORE_TYPES = {"snapshot": SnapshotStore, "journal": JournalStore, "sharded": ShardedStore}
+_STORES: Dict[Tuple[str, str], Any] = {}
+
+
+def get_store(mode: str, namespace: str = SHARED_NAMESPACE):
+    """Returns the storage backend for MEMORY_STORAGE_MODE ('snapshot', 'journal' or 'sharded') and a namespace."""
+    store = _STORES.get((mode, namespace))
+    if store is None:
+        try:
+            store_type = STORE_TYPES[mode]
+        except KeyError:
+            raise ValueError(f"Unknown memory storage mode: '{mode}'")
+        store = _STORES.setdefault((mode, namespace), store_type(namespace))
+    return store
+
+
+def drop_stores(namespace: str) -> None:
+    """Forgets the storage backends of a namespace (they are recreated, and re-read, on next use)."""
+    for key in [key for key in _STORES if key[1] == namespace]:
+        del _STORES[key]
+
+
+def read_sidecar(suffix: str, namespace: str = SHARED_NAMESPACE) -> Optional[str]:
+    """Reads a derived artifact stored next to a namespace's graph (e.g. its search index), if present."""
+    blob_name, local_path = namespace_paths(namespace)
+    bucket = get_bucket()
+    if bucket is not None:
+        try:
+            blob = bucket.get_blob(f"{blob_name}{suffix}")
+            if blob is not None:
+                return blob.download_as_text()
+        except Exception as e:
+            print(f"Warning: Failed to read memory sidecar '{suffix}' from GCS: {e}")
+    try:
+        with open(f"{local_path}{suffix}", "r") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def write_sidecar(suffix: str, data: str, namespace: str = SHARED_NAMESPACE) -> bool:
+    """Writes a derived artifact next to a namespace's graph."""
+    blob_name, local_path = namespace_paths(namespace)
+    bucket = get_bucket()
+    if bucket is not None:
+        try:
+            bucket.blob(f"{blob_name}{suffix}").upload_from_string(data, content_type="application/json")
+            return True
+        except Exception as e:
+            print(f"Warning: Failed to write memory sidecar '{suffix}' to GCS: {e}")
+    try:
+        _write_local(f"{local_path}{suffix}", data)
+        return True
+    except Exception as e:
+        print(f"Error writing local memory sidecar '{suffix}': {e}")
+        return False
@@ -0,0 +1,182 @@
+import os
+import json
+import math
+import uuid
+import zlib
+import hashlib
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from tools.memory_index import tokenize
+
+# Hashed feature space (columns of the matrix) and the weakest cosine similarity counted as a match
+VECTOR_DIM = int(os.getenv("MEMORY_VECTOR_DIM", "1024"))
+VECTOR_MIN_SCORE = float(os.getenv("MEMORY_VECTOR_MIN_SCORE", "0.15"))
+NGRAM_SIZES = (3, 4)
+
+
+def _text_key(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def vectorize(text: str, dim: int = VECTOR_DIM) -> np.ndarray:
+    """
+    L2-normalized hashed vector of a text's words and character n-grams.
+
+    Each word is padded with spaces and cut into 3- and 4-grams, so different forms of a word
+    ('autoscaler' / 'autoscaling') share most features. Features are hashed into `dim` signed
+    buckets and weighted by sublinear term frequency; no vocabulary or model is needed.
+    """
+    counts: Counter = Counter()
+    for token in tokenize(text):
+        counts[token] += 1
+        padded = f" {token} "
+        for n in NGRAM_SIZES:
+            for i in range(len(padded) - n + 1):
+                counts[padded[i:i + n]] += 1
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature, count in counts.items():
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % dim] += (1.0 if h & 0x80000000 else -1.0) * (1.0 + math.log(count))
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+class VectorIndex:
+    """
+    Matrix of hashed n-gram vectors, one row per observation plus one for each entity's name
+    and category. Rows are added and released per entity as its observations change, and a
+    query is scored against every row with a single matrix-vector product; an entity's score
+    is the best score among its rows.
+    """
+
+    def __init__(self, dim: int = VECTOR_DIM):
+        self.dim = dim
+        self.matrix = np.zeros((0, dim), dtype=np.float32)
+        self.row_entities = np.zeros(0, dtype=np.int32)
+        self.size = 0
+        self.free: List[int] = []
+        self.rows: Dict[str, Dict[str, int]] = {}
+        self.entity_ids: Dict[str, int] = {}
+        self.entity_names: List[Optional[str]] = []
+
+    @classmethod
+    def build(cls, entities: Dict[str, Dict[str, Any]]) -> "VectorIndex":
+        index = cls()
+        for name, entity in entities.items():
+            index.update(name, entity)
+        return index
+
+    @staticmethod
+    def _texts(name: str, entity: Dict[str, Any]) -> List[str]:
+        return [f"{name} {entity.get('category') or ''}"] + [
+            obs for obs in entity.get("observations", []) if isinstance(obs, str)
+        ]
+
+    def update(self, name: str, entity: Optional[Dict[str, Any]]) -> None:
+        """Re-vectorizes only the texts of one entity that changed; passing None removes it."""
+        current = self.rows.get(name, {})
+        wanted = {}
+        if entity is not None:
+            for text in self._texts(name, entity):
+                wanted.setdefault(_text_key(text), text)
+        for key in [k for k in current if k not in wanted]:
+            row = current.pop(key)
+            self.matrix[row] = 0.0
+            self.row_entities[row] = -1
+            self.free.append(row)
+        if not wanted:
+            self.rows.pop(name, None)
+            entity_id = self.entity_ids.pop(name, None)
+            if entity_id is not None:
+                self.entity_names[entity_id] = None
+            return
+
+        entity_id = self.entity_ids.get(name)
+        if entity_id is None:
+            entity_id = self.entity_ids[name] = len(self.entity_names)
+            self.entity_names.append(name)
+        for key, text in wanted.items():
+            if key not in current:
+                row = self._allocate_row()
+                self.matrix[row] = vectorize(text, self.dim)
+                self.row_entities[row] = entity_id
+                current[key] = row
+        self.rows[name] = current
+
+    def remove(self, name: str) -> None:
+        self.update(name, None)
+
+    def _allocate_row(self) -> int:
+        if self.free:
+            return self.free.pop()
+        if self.size == self.matrix.shape[0]:
+            capacity = max(64, self.matrix.shape[0] * 2)
+            matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+            matrix[:self.size] = self.matrix[:self.size]
+            row_entities = np.full(capacity, -1, dtype=np.int32)
+            row_entities[:self.size] = self.row_entities[:self.size]
+            self.matrix, self.row_entities = matrix, row_entities
+        self.size += 1
+        return self.size - 1
+
+    def search(self, query: str, min_score: float = VECTOR_MIN_SCORE) -> List[Tuple[str, float]]:
+        """Returns (name, cosine score) for entities scoring at least `min_score`, best first, ties by name."""
+        if self.size == 0:
+            return []
+        q = vectorize(query, self.dim)
+        if not q.any():
+            return []
+        scores = self.matrix[:self.size] @ q
+        row_entities = self.row_entities[:self.size]
+        hits = (scores >= min_score) & (row_entities >= 0)
+        best = np.full(len(self.entity_names), -1.0, dtype=np.float32)
+        np.maximum.at(best, row_entities[hits], scores[hits])
+        matched = np.nonzero(best >= min_score)[0]
+        ranked = [(self.entity_names[i], round(float(best[i]), 4)) for i in matched]
+        return sorted(ranked, key=lambda item: (-item[1], item[0]))
+
+    def save(self, path: str, stamp: Any) -> None:
+        """Writes the matrix to `<path>.npy` and its row bookkeeping (with `stamp`) to `<path>.json`."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, self.matrix[:self.size])
+        os.replace(tmp, f"{path}.npy")
+        meta = {
+            "version": stamp,
+            "dim": self.dim,
+            "size": self.size,
+            "rows": self.rows,
+            "row_entities": self.row_entities[:self.size].tolist(),
+            "entity_names": self.entity_names,
+        }
+        with open(tmp, "w") as f:
+            json.dump(meta, f, separators=(",", ":"))
+        os.replace(tmp, f"{path}.json")
+
+    @classmethod
+    def load(cls, path: str, stamp: Any) -> Optional["VectorIndex"]:
+        """
+        Memory-maps a saved matrix (copy-on-write, so updates never touch the file) when it was
+        saved for `stamp`; returns None when it is missing, stale or unreadable.
+        """
+        try:
+            with open(f"{path}.json", "r") as f:
+                meta = json.load(f)
+            if meta.get("version") != stamp or meta.get("dim") != VECTOR_DIM:
+                return None
+            matrix = np.load(f"{path}.npy", mmap_mode="c")
+        except (OSError, ValueError):
+            return None
+        if matrix.shape != (meta["size"], meta["dim"]):
+            return None
+        index = cls(meta["dim"])
+        index.matrix = matrix
+        index.size = meta["size"]
+        index.row_entities = np.asarray(meta["row_entities"], dtype=np.int32)
+        index.rows = meta["rows"]
+        index.entity_names = meta["entity_names"]
+        index.entity_ids = {name: i for i, name in enumerate(index.entity_names) if name is not None}
+        index.free = [row for row in range(index.size) if index.row_entities[row] < 0]
+        return index
@@ -1,8 +1,49 @@
+import re
 import asyncio
 from typing import Dict, Any, List, Optional
 from tools.web_fetch import fetch_web_markdown
 from tools.memory import remember_entity, sanitize_text
 
+_LINK_RE = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+_LIST_MARKER_RE = re.compile(r"^\s*(?:[-*]|\d+\.)\s+")
+_FENCE_RE = re.compile(r"^(`{3,}|~{3,})")
+# Marker web_fetch appends to a cut-off page
+_TRUNCATION_PREFIX = "...[Truncated"
+
+
+def _observations(markdown: str, limit: int = 5) -> List[str]:
+    """
+    Picks the first `limit` prose lines (paragraphs and list items) of a converted page, prefixed
+    with the heading they appear under; code blocks, tables and rules are skipped and links are
+    reduced to their text.
+    """
+    observations = []
+    heading = None
+    fence = None  # opening fence of the code block being skipped
+    for line in markdown.splitlines():
+        stripped = line.strip()
+        match = _FENCE_RE.match(stripped)
+        if fence is not None:
+            # Only a bare fence of the same character, at least as long, closes the block
+            if len(stripped) >= len(fence) and stripped == fence[0] * len(stripped):
+                fence = None
+            continue
+        if match:
+            fence = match.group(1)
+            continue
+        if not stripped or stripped.startswith(("|", _TRUNCATION_PREFIX)) or stripped == "---":
+            continue
+        if stripped.startswith("#"):
+            heading = stripped.lstrip("#").strip()
+            continue
+        text = _LIST_MARKER_RE.sub("", _LINK_RE.sub(r"\1", stripped).lstrip("> ")).strip()
+        if text:
+            observations.append(f"{heading}: {text}" if heading else text)
+            if len(observations) >= limit:
+                break
+    return observations
+
+
 async def run_tech_radar(
     urls: List[str],
     category: str = "Tech Intelligence",
@@ -33,9 +74,8 @@ async def run_tech_radar(
         title = fetch_res.get("title", url)
         markdown = fetch_res.get("markdown", "")
         
-        # Extract first 5 meaningful non-header lines as key observations
-        lines = [l.strip() for l in markdown.splitlines() if l.strip() and not l.startswith("#")]
-        observations = lines[:5] if lines else ["Page content ingested and analyzed."]
+        # Extract the first 5 prose lines, with their section heading, as key observations
+        observations = _observations(markdown) or ["Page content ingested and analyzed."]
         
         # Add source attribution
         observations.append(f"Source URL: {url}")
@@ -1,12 +1,393 @@
+import os
 import re
-import httpx
-from bs4 import BeautifulSoup
-from typing import Dict, Any
+import json
+import time
+import uuid
+import random
+import asyncio
+import weakref
+import codecs
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional, Tuple
+from tools.http_client import get_http_client
+from tools.html_convert import new_converter
+from tools.convert_pool import convert_html
+
+# Hard cap on response bytes read per fetch, and the media types converted (others are refused
+# from their headers, before any of the body is downloaded)
+WEB_FETCH_MAX_BYTES = int(os.getenv("WEB_FETCH_MAX_BYTES", str(2 * 1024 * 1024)))
+WEB_FETCH_CONTENT_TYPES = frozenset(
+    t.strip() for t in os.getenv(
+        "WEB_FETCH_CONTENT_TYPES", "text/html,application/xhtml+xml,text/plain,text/xml,application/xml"
+    ).split(",") if t.strip()
+)
+
+# On-loop conversion budget: pages that have not produced max_chars after this many bytes are
+# buffered to the end and converted in the worker process pool instead of on the event loop
+WEB_FETCH_OFFLOAD_BYTES = int(os.getenv("WEB_FETCH_OFFLOAD_BYTES", str(256 * 1024)))
+
+# Politeness scheduling of outbound fetches: requests in flight overall and per host, and the
+# minimum time between two requests to the same host
+WEB_FETCH_MAX_CONCURRENCY = int(os.getenv("WEB_FETCH_MAX_CONCURRENCY", "16"))
+WEB_FETCH_HOST_CONCURRENCY = int(os.getenv("WEB_FETCH_HOST_CONCURRENCY", "2"))
+WEB_FETCH_HOST_INTERVAL = float(os.getenv("WEB_FETCH_HOST_INTERVAL_SECONDS", "0.25"))
+
+# Throttled responses (429/503, plus gateway errors) are retried up to WEB_FETCH_MAX_RETRIES times,
+# after the host's Retry-After or else an exponential backoff with jitter; a Retry-After longer
+# than WEB_FETCH_RETRY_AFTER_MAX is not waited out and the throttled response is returned as is
+WEB_FETCH_MAX_RETRIES = int(os.getenv("WEB_FETCH_MAX_RETRIES", "3"))
+WEB_FETCH_BACKOFF_BASE = float(os.getenv("WEB_FETCH_BACKOFF_BASE_SECONDS", "0.5"))
+WEB_FETCH_BACKOFF_MAX = float(os.getenv("WEB_FETCH_BACKOFF_MAX_SECONDS", "30"))
+WEB_FETCH_RETRY_AFTER_MAX = float(os.getenv("WEB_FETCH_RETRY_AFTER_MAX_SECONDS", "60"))
+RETRY_STATUSES = frozenset([429, 502, 503, 504])
+
+WEB_FETCH_STATS: Dict[str, int] = {
+    "bytes_downloaded": 0, "stopped_early": 0, "byte_capped": 0, "rejected_content_type": 0, "offloaded": 0,
+    "throttled": 0, "retries": 0
+}
+
+# Conditional-request cache of converted pages on local disk, bounded by entry count and bytes (LRU)
+WEB_CACHE_ENABLED = os.getenv("WEB_CACHE_ENABLED", "true").lower() == "true"
+WEB_CACHE_DIR = os.getenv("WEB_CACHE_DIR", "/tmp/mcp_web_cache")
+WEB_CACHE_MAX_ENTRIES = int(os.getenv("WEB_CACHE_MAX_ENTRIES", "500"))
+WEB_CACHE_MAX_BYTES = int(os.getenv("WEB_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+# Threads doing the cache's disk I/O (its own pool, so cache lookups never queue behind memory storage calls)
+WEB_CACHE_IO_WORKERS = int(os.getenv("WEB_CACHE_IO_WORKERS", "2"))
+
+# Bumped whenever the converter's output changes so entries written by older versions are refetched
+WEB_CACHE_FORMAT = 2
+
+WEB_CACHE_STATS: Dict[str, int] = {"hits": 0, "revalidated": 0, "misses": 0, "stored": 0, "evictions": 0}
+
+_MAX_AGE_RE = re.compile(r"(?:^|,)\s*max-age\s*=\s*\"?(\d+)", re.IGNORECASE)
+
+
+def _freshness(headers: Any) -> Tuple[bool, float]:
+    """(storable, seconds the response stays fresh) according to Cache-Control / Expires."""
+    cache_control = (headers.get("cache-control") or "").lower()
+    if "no-store" in cache_control:
+        return False, 0.0
+    if "no-cache" in cache_control:
+        return True, 0.0
+    match = _MAX_AGE_RE.search(cache_control)
+    if match:
+        return True, float(match.group(1))
+    expires, date = headers.get("expires"), headers.get("date")
+    if expires:
+        try:
+            base = parsedate_to_datetime(date).timestamp() if date else time.time()
+            return True, max(0.0, parsedate_to_datetime(expires).timestamp() - base)
+        except (TypeError, ValueError):
+            return True, 0.0
+    return True, 0.0
+
+
+class _WebCache:
+    """
+    Converted pages keyed by URL, one JSON file per entry holding the validators (ETag /
+    Last-Modified), the freshness deadline and the extracted title and markdown. Recency is
+    tracked in memory (seeded from file modification times) and the least recently used
+    entries are deleted once the cache exceeds its entry or byte budget.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.lru: Optional["OrderedDict[str, int]"] = None
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _scan(self) -> None:
+        self.lru, self.total_bytes = OrderedDict(), 0
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(".json")]
+        except FileNotFoundError:
+            return
+        entries = []
+        for name in names:
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, name[:-len(".json")], st.st_size))
+        for _, key, size in sorted(entries):
+            self.lru[key] = size
+            self.total_bytes += size
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        with self.lock:
+            if self.lru is None:
+                self._scan()
+            if key not in self.lru:
+                return None
+            try:
+                with open(self._path(key), "r") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self.total_bytes -= self.lru.pop(key)
+                return None
+            self.lru.move_to_end(key)
+        return entry if entry.get("url") == url and entry.get("format") == WEB_CACHE_FORMAT else None
+
+    def put(self, url: str, entry: Dict[str, Any]) -> None:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        data = json.dumps({"url": url, "format": WEB_CACHE_FORMAT, **entry}, separators=(",", ":")).encode("utf-8")
+        with self.lock:
+            if self.lru is None:
+                self._scan()
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = os.path.join(self.directory, f"{uuid.uuid4().hex}.tmp")
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self._path(key))
+            self.total_bytes += len(data) - self.lru.pop(key, 0)
+            self.lru[key] = len(data)
+            WEB_CACHE_STATS["stored"] += 1
+            while self.lru and (len(self.lru) > WEB_CACHE_MAX_ENTRIES or self.total_bytes > WEB_CACHE_MAX_BYTES):
+                evicted, size = self.lru.popitem(last=False)
+                self.total_bytes -= size
+                WEB_CACHE_STATS["evictions"] += 1
+                try:
+                    os.remove(self._path(evicted))
+                except FileNotFoundError:
+                    pass
+
+    def touch(self, url: str, fresh_until: float) -> None:
+        """Extends the freshness of a revalidated entry."""
+        entry = self.get(url)
+        if entry is not None:
+            entry.pop("url", None)
+            self.put(url, {**entry, "fresh_until": fresh_until})
+
+
+_web_cache = _WebCache(WEB_CACHE_DIR)
+_cache_executor = ThreadPoolExecutor(max_workers=WEB_CACHE_IO_WORKERS, thread_name_prefix="web-cache")
+
+
+async def _cache_io(func, *args):
+    """Runs a blocking page cache call on the cache's own thread pool."""
+    return await asyncio.get_running_loop().run_in_executor(_cache_executor, functools.partial(func, *args))
+
+
+def web_cache_stats() -> Dict[str, Any]:
+    return {
+        **WEB_CACHE_STATS,
+        "entries": len(_web_cache.lru or {}),
+        "bytes": _web_cache.total_bytes,
+    }
+
+
+def _media_type(headers: Any) -> str:
+    return (headers.get("content-type") or "").split(";", 1)[0].strip().lower()
+
+
+class _HostState:
+    __slots__ = ("slots", "in_flight", "queued", "next_start", "blocked_until")
+
+    def __init__(self):
+        self.slots = asyncio.Semaphore(WEB_FETCH_HOST_CONCURRENCY)
+        self.in_flight = self.queued = 0
+        # Monotonic times before which no request may start: the politeness interval after the
+        # previous start, and a Retry-After / backoff deadline shared by every request to the host
+        self.next_start = self.blocked_until = 0.0
+
+
+class _FetchScheduler:
+    """
+    Admits outbound fetches of one event loop: at most WEB_FETCH_HOST_CONCURRENCY in flight per
+    host, started at least WEB_FETCH_HOST_INTERVAL apart and not before the host's backoff
+    deadline, and at most WEB_FETCH_MAX_CONCURRENCY in flight overall. A host's requests wait
+    for their per-host turn before taking a global permit, so one slow host cannot occupy them all.
+    """
+
+    def __init__(self):
+        self.slots = asyncio.Semaphore(WEB_FETCH_MAX_CONCURRENCY)
+        self.hosts: Dict[str, _HostState] = {}
+
+    @asynccontextmanager
+    async def slot(self, host: str):
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = _HostState()
+        state.queued += 1
+        try:
+            await state.slots.acquire()
+            try:
+                while True:
+                    wait = max(state.next_start, state.blocked_until) - time.monotonic()
+                    if wait <= 0:
+                        break
+                    await asyncio.sleep(wait)
+                state.next_start = time.monotonic() + WEB_FETCH_HOST_INTERVAL
+                await self.slots.acquire()
+            except BaseException:
+                state.slots.release()
+                raise
+        finally:
+            state.queued -= 1
+        state.in_flight += 1
+        try:
+            yield
+        finally:
+            state.in_flight -= 1
+            self.slots.release()
+            state.slots.release()
+            if not state.in_flight and not state.queued and max(state.next_start, state.blocked_until) <= time.monotonic():
+                del self.hosts[host]
+
+    def defer(self, host: str, seconds: float) -> None:
+        """Holds back every request to `host` for `seconds` (Retry-After or backoff)."""
+        state = self.hosts.get(host)
+        if state is not None:
+            state.blocked_until = max(state.blocked_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "in_flight": sum(state.in_flight for state in self.hosts.values()),
+            "queued": sum(state.queued for state in self.hosts.values()),
+            "hosts": {
+                host: {
+                    "in_flight": state.in_flight,
+                    "queued": state.queued,
+                    "backoff_seconds": round(max(0.0, state.blocked_until - now), 3)
+                }
+                for host, state in self.hosts.items()
+            }
+        }
+
+
+_schedulers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _FetchScheduler]" = weakref.WeakKeyDictionary()
+
+
+def _scheduler() -> _FetchScheduler:
+    loop = asyncio.get_running_loop()
+    scheduler = _schedulers.get(loop)
+    if scheduler is None:
+        scheduler = _schedulers[loop] = _FetchScheduler()
+    return scheduler
+
+
+def fetch_scheduler_stats() -> Dict[str, Any]:
+    """Requests in flight and queued overall and per host (with any backoff still pending)."""
+    try:
+        scheduler = _schedulers.get(asyncio.get_running_loop())
+    except RuntimeError:
+        scheduler = None
+    return scheduler.stats() if scheduler is not None else {"in_flight": 0, "queued": 0, "hosts": {}}
+
+
+def _retry_delay(headers: Any, attempt: int) -> Optional[float]:
+    """
+    Seconds to wait before retrying a throttled response: its Retry-After (seconds or HTTP date)
+    when present, else an exponential backoff with jitter. None when Retry-After asks for longer
+    than WEB_FETCH_RETRY_AFTER_MAX.
+    """
+    retry_after = (headers.get("retry-after") or "").strip()
+    if retry_after:
+        try:
+            delay = float(retry_after) if retry_after.isdigit() else parsedate_to_datetime(retry_after).timestamp() - time.time()
+        except (TypeError, ValueError):
+            delay = None
+        if delay is not None:
+            return max(0.0, delay) if delay <= WEB_FETCH_RETRY_AFTER_MAX else None
+    backoff = min(WEB_FETCH_BACKOFF_MAX, WEB_FETCH_BACKOFF_BASE * 2 ** attempt)
+    return backoff / 2 + random.uniform(0, backoff / 2)
+
+
+@asynccontextmanager
+async def _scheduled_stream(url: str, headers: Dict[str, str]):
+    """
+    Streams GET `url` through the host scheduler, retrying throttled responses. The host slot
+    stays held until the caller has consumed the response.
+    """
+    host = urlsplit(url).netloc.lower()
+    scheduler = _scheduler()
+    for attempt in range(WEB_FETCH_MAX_RETRIES + 1):
+        async with scheduler.slot(host):
+            async with get_http_client().stream("GET", url, headers=headers) as response:
+                delay = None
+                if response.status_code in RETRY_STATUSES:
+                    WEB_FETCH_STATS["throttled"] += 1
+                    if attempt < WEB_FETCH_MAX_RETRIES:
+                        delay = _retry_delay(response.headers, attempt)
+                if delay is None:
+                    yield response
+                    return
+                scheduler.defer(host, delay)
+        WEB_FETCH_STATS["retries"] += 1
+
+
+async def _stream_markdown(response: Any, url: str, max_chars: int) -> Tuple[str, str, bool, bool]:
+    """
+    Converts a streamed response body incrementally, reading no further once more than
+    `max_chars` characters of markdown were produced or WEB_FETCH_MAX_BYTES were downloaded.
+    Pages still short of `max_chars` after WEB_FETCH_OFFLOAD_BYTES are buffered and converted
+    in a worker process.
+    Returns (title, text, exhaustive, byte_capped); the text is exhaustive unless conversion
+    stopped at `max_chars`, i.e. a larger `max_chars` would not yield more of it.
+    """
+    converter = new_converter(max_chars, base_url=str(response.url))
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+    # A large Content-Length alone does not offload: most callers need only the start of a page
+    offload = False
+    buffered = []
+    received = 0
+    byte_capped = False
+    async for chunk in response.aiter_bytes():
+        if received + len(chunk) > WEB_FETCH_MAX_BYTES:
+            chunk = chunk[:WEB_FETCH_MAX_BYTES - received]
+            byte_capped = True
+        received += len(chunk)
+        buffered.append(chunk)
+        if not offload:
+            converter.feed(decoder.decode(chunk))
+            if converter.done:
+                WEB_FETCH_STATS["stopped_early"] += 1
+                byte_capped = False
+                break
+            # Still short of max_chars after WEB_FETCH_OFFLOAD_BYTES: hand the rest to a worker
+            offload = received > WEB_FETCH_OFFLOAD_BYTES
+        if byte_capped:
+            WEB_FETCH_STATS["byte_capped"] += 1
+            break
+    WEB_FETCH_STATS["bytes_downloaded"] += received
+
+    if offload:
+        WEB_FETCH_STATS["offloaded"] += 1
+        html = b"".join(buffered).decode(response.encoding or "utf-8", errors="replace")
+        title, text, exhaustive = await convert_html(html, max_chars, str(response.url))
+        return title or url, text, exhaustive, byte_capped and exhaustive
+
+    if not converter.done:
+        converter.feed(decoder.decode(b"", final=True))
+        converter.close()
+    title, text = converter.result()
+    return title or url, text, not converter.done, byte_capped
+
 
 async def fetch_web_markdown(url: str, max_chars: int = 10000) -> Dict[str, Any]:
     """
     Fetches a web page URL and converts the HTML content into clean Markdown text.
-    
+
+    The body is streamed (refused up front when its content type is not text) and converted
+    incrementally to markdown, stopping once max_chars exist or WEB_FETCH_MAX_BYTES were read.
+    Converted pages are cached with their ETag / Last-Modified validators: a page still fresh
+    under its Cache-Control max-age is served without a request, and a stale one is revalidated
+    with If-None-Match / If-Modified-Since so a 304 skips the download and the HTML parsing.
+    Requests go through a per-host scheduler (concurrency, minimum interval, Retry-After and
+    backoff on 429/503) under a global concurrency ceiling.
+
     Args:
         url: The target web URL to fetch.
         max_chars: Maximum character limit for output text (default 10000).
@@ -15,43 +396,75 @@ async def fetch_web_markdown(url: str, max_chars: int = 10000) -> Dict[str, Any]
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8"
     }
-    
+
     try:
-        async with httpx.AsyncClient(follow_redirects=True, timeout=15.0) as client:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-            
-        html = response.text
-        soup = BeautifulSoup(html, "html.parser")
-        
-        # Extract title
-        title = soup.title.string.strip() if soup.title and soup.title.string else url
-        
-        # Remove non-content elements
-        for element in soup(["script", "style", "nav", "footer", "header", "svg", "noscript"]):
-            element.decompose()
-            
-        # Get text content
-        text = soup.get_text(separator="\n")
-        
-        # Clean up whitespace
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        clean_text = "\n".join(chunk for chunk in chunks if chunk)
-        
+        cached = await _cache_io(_web_cache.get, url) if WEB_CACHE_ENABLED else None
+        if cached is not None and not cached.get("exhaustive", True) and len(cached["markdown"]) <= max_chars:
+            # Converted with a smaller max_chars than this call needs; fetch the page in full
+            cached = None
+        if cached is not None and cached.get("fresh_until", 0) > time.time():
+            WEB_CACHE_STATS["hits"] += 1
+            cache_status, status_code = "hit", cached["status_code"]
+            title, clean_text, byte_capped = cached["title"], cached["markdown"], cached.get("byte_capped", False)
+        else:
+            if cached is not None:
+                if cached.get("etag"):
+                    headers["If-None-Match"] = cached["etag"]
+                if cached.get("last_modified"):
+                    headers["If-Modified-Since"] = cached["last_modified"]
+
+            # Shared pooled client, so repeated fetches from one host reuse keep-alive connections,
+            # admitted by the per-host politeness scheduler. The body is streamed and converted as
+            # it arrives, so work scales with max_chars.
+            async with _scheduled_stream(url, headers) as response:
+                storable, max_age = _freshness(response.headers)
+                if cached is not None and response.status_code == 304:
+                    WEB_CACHE_STATS["revalidated"] += 1
+                    await _cache_io(_web_cache.touch, url, time.time() + max_age)
+                    cache_status, status_code = "revalidated", cached["status_code"]
+                    title, clean_text, byte_capped = cached["title"], cached["markdown"], cached.get("byte_capped", False)
+                else:
+                    response.raise_for_status()
+                    media_type = _media_type(response.headers)
+                    if media_type and media_type not in WEB_FETCH_CONTENT_TYPES:
+                        WEB_FETCH_STATS["rejected_content_type"] += 1
+                        raise ValueError(f"Unsupported content type '{media_type}'")
+                    WEB_CACHE_STATS["misses"] += 1
+                    cache_status, status_code = "miss", response.status_code
+                    title, clean_text, exhaustive, byte_capped = await _stream_markdown(response, url, max_chars)
+                    etag, last_modified = response.headers.get("etag"), response.headers.get("last-modified")
+                    if WEB_CACHE_ENABLED and storable and (etag or last_modified or max_age > 0):
+                        try:
+                            await _cache_io(_web_cache.put, url, {
+                                "etag": etag,
+                                "last_modified": last_modified,
+                                "fresh_until": time.time() + max_age,
+                                "status_code": status_code,
+                                "title": title,
+                                "markdown": clean_text,
+                                "exhaustive": exhaustive,
+                                "byte_capped": byte_capped
+                            })
+                        except OSError as e:
+                            print(f"Warning: Failed to cache fetched page {url}: {e}")
+
         # Truncate if needed
         truncated = False
         if len(clean_text) > max_chars:
             clean_text = clean_text[:max_chars] + "\n\n...[Truncated due to length]"
             truncated = True
-            
+        elif byte_capped:
+            clean_text += "\n\n...[Truncated at download size limit]"
+            truncated = True
+
         return {
             "url": url,
-            "status_code": response.status_code,
+            "status_code": status_code,
             "title": title,
             "markdown": clean_text,
             "length": len(clean_text),
-            "truncated": truncated
+            "truncated": truncated,
+            "cache": cache_status
         }
     except Exception as e:
         return {